@@ -1,23 +1,47 @@
+from django.conf import settings
 from django.contrib import admin
 from .models import Account
+from .sharding import set_balance_shards, with_available_balance
 
 @admin.register(Account)
 class AccountAdmin(admin.ModelAdmin):
-    list_display = ['account_number', 'user', 'account_type', 'balance', 'status', 'created_at']
+    list_display = ['account_number', 'user', 'account_type', 'available_balance', 'balance_shards', 'status', 'created_at']
     list_filter = ['account_type', 'status', 'created_at']
     search_fields = ['account_number', 'user__email', 'user__first_name', 'user__last_name']
-    readonly_fields = ['created_at', 'updated_at']
+    readonly_fields = ['available_balance', 'balance_shards', 'accrued_interest', 'interest_accrued_on', 'created_at', 'updated_at']
     ordering = ['-created_at']
+    actions = ['enable_balance_shards', 'disable_balance_shards']
     
     fieldsets = (
         (None, {
             'fields': ('user', 'account_number', 'account_type')
         }),
         ('Balance & Status', {
-            'fields': ('balance', 'status')
+            # balance is the account row's part; sharded accounts also hold credits in their shards
+            'fields': ('balance', 'available_balance', 'balance_shards', 'status')
+        }),
+        ('Interest', {
+            'fields': ('accrued_interest', 'interest_accrued_on')
         }),
         ('Timestamps', {
             'fields': ('created_at', 'updated_at'),
             'classes': ('collapse',)
         }),
-    )
\ No newline at end of file
+    )
+
+    def get_queryset(self, request):
+        # available_balance then reads the annotation instead of aggregating each sharded row
+        return with_available_balance(super().get_queryset(request))
+
+    def enable_balance_shards(self, request, queryset):
+        for account_id in queryset.values_list('id', flat=True):
+            set_balance_shards(account_id, settings.ACCOUNT_BALANCE_SHARDS)
+        self.message_user(request, f"Credits to {queryset.count()} accounts now spread over "
+                                   f"{settings.ACCOUNT_BALANCE_SHARDS} balance shards.")
+    enable_balance_shards.short_description = "Spread credits over balance shards (hot receiving accounts)"
+
+    def disable_balance_shards(self, request, queryset):
+        for account_id in queryset.values_list('id', flat=True):
+            set_balance_shards(account_id, 0)
+        self.message_user(request, f"Balance shards of {queryset.count()} accounts folded and removed.")
+    disable_balance_shards.short_description = "Fold and remove balance shards"
@@ -0,0 +1,114 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, transaction
+import threading
+import time
+
+from .models import Account
+from .serializers import AccountSerializer
+from . import sharding
+
+# Entries are stored under the current version of their key. Invalidation deletes
+# the version, so the next reader starts a new one and any value filled from a read
+# that raced with the write lands under a version nobody asks for again.
+
+_stats = {'hits': 0, 'misses': 0}
+_stats_lock = threading.Lock()
+
+def _cache():
+    return caches[settings.BALANCE_CACHE_ALIAS]
+
+def _account_version_key(account_id):
+    return f'balance:version:{account_id}'
+
+def _user_version_key(user_id):
+    return f'balance:user-accounts:version:{user_id}'
+
+def _count(hits, misses):
+    with _stats_lock:
+        _stats['hits'] += hits
+        _stats['misses'] += misses
+
+def stats():
+    with _stats_lock:
+        hits, misses = _stats['hits'], _stats['misses']
+    total = hits + misses
+    return {'hits': hits, 'misses': misses, 'hit_rate': hits / total if total else 0.0}
+
+def reset_stats():
+    with _stats_lock:
+        _stats['hits'] = _stats['misses'] = 0
+
+def _enabled():
+    # Reads inside a transaction may see uncommitted writes that could still roll back
+    return settings.BALANCE_CACHE_ENABLED and not transaction.get_connection().in_atomic_block
+
+def _versions(cache, version_keys):
+    versions = cache.get_many(version_keys)
+    for key in version_keys:
+        if key not in versions:
+            initial = time.time_ns()
+            cache.add(key, initial)
+            versions[key] = cache.get(key, initial)
+    return versions
+
+def _accounts():
+    # A lagging replica could otherwise be cached under a version created after the write
+    return sharding.with_available_balance(Account.objects.using(DEFAULT_DB_ALIAS))
+
+def _serialize(accounts):
+    return {entry['id']: entry for entry in AccountSerializer(accounts, many=True).data}
+
+def get_accounts(account_ids):
+    """Return {id: serialized account} for the existing accounts among account_ids"""
+    if not _enabled():
+        return _serialize(_accounts().filter(id__in=account_ids))
+    cache = _cache()
+    version_keys = {account_id: _account_version_key(account_id) for account_id in account_ids}
+    versions = _versions(cache, list(version_keys.values()))
+    entry_keys = {
+        account_id: f'balance:{account_id}:{versions[key]}' for account_id, key in version_keys.items()
+    }
+    cached = cache.get_many(list(entry_keys.values()))
+    entries = {account_id: cached[key] for account_id, key in entry_keys.items() if key in cached}
+    missing = [account_id for account_id in account_ids if account_id not in entries]
+    _count(len(entries), len(missing))
+    if missing:
+        loaded = _serialize(_accounts().filter(id__in=missing))
+        cache.set_many({entry_keys[account_id]: entry for account_id, entry in loaded.items()})
+        entries.update(loaded)
+    return entries
+
+def get_account(account_id):
+    return get_accounts([account_id]).get(account_id)
+
+def get_user_accounts(user):
+    """Return the user's serialized accounts in display order"""
+    if not _enabled():
+        return list(_serialize(_accounts().filter(user=user)).values())
+    cache = _cache()
+    version_key = _user_version_key(user.id)
+    list_key = f'balance:user-accounts:{user.id}:{_versions(cache, [version_key])[version_key]}'
+    account_ids = cache.get(list_key)
+    if account_ids is None:
+        _count(0, 1)
+        # Entry versions were not read before this query, so only the id list is cached here
+        loaded = _serialize(_accounts().filter(user=user))
+        cache.set(list_key, list(loaded))
+        return list(loaded.values())
+    _count(1, 0)
+    entries = get_accounts(account_ids)
+    # An account moved to another user keeps its id in the old list until that list expires
+    return [entries[account_id] for account_id in account_ids
+            if account_id in entries and entries[account_id]['user_id'] == user.id]
+
+def invalidate(account_ids=(), user_ids=()):
+    keys = [_account_version_key(account_id) for account_id in account_ids]
+    keys += [_user_version_key(user_id) for user_id in user_ids]
+    if keys and settings.BALANCE_CACHE_ENABLED:
+        _cache().delete_many(keys)
+
+def invalidate_on_commit(account_ids=(), user_ids=()):
+    """Invalidate the entries once the surrounding transaction commits (or now, outside one)"""
+    account_ids, user_ids = list(account_ids), list(user_ids)
+    transaction.on_commit(lambda: invalidate(account_ids, user_ids))
@@ -0,0 +1,99 @@
+from django.conf import settings
+from django.db import connection, transaction, DatabaseError
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from contextlib import contextmanager
+from functools import wraps
+import random
+import time
+
+from .models import Account
+
+# deadlock_detected, serialization_failure, lock_not_available
+POSTGRES_CONTENTION_CODES = {'40P01', '40001', '55P03'}
+# ER_LOCK_DEADLOCK, ER_LOCK_WAIT_TIMEOUT
+MYSQL_CONTENTION_CODES = {1213, 1205}
+
+class AccountLockConflict(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'The account is busy with another operation, please retry.'
+    default_code = 'lock_conflict'
+
+def is_contention_error(exc):
+    """Return True for deadlocks, serialization failures and lock timeouts"""
+    cause = exc.__cause__ or exc
+    code = getattr(cause, 'pgcode', None)
+    if code is not None:
+        return code in POSTGRES_CONTENTION_CODES
+    if connection.vendor == 'sqlite':
+        return 'database is locked' in str(cause)
+    return bool(cause.args) and cause.args[0] in MYSQL_CONTENTION_CODES
+
+def _mysql_lock_wait_timeout():
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT @@SESSION.innodb_lock_wait_timeout')
+        return cursor.fetchone()[0]
+
+@contextmanager
+def atomic_with_lock_timeout(timeout_ms=None):
+    """transaction.atomic() whose statements wait at most timeout_ms for a row lock"""
+    timeout_ms = settings.ACCOUNT_LOCK_TIMEOUT_MS if timeout_ms is None else timeout_ms
+    previous = None
+    if connection.vendor == 'mysql':
+        # InnoDB only accepts whole seconds and has no transaction-local form, so the
+        # session's own timeout is put back for later statements on a persistent connection
+        previous = _mysql_lock_wait_timeout()
+        with connection.cursor() as cursor:
+            cursor.execute(f"SET SESSION innodb_lock_wait_timeout = {max(1, -(-int(timeout_ms) // 1000))}")
+    try:
+        with transaction.atomic():
+            if connection.vendor == 'postgresql':
+                with connection.cursor() as cursor:
+                    cursor.execute(f"SET LOCAL lock_timeout = '{int(timeout_ms)}ms'")
+            yield
+    finally:
+        if previous is not None and connection.connection is not None:
+            with connection.cursor() as cursor:
+                cursor.execute('SET SESSION innodb_lock_wait_timeout = %s', [previous])
+
+def lock_accounts(account_ids, fields=None):
+    """
+    Lock the given accounts with SELECT ... FOR UPDATE and return them by id.
+
+    Rows are always locked in primary key order so that concurrent callers
+    touching overlapping accounts cannot deadlock each other.
+    """
+    queryset = Account.objects.select_for_update().filter(id__in=set(account_ids)).order_by('id')
+    if fields:
+        queryset = queryset.only(*fields)
+    return {account.id: account for account in queryset}
+
+def _backoff(attempt):
+    # Full jitter: sleep a random time up to an exponentially growing cap
+    cap = settings.ACCOUNT_LOCK_RETRY_BACKOFF_MS * (2 ** (attempt - 1))
+    time.sleep(random.uniform(0, cap) / 1000)
+
+def atomic_with_retry(func):
+    """
+    Run func in its own transaction with a bounded lock timeout.
+
+    Deadlocks, serialization failures and lock timeouts are retried with
+    jittered exponential backoff up to ACCOUNT_LOCK_RETRIES times, then raised
+    as AccountLockConflict (HTTP 409). When called inside an outer atomic block
+    the failed transaction cannot be retried here, so the conflict is raised
+    straight away.
+    """
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        attempts = 1 if connection.in_atomic_block else settings.ACCOUNT_LOCK_RETRIES + 1
+        for attempt in range(1, attempts + 1):
+            try:
+                with atomic_with_lock_timeout():
+                    return func(*args, **kwargs)
+            except DatabaseError as exc:
+                if not is_contention_error(exc):
+                    raise
+                if attempt == attempts:
+                    raise AccountLockConflict() from exc
+            _backoff(attempt)
+    return wrapper
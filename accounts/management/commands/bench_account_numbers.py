@@ -0,0 +1,74 @@
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+import random
+import time
+import uuid
+
+from accounts.models import Account
+from accounts.numbering import assign_account_numbers, is_valid_account_number
+from users.models import User
+
+class Command(BaseCommand):
+    help = ('Benchmark account registration with the old exists() retry loop, the block allocator '
+            'and bulk allocation, then check every issued number is unique and well formed')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--accounts', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        count = options['accounts']
+        suffix = uuid.uuid4().hex[:8]
+        password = make_password(None)
+        users = User.objects.bulk_create([
+            User(username=f'an-{suffix}-{i}', email=f'an-{suffix}-{i}@example.com', password=password,
+                 first_name='Number', last_name=str(i))
+            for i in range(count)
+        ])
+        if not users[0].pk:
+            users = list(User.objects.filter(username__startswith=f'an-{suffix}-').order_by('id'))
+        user_ids = [user.id for user in users]
+        issued = []
+
+        def exists_loop():
+            for user in users:
+                while True:
+                    number = str(random.randint(10**9, 10**10 - 1))
+                    if not Account.objects.filter(account_number=number).exists():
+                        break
+                Account.objects.create(user=user, account_number=number)
+
+        def allocator():
+            for user in users:
+                issued.append(Account.objects.create(user=user).account_number)
+
+        def bulk():
+            accounts = assign_account_numbers([Account(user=user) for user in users])
+            Account.objects.bulk_create(accounts, batch_size=1000)
+            issued.extend(account.account_number for account in accounts)
+
+        try:
+            for name, operation in [('exists() retry loop', exists_loop),
+                                    ('block allocator', allocator),
+                                    ('bulk allocation', bulk)]:
+                self.run_case(name, operation, count)
+        finally:
+            User.objects.filter(id__in=user_ids).delete()
+
+        if len(set(issued)) != len(issued):
+            raise CommandError('The allocator issued duplicate account numbers')
+        if not all(is_valid_account_number(number) for number in issued):
+            raise CommandError('The allocator issued a number with a bad check digit')
+        self.stdout.write(self.style.SUCCESS(f'{len(issued)} allocated numbers are unique and valid'))
+
+    def run_case(self, name, operation, count):
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            operation()
+            elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f'{name:<20} {count / elapsed:>10.0f} accounts/s  '
+            f'{elapsed / count * 1000:>7.3f} ms/account  '
+            f'{len(queries) / count:>5.2f} queries/account'
+        )
@@ -0,0 +1,72 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from decimal import Decimal
+from rest_framework.test import APIRequestFactory, force_authenticate
+import time
+import uuid
+
+from accounts import balance_cache
+from accounts.models import Account
+from accounts.views import account_balance, user_accounts
+from transactions.services import post_deposit
+from users.models import User
+
+class Command(BaseCommand):
+    help = ('Benchmark balance polling with and without the balance cache, posting a deposit every '
+            'few polls and failing if any poll after a committed deposit returns the old balance')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--polls', type=int, default=5000)
+        parser.add_argument('--write-every', type=int, default=50, help='Polls between deposits')
+
+    def handle(self, *args, **options):
+        suffix = uuid.uuid4().hex[:8]
+        user = User.objects.create_user(
+            username=f'poll-{suffix}', email=f'poll-{suffix}@example.com',
+            password=None, first_name='Poll', last_name='Bench')
+        accounts = [Account.objects.create(user=user, account_type=kind) for kind in ('savings', 'checking')]
+        try:
+            for name, enabled in [('no cache', False), ('balance cache', True)]:
+                with override_settings(BALANCE_CACHE_ENABLED=enabled):
+                    self.run_case(name, user, accounts[0], options['polls'], options['write_every'])
+        finally:
+            user.delete()
+
+    def run_case(self, name, user, account, polls, write_every):
+        factory = APIRequestFactory()
+
+        def poll(view, path, **kwargs):
+            request = factory.get(path)
+            force_authenticate(request, user=user)
+            response = view(request, **kwargs)
+            response.render()
+            return response.data
+
+        balance_cache.reset_stats()
+        expected = Account.objects.get(id=account.id).balance
+        stale = 0
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            for n in range(polls):
+                if n and n % write_every == 0:
+                    post_deposit(user, account, Decimal('1.00'))
+                    expected += Decimal('1.00')
+                if n % 2:
+                    data = poll(account_balance, f'/api/accounts/{account.id}/balance/', account_id=account.id)
+                    balance = data['balance']
+                else:
+                    data = poll(user_accounts, '/api/accounts/my-accounts/')
+                    balance = next(entry['balance'] for entry in data if entry['id'] == account.id)
+                stale += Decimal(balance) != expected
+            elapsed = time.perf_counter() - started
+
+        write_queries = sum(1 for query in queries if not query['sql'].startswith('SELECT'))
+        reads = len(queries) - write_queries
+        counters = balance_cache.stats()
+        self.stdout.write(
+            f"{name:<14} {polls / elapsed:>8.0f} polls/s  {reads / polls:>5.2f} reads/poll  "
+            f"hit rate {counters['hit_rate']:.1%}"
+        )
+        if stale:
+            raise CommandError(f'{stale} polls returned a balance older than the last committed deposit')
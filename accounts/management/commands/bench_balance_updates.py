@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from decimal import Decimal
+import time
+import uuid
+
+from accounts.models import Account
+from accounts import services as balances
+from users.models import User
+
+class Command(BaseCommand):
+    help = 'Benchmark locked read-modify-write balance updates against single-statement updates'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+        amount = Decimal('1.00')
+        suffix = uuid.uuid4().hex[:8]
+        user = User.objects.create_user(
+            username=f'bench-{suffix}', email=f'bench-{suffix}@example.com',
+            password=None, first_name='Bench', last_name='User')
+        account = Account.objects.create(user=user, balance=Decimal('0.00'))
+
+        def read_modify_write():
+            with transaction.atomic():
+                locked = Account.objects.select_for_update().get(id=account.id)
+                locked.balance += amount
+                locked.save()
+
+        def single_statement():
+            with transaction.atomic():
+                balances.credit(account.id, amount)
+
+        try:
+            for name, operation in [('select_for_update + save()', read_modify_write),
+                                    ('conditional UPDATE', single_statement)]:
+                self.run_case(name, operation, iterations)
+        finally:
+            user.delete()
+
+    def run_case(self, name, operation, iterations):
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            for _ in range(iterations):
+                operation()
+            elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f"{name:<28} {iterations / elapsed:>10.0f} ops/s  "
+            f"{elapsed / iterations * 1000:>7.3f} ms/op  "
+            f"{len(queries) / iterations:>5.1f} queries/op"
+        )
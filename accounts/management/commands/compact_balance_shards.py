@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+from django.db import connections
+import time
+
+from accounts.sharding import accounts_to_compact, compact_account
+from transactions.rollups import accounts_with_summary_shards, fold_summary_shards
+
+class Command(BaseCommand):
+    help = ('Fold the balance and summary shards of hot accounts back into their account and '
+            'rollup rows. Accounts a debit is holding are skipped until the next pass.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Accounts per pass')
+        parser.add_argument('--loop', action='store_true', help='Keep compacting instead of exiting after one sweep')
+        parser.add_argument('--interval', type=float, default=5.0, help='Seconds between sweeps with --loop')
+
+    def handle(self, *args, **options):
+        try:
+            while True:
+                folded, skipped = self.sweep(options['batch_size'])
+                if folded or skipped:
+                    self.stdout.write(f'Compacted {folded} accounts, skipped {skipped} busy ones')
+                if not options['loop']:
+                    break
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+        finally:
+            connections.close_all()
+
+    def sweep(self, batch_size):
+        """One pass over every account with unfolded shards, in id order"""
+        folded = skipped = 0
+        after_id = 0
+        while True:
+            account_ids = sorted(
+                set(accounts_to_compact(batch_size, after_id)) | set(accounts_with_summary_shards(batch_size, after_id))
+            )[:batch_size]
+            if not account_ids:
+                return folded, skipped
+            for account_id in account_ids:
+                if compact_account(account_id, fold_summary_shards) is None:
+                    skipped += 1
+                else:
+                    folded += 1
+            after_id = account_ids[-1]
@@ -0,0 +1,21 @@
+# Generated by Django 4.1.10 on 2026-10-18 18:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_alter_account_account_number'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='account',
+            index=models.Index(fields=['user', '-created_at'], name='accounts_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='account',
+            index=models.Index(fields=['-created_at'], name='accounts_created_idx'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.1.10 on 2026-10-18 19:13
+
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0006_balance_shards'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='account',
+            name='accrued_interest',
+            field=models.DecimalField(decimal_places=8, default=Decimal('0'), max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='account',
+            name='interest_accrued_on',
+            field=models.DateField(blank=True, null=True),
+        ),
+    ]
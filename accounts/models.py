@@ -1,7 +1,11 @@
-from django.db import models
+from django.db import IntegrityError, models, transaction
 from django.conf import settings
 from decimal import Decimal
-import random
+
+from .numbering import next_account_number
+
+# Fresh numbers only collide with numbers issued before the allocator existed
+ACCOUNT_NUMBER_ATTEMPTS = 3
 
 class Account(models.Model):
     ACCOUNT_TYPES = [
@@ -22,12 +26,23 @@ class Account(models.Model):
     account_type = models.CharField(max_length=20, choices=ACCOUNT_TYPES, default='savings')
     balance = models.DecimalField(max_digits=15, decimal_places=2, default=Decimal('0.00'))
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='active')
+    # Number of AccountBalanceShard rows taking this account's credits; 0 keeps every credit on balance
+    balance_shards = models.PositiveSmallIntegerField(default=0)
+    # Interest accrued but not yet posted because it is under a cent, and the last day accrued for
+    accrued_interest = models.DecimalField(max_digits=12, decimal_places=8, default=Decimal('0'))
+    interest_accrued_on = models.DateField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         db_table = 'accounts'
         ordering = ['-created_at']
+        indexes = [
+            # A user's accounts in display order
+            models.Index(fields=['user', '-created_at'], name='accounts_user_created_idx'),
+            # Admin account list
+            models.Index(fields=['-created_at'], name='accounts_created_idx'),
+        ]
     
     def __str__(self):
         return f"{self.account_number} - {self.user.full_name}"
@@ -36,19 +51,62 @@ class Account(models.Model):
     def is_active(self):
         return self.status == 'active'
     
+    @property
+    def available_balance(self):
+        """The balance including credits not yet folded in from the balance shards"""
+        if not self.balance_shards:
+            return self.balance
+        if hasattr(self, 'available'):
+            # Loaded through sharding.with_available_balance() or set by a posting
+            return self.available
+        shards = self.balance_shard_rows.aggregate(total=models.Sum('balance'))['total']
+        return self.balance + (shards or Decimal('0.00'))
+
     def can_debit(self, amount):
         """Check if account can be debited with the given amount"""
-        return self.is_active and self.balance >= amount
+        return self.is_active and (self.balance >= amount or self.available_balance >= amount)
     
     def can_credit(self, amount):
         """Check if account can be credited with the given amount"""
         return self.is_active and amount > 0
     
     def save(self, *args, **kwargs):
-        if not self.account_number:
-            while True:
-                number = str(random.randint(10**9, 10**10 - 1))  # 10 digits
-                if not Account.objects.filter(account_number=number).exists():
-                    self.account_number = number
-                    break
-        super().save(*args, **kwargs)
\ No newline at end of file
+        if self.account_number:
+            return super().save(*args, **kwargs)
+        for attempt in range(ACCOUNT_NUMBER_ATTEMPTS):
+            self.account_number = next_account_number()
+            try:
+                with transaction.atomic():
+                    return super().save(*args, **kwargs)
+            except IntegrityError:
+                taken = Account.objects.filter(account_number=self.account_number).exists()
+                self.account_number = ''
+                if not taken or attempt == ACCOUNT_NUMBER_ATTEMPTS - 1:
+                    raise
+
+class AccountBalanceShard(models.Model):
+    """
+    Part of a hot account's balance. Credits to an account with balance_shards
+    land on a random shard instead of the account row; debits and the
+    compactor fold the shards back into Account.balance (see accounts.sharding).
+    """
+    account = models.ForeignKey(Account, on_delete=models.CASCADE, related_name='balance_shard_rows')
+    shard = models.PositiveSmallIntegerField()
+    balance = models.DecimalField(max_digits=15, decimal_places=2, default=Decimal('0.00'))
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'account_balance_shards'
+        constraints = [
+            models.UniqueConstraint(fields=['account', 'shard'], name='account_balance_shards_unique'),
+        ]
+
+    def __str__(self):
+        return f"Shard {self.shard} of account {self.account_id}"
+
+class AccountNumberBlock(models.Model):
+    """A reserved range of account number counters; see accounts.numbering"""
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'account_number_blocks'
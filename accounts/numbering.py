@@ -0,0 +1,104 @@
+from django.conf import settings
+from django.db import connection
+import hashlib
+import os
+import threading
+
+# Account numbers are a 9-digit body followed by a Luhn check digit. Bodies come from
+# a counter permuted over [10**8, 10**9), so consecutive registrations get unrelated
+# numbers and no lookup is needed to avoid collisions.
+BODY_MIN = 10**8
+BODY_SPACE = 9 * 10**8
+HALF = 30000  # BODY_SPACE == HALF * HALF, so a counter splits into two Feistel halves
+ROUNDS = 4
+
+# Counters handed out per AccountNumberBlock row. Changing this once numbers have been
+# issued would make new blocks overlap old ones.
+BLOCK_SIZE = 100
+
+class AccountNumbersExhausted(Exception):
+    pass
+
+def _round_value(half, round_number):
+    key = settings.ACCOUNT_NUMBER_KEY.encode()
+    digest = hashlib.blake2b(f'{round_number}:{half}'.encode(), key=key[:64], digest_size=8).digest()
+    return int.from_bytes(digest, 'big') % HALF
+
+def permute(counter):
+    """Map a counter in [0, BODY_SPACE) to a unique body in the same range"""
+    left, right = divmod(counter, HALF)
+    for round_number in range(ROUNDS):
+        left, right = right, (left + _round_value(right, round_number)) % HALF
+    return left * HALF + right
+
+def luhn_digit(digits):
+    total = 0
+    for position, digit in enumerate(reversed(digits)):
+        value = int(digit)
+        if position % 2 == 0:
+            value *= 2
+            if value > 9:
+                value -= 9
+        total += value
+    return str((10 - total % 10) % 10)
+
+def is_valid_account_number(number):
+    return len(number) == 10 and number.isdigit() and luhn_digit(number[:-1]) == number[-1]
+
+def format_account_number(counter):
+    if counter >= BODY_SPACE:
+        raise AccountNumbersExhausted('Account number space is exhausted')
+    body = str(BODY_MIN + permute(counter))
+    return body + luhn_digit(body)
+
+def _reserve_blocks(count):
+    """Insert count block rows and return their ids; auto-increment values survive rollbacks"""
+    from .models import AccountNumberBlock
+    if count > 1 and connection.features.can_return_rows_from_bulk_insert:
+        blocks = AccountNumberBlock.objects.bulk_create([AccountNumberBlock() for _ in range(count)])
+        return [block.id for block in blocks]
+    return [AccountNumberBlock.objects.create().id for _ in range(count)]
+
+def _block_counters(block_id):
+    start = (block_id - 1) * BLOCK_SIZE
+    return range(start, start + BLOCK_SIZE)
+
+class _Allocator:
+    """Hands out counters from a block reserved by this process"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = iter(())
+
+    def reset(self):
+        # A forked child must not reuse the block its parent is drawing from
+        self.lock = threading.Lock()
+        self.counters = iter(())
+
+    def next_counter(self):
+        with self.lock:
+            counter = next(self.counters, None)
+            if counter is None:
+                self.counters = iter(_block_counters(_reserve_blocks(1)[0]))
+                counter = next(self.counters)
+            return counter
+
+_allocator = _Allocator()
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_allocator.reset)
+
+def next_account_number():
+    return format_account_number(_allocator.next_counter())
+
+def allocate_account_numbers(count):
+    """Reserve count fresh account numbers at once, e.g. for bulk_create"""
+    block_ids = _reserve_blocks(-(-count // BLOCK_SIZE))
+    counters = (counter for block_id in block_ids for counter in _block_counters(block_id))
+    return [format_account_number(next(counters)) for _ in range(count)]
+
+def assign_account_numbers(accounts):
+    """Fill in the account number of every unsaved account that has none"""
+    missing = [account for account in accounts if not account.account_number]
+    for account, number in zip(missing, allocate_account_numbers(len(missing))):
+        account.account_number = number
+    return accounts
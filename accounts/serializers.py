@@ -2,8 +2,8 @@ from rest_framework import serializers
 from .models import Account
 
 class AccountSerializer(serializers.ModelSerializer):
-    user_id = serializers.IntegerField(source='user.id', read_only=True)
-    balance = serializers.DecimalField(max_digits=15, decimal_places=2, read_only=True)
+    user_id = serializers.IntegerField(read_only=True)
+    balance = serializers.DecimalField(max_digits=15, decimal_places=2, source='available_balance', read_only=True)
 
     class Meta:
         model = Account
@@ -12,6 +12,8 @@ class AccountSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'account_number', 'balance', 'created_at', 'updated_at']
 
 class AccountBalanceSerializer(serializers.ModelSerializer):
+    balance = serializers.DecimalField(max_digits=15, decimal_places=2, source='available_balance', read_only=True)
+
     class Meta:
         model = Account
         fields = ['id', 'account_number', 'balance', 'account_type']
\ No newline at end of file
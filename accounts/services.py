@@ -0,0 +1,142 @@
+from django.db import connection, models
+from django.utils import timezone
+from decimal import Decimal
+
+from .models import Account
+from . import balance_cache, sharding
+
+CENT = Decimal('0.01')
+
+class BalanceUpdateError(Exception):
+    message = 'Balance update rejected'
+
+    def __init__(self, account_id):
+        super().__init__(self.message)
+        self.account_id = account_id
+
+class AccountInactive(BalanceUpdateError):
+    message = 'Account is not active'
+
+class InsufficientFunds(BalanceUpdateError):
+    message = 'Insufficient balance'
+
+def _supports_update_returning():
+    # MySQL and MariaDB cannot return columns from an UPDATE
+    if connection.vendor == 'postgresql':
+        return True
+    return connection.vendor == 'sqlite' and connection.features.can_return_rows_from_bulk_insert
+
+def _raise_for(account_id):
+    """Work out why a conditional update matched no row"""
+    account_status = Account.objects.filter(id=account_id).values_list('status', flat=True).first()
+    if account_status is None:
+        raise Account.DoesNotExist(f"Account {account_id} does not exist")
+    if account_status != 'active':
+        raise AccountInactive(account_id)
+    raise InsufficientFunds(account_id)
+
+def _apply(account_id, delta, conditional=True):
+    """
+    Add delta to the balance in a single UPDATE and return the new balance.
+
+    When conditional, the row only matches if the account is active and the
+    balance stays non-negative, so no prior locked read is needed. Conditional
+    credits to an account with balance shards go to a shard instead, and a debit
+    the account row alone cannot cover folds the shards in first; both then
+    return the available balance.
+    """
+    now = timezone.now()
+    if _supports_update_returning():
+        table = connection.ops.quote_name(Account._meta.db_table)
+        sql = f"UPDATE {table} SET balance = balance + %s, updated_at = %s WHERE id = %s"
+        params = [delta, connection.ops.adapt_datetimefield_value(now), account_id]
+        if conditional:
+            sql += " AND status = %s AND balance + %s >= 0"
+            params += ['active', delta]
+            if delta > 0:
+                sql += " AND balance_shards = 0"
+        with connection.cursor() as cursor:
+            cursor.execute(sql + " RETURNING balance, balance_shards", params)
+            row = cursor.fetchone()
+        if row is None:
+            return _apply_sharded(account_id, delta)
+        balance_cache.invalidate_on_commit([account_id])
+        if row[1]:
+            return sharding.available_balance(account_id)
+        return Decimal(str(row[0])).quantize(CENT)
+
+    queryset = Account.objects.filter(id=account_id)
+    if conditional:
+        queryset = queryset.filter(status='active', balance__gte=-delta)
+        if delta > 0:
+            queryset = queryset.filter(balance_shards=0)
+    if not queryset.update(balance=models.F('balance') + delta, updated_at=now):
+        return _apply_sharded(account_id, delta)
+    balance_cache.invalidate_on_commit([account_id])
+    # The row stays locked by our UPDATE until commit, so this read is consistent
+    return sharding.available_balance(account_id)
+
+def _apply_sharded(account_id, delta):
+    """Retry a conditional update the account row turned down, if balance shards can take it"""
+    if delta > 0:
+        if sharding.credit_shard(account_id, delta):
+            return sharding.available_balance(account_id)
+    elif sharding.fold_shards(account_id):
+        return _apply(account_id, delta)
+    _raise_for(account_id)
+
+def credit(account_id, amount, balance_shards=0):
+    """
+    Credit an active account and return its new balance. Given the balance_shards
+    the caller loaded, a sharded account's credit goes straight to a shard rather
+    than first trying the account row.
+    """
+    if balance_shards and sharding.credit_shard(account_id, amount, balance_shards):
+        return sharding.available_balance(account_id)
+    return _apply(account_id, amount)
+
+def debit(account_id, amount):
+    """Debit an active account with sufficient funds and return its new balance"""
+    return _apply(account_id, -amount)
+
+def adjust(account_id, amount):
+    """Apply an unconditional adjustment (admin postings, refunds) and return the new balance"""
+    return _apply(account_id, amount, conditional=False)
+
+def transfer(from_account_id, to_account_id, amount, to_balance_shards=0):
+    """
+    Move funds between two accounts and return (from_balance, to_balance).
+
+    Must run inside transaction.atomic() so a failed leg rolls back the other.
+    Rows are updated in primary key order to keep lock acquisition consistent.
+    A credit that went to one of the recipient's balance shards (see credit)
+    is not read back, and to_balance is None.
+    """
+    def credit_leg():
+        if to_balance_shards and sharding.credit_shard(to_account_id, amount, to_balance_shards):
+            return None
+        return credit(to_account_id, amount)
+
+    if from_account_id < to_account_id:
+        from_balance = debit(from_account_id, amount)
+        to_balance = credit_leg()
+    else:
+        to_balance = credit_leg()
+        from_balance = debit(from_account_id, amount)
+    return from_balance, to_balance
+
+def apply_balance_deltas(deltas):
+    """Apply the net balance change of many accounts in a single UPDATE"""
+    deltas = {account_id: delta for account_id, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    Account.objects.filter(id__in=deltas).update(
+        balance=models.Case(
+            *[models.When(id=account_id, then=models.F('balance') + models.Value(delta))
+              for account_id, delta in deltas.items()],
+            default=models.F('balance'),
+            output_field=models.DecimalField(max_digits=15, decimal_places=2),
+        ),
+        updated_at=timezone.now(),
+    )
+    balance_cache.invalidate_on_commit(deltas)
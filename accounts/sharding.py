@@ -0,0 +1,126 @@
+from django.db import DatabaseError, connection, models
+from django.db.models.functions import Coalesce, Mod
+from django.utils import timezone
+from decimal import Decimal
+import random
+
+from .models import Account, AccountBalanceShard
+from .locking import atomic_with_lock_timeout, atomic_with_retry, is_contention_error
+from . import balance_cache
+
+ZERO = Decimal('0.00')
+
+# Shard picks are drawn from this range and reduced modulo the account's shard count
+SHARD_DRAW = 1 << 30
+
+def shard_balance(account='pk'):
+    """Expression for the sum of the shards of the account whose id the account field holds"""
+    shards = (
+        AccountBalanceShard.objects.filter(account_id=models.OuterRef(account))
+        .order_by().values('account_id').annotate(total=models.Sum('balance')).values('total')
+    )
+    return Coalesce(
+        models.Subquery(shards), models.Value(ZERO),
+        output_field=models.DecimalField(max_digits=15, decimal_places=2),
+    )
+
+def with_available_balance(queryset):
+    """Annotate available = balance plus the shards, in the same query"""
+    return queryset.annotate(available=models.F('balance') + shard_balance())
+
+def available_balance(account_id):
+    return with_available_balance(Account.objects.filter(id=account_id)).values_list('available', flat=True).get()
+
+def credit_shard(account_id, amount, shards=0):
+    """
+    Credit one randomly chosen shard of an active sharded account and return
+    whether it was both. Only the shard row is locked, so concurrent credits
+    rarely wait on each other. Pass the shard count the caller already loaded
+    to pick the shard without reading the account row.
+    """
+    if shards:
+        pick = random.randrange(shards)
+        # The loaded count may be stale, so the account must still be active and have this shard
+        rows = AccountBalanceShard.objects.filter(
+            account_id=account_id, shard=pick, account__status='active', account__balance_shards__gt=pick)
+    else:
+        shard = (
+            Account.objects.filter(id=account_id, status='active', balance_shards__gt=0)
+            .annotate(pick=Mod(models.Value(random.randrange(SHARD_DRAW)), 'balance_shards')).values('pick')
+        )
+        rows = AccountBalanceShard.objects.filter(account_id=account_id, shard=models.Subquery(shard))
+    if not rows.update(balance=models.F('balance') + amount, updated_at=timezone.now()):
+        return False
+    balance_cache.invalidate_on_commit([account_id])
+    return True
+
+def _lock_account_row(queryset, **options):
+    # Credits still reference the row through their ledger inserts' foreign key checks,
+    # whose KEY SHARE locks a plain FOR UPDATE would wait on
+    if connection.features.has_select_for_no_key_update:
+        options['no_key'] = True
+    return list(queryset.select_for_update(**options).values_list('id'))
+
+def fold_shards(account_id):
+    """
+    Move a sharded account's shard balances into Account.balance and return the
+    amount moved. Call inside a transaction. The account row is locked before its
+    shards, the order every path that folds keeps.
+    """
+    if not _lock_account_row(Account.objects.filter(id=account_id, balance_shards__gt=0)):
+        return ZERO
+    shards = list(
+        AccountBalanceShard.objects.select_for_update().filter(account_id=account_id)
+        .exclude(balance=ZERO).values_list('id', 'balance')
+    )
+    total = sum((balance for _, balance in shards), ZERO)
+    if total:
+        now = timezone.now()
+        AccountBalanceShard.objects.filter(id__in=[shard_id for shard_id, _ in shards]).update(
+            balance=ZERO, updated_at=now)
+        Account.objects.filter(id=account_id).update(balance=models.F('balance') + total, updated_at=now)
+        balance_cache.invalidate_on_commit([account_id])
+    return total
+
+@atomic_with_retry
+def set_balance_shards(account_id, shards):
+    """Spread an account's future credits over shards rows, or keep them on the account row with 0"""
+    # Empty shards are locked too, so no credit lands on a shard about to be deleted
+    _lock_account_row(Account.objects.filter(id=account_id))
+    list(AccountBalanceShard.objects.select_for_update().filter(account_id=account_id).values_list('id'))
+    fold_shards(account_id)
+    Account.objects.filter(id=account_id).update(balance_shards=shards, updated_at=timezone.now())
+    AccountBalanceShard.objects.filter(account_id=account_id, shard__gte=shards).delete()
+    existing = set(AccountBalanceShard.objects.filter(account_id=account_id).values_list('shard', flat=True))
+    AccountBalanceShard.objects.bulk_create([
+        AccountBalanceShard(account_id=account_id, shard=shard) for shard in range(shards) if shard not in existing
+    ])
+    balance_cache.invalidate_on_commit([account_id])
+
+def accounts_to_compact(limit, after_id=0):
+    """Ids of accounts with credits in their balance shards, in id order after after_id"""
+    return list(
+        AccountBalanceShard.objects.filter(account_id__gt=after_id).exclude(balance=ZERO).order_by('account_id')
+        .values_list('account_id', flat=True).distinct()[:limit]
+    )
+
+def compact_account(account_id, fold_more=None):
+    """
+    Fold one account's shards unless a debit or another compactor holds its row,
+    in which case they are left for the next pass. fold_more runs afterwards in the
+    same transaction for other per-account shard tables. Returns the amount moved or None.
+    """
+    skip_locked = connection.features.has_select_for_update_skip_locked
+    try:
+        with atomic_with_lock_timeout():
+            if not _lock_account_row(Account.objects.filter(id=account_id), skip_locked=skip_locked):
+                return None
+            # Balance shards before the others: a credit locks them in that order too
+            moved = fold_shards(account_id)
+            if fold_more:
+                fold_more(account_id)
+            return moved
+    except DatabaseError as exc:
+        if not is_contention_error(exc):
+            raise
+        return None
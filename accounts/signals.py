@@ -0,0 +1,10 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Account
+from . import balance_cache
+
+@receiver(post_save, sender=Account)
+@receiver(post_delete, sender=Account)
+def invalidate_cached_account(sender, instance, **kwargs):
+    balance_cache.invalidate_on_commit([instance.id], [instance.user_id])
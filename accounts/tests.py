@@ -0,0 +1,69 @@
+from django.db import OperationalError, connection
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext, override_settings
+from decimal import Decimal
+
+from users.models import User
+from .locking import AccountLockConflict, atomic_with_retry, lock_accounts
+from .models import Account
+
+def deadlock():
+    error = OperationalError('deadlock detected')
+    error.pgcode = '40P01'
+    return error
+
+class LockOrderTests(TestCase):
+    """Overlapping postings lock their accounts in one order, so they cannot deadlock each other"""
+
+    def test_accounts_are_locked_in_primary_key_order(self):
+        user = User.objects.create_user(
+            username='locker', email='locker@example.com', password=None, first_name='Lock', last_name='Order')
+        first, second = [Account.objects.create(user=user, balance=Decimal('1.00')) for _ in range(2)]
+        with CaptureQueriesContext(connection) as queries:
+            locked = lock_accounts([second.id, first.id, second.id])
+        self.assertEqual(list(locked), [first.id, second.id])
+        sql = queries.captured_queries[-1]['sql']
+        if connection.features.has_select_for_update:
+            self.assertIn('FOR UPDATE', sql)
+        self.assertIn('ORDER BY', sql)
+
+@override_settings(ACCOUNT_LOCK_RETRIES=2, ACCOUNT_LOCK_RETRY_BACKOFF_MS=0)
+class RetryTests(TransactionTestCase):
+    """Contention is retried in a fresh transaction and surfaces as a 409, never as a deadlock error"""
+
+    def test_contention_is_retried(self):
+        calls = []
+
+        @atomic_with_retry
+        def post():
+            calls.append(1)
+            if len(calls) < 3:
+                raise deadlock()
+            return 'posted'
+
+        self.assertEqual(post(), 'posted')
+        self.assertEqual(len(calls), 3)
+
+    def test_lasting_contention_raises_a_lock_conflict(self):
+        calls = []
+
+        @atomic_with_retry
+        def post():
+            calls.append(1)
+            raise deadlock()
+
+        with self.assertRaises(AccountLockConflict):
+            post()
+        self.assertEqual(len(calls), 3)
+
+    def test_other_database_errors_are_not_retried(self):
+        calls = []
+
+        @atomic_with_retry
+        def post():
+            calls.append(1)
+            raise OperationalError('disk full')
+
+        with self.assertRaises(OperationalError):
+            post()
+        self.assertEqual(len(calls), 1)
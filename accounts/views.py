@@ -1,9 +1,11 @@
 from rest_framework import generics, permissions, status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
-from django.shortcuts import get_object_or_404
+from django.http import Http404
 from .models import Account
 from .serializers import AccountSerializer, AccountBalanceSerializer
+from .sharding import with_available_balance
+from . import balance_cache
 
 class AccountListView(generics.ListAPIView):
     serializer_class = AccountSerializer
@@ -11,8 +13,8 @@ class AccountListView(generics.ListAPIView):
     
     def get_queryset(self):
         if self.request.user.is_admin:
-            return Account.objects.all()
-        return Account.objects.filter(user=self.request.user)
+            return with_available_balance(Account.objects.all())
+        return with_available_balance(Account.objects.filter(user=self.request.user))
 
 class AccountDetailView(generics.RetrieveAPIView):
     serializer_class = AccountSerializer
@@ -20,23 +22,18 @@ class AccountDetailView(generics.RetrieveAPIView):
     
     def get_queryset(self):
         if self.request.user.is_admin:
-            return Account.objects.all()
-        return Account.objects.filter(user=self.request.user)
+            return with_available_balance(Account.objects.all())
+        return with_available_balance(Account.objects.filter(user=self.request.user))
 
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def account_balance(request, account_id):
-    if request.user.is_admin:
-        account = get_object_or_404(Account, id=account_id)
-    else:
-        account = get_object_or_404(Account, id=account_id, user=request.user)
-    
-    serializer = AccountBalanceSerializer(account)
-    return Response(serializer.data)
+    account = balance_cache.get_account(account_id)
+    if account is None or not (request.user.is_admin or account['user_id'] == request.user.id):
+        raise Http404
+    return Response({field: account[field] for field in AccountBalanceSerializer.Meta.fields})
 
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def user_accounts(request):
-    accounts = Account.objects.filter(user=request.user)
-    serializer = AccountSerializer(accounts, many=True)
-    return Response(serializer.data)
\ No newline at end of file
+    return Response(balance_cache.get_user_accounts(request.user))
\ No newline at end of file
@@ -0,0 +1,156 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils.functional import SimpleLazyObject
+from contextlib import contextmanager
+import contextvars
+import logging
+import random
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# Models whose reads must always see the latest write
+PRIMARY_ONLY_APPS = {'sessions', 'token_blacklist'}
+
+class RequestState:
+    def __init__(self, request, primary):
+        self.request = request
+        self.primary = primary
+        self.sticky = None
+        self.wrote = False
+
+    def user_id(self):
+        # Only a user DRF has already authenticated; evaluating Django's lazy
+        # session user here would itself issue a routed read
+        user = self.request.__dict__.get('user')
+        if user is None or isinstance(user, SimpleLazyObject) or not user.is_authenticated:
+            return None
+        return user.pk
+
+_state = contextvars.ContextVar('db_routing_state', default=None)
+
+def _sticky_key(user_id):
+    return f'primary-sticky:{user_id}'
+
+@contextmanager
+def use_primary():
+    """Send every read in the block to the primary, e.g. before filling a cache"""
+    state = _state.get()
+    if state is None:
+        yield
+        return
+    previous, state.primary = state.primary, True
+    try:
+        yield
+    finally:
+        state.primary = previous
+
+class ReplicaHealth:
+    """Per-process record of which replicas are within REPLICA_MAX_LAG_SECONDS"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.checked_at = {}
+        self.healthy = {}
+
+    def lag(self, alias):
+        connection = connections[alias]
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                # An idle primary stops advancing the replay timestamp, so only
+                # count lag while received WAL is still waiting to be replayed
+                cursor.execute(
+                    "SELECT CASE WHEN NOT pg_is_in_recovery() "
+                    "OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+                    "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+                )
+                return float(cursor.fetchone()[0] or 0)
+            if connection.vendor == 'mysql':
+                cursor.execute('SHOW REPLICA STATUS')
+                row = cursor.fetchone()
+                if row is None:
+                    return 0.0
+                columns = [column[0] for column in cursor.description]
+                lag = dict(zip(columns, row)).get('Seconds_Behind_Source')
+                return float('inf') if lag is None else float(lag)
+        return 0.0
+
+    def is_healthy(self, alias):
+        now = time.monotonic()
+        with self.lock:
+            if now - self.checked_at.get(alias, float('-inf')) < settings.REPLICA_LAG_CHECK_INTERVAL:
+                # Unhealthy until the first check, which another thread may still be running
+                return self.healthy.get(alias, False)
+            self.checked_at[alias] = now
+        try:
+            healthy = self.lag(alias) <= settings.REPLICA_MAX_LAG_SECONDS
+        except Exception:
+            logger.warning('Replica %s is unreachable', alias, exc_info=True)
+            healthy = False
+        with self.lock:
+            self.healthy[alias] = healthy
+        return healthy
+
+replica_health = ReplicaHealth()
+
+class ReplicaRouter:
+    """
+    Route reads to a healthy replica during safe requests from users who have
+    not written recently. Everything else, including reads outside a request
+    and inside an open transaction, uses the primary.
+    """
+
+    def _use_primary(self, model, state):
+        if state is None or state.primary or model._meta.app_label in PRIMARY_ONLY_APPS:
+            return True
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return True
+        if state.sticky is None:
+            user_id = state.user_id()
+            if user_id is None:
+                return False
+            cache = caches[settings.REPLICA_STICKY_CACHE_ALIAS]
+            state.sticky = cache.get(_sticky_key(user_id)) is not None
+        return state.sticky
+
+    def db_for_read(self, model, **hints):
+        if not settings.REPLICA_READS_ENABLED or self._use_primary(model, _state.get()):
+            return DEFAULT_DB_ALIAS
+        replicas = [alias for alias in settings.REPLICA_DATABASES if replica_health.is_healthy(alias)]
+        return random.choice(replicas) if replicas else DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *settings.REPLICA_DATABASES}
+        return obj1._state.db in databases and obj2._state.db in databases
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+class ReplicaRoutingMiddleware:
+    """Open a routing context per request and make writers stick to the primary"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        state = RequestState(request, primary=request.method not in SAFE_METHODS)
+        token = _state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+        user_id = state.user_id()
+        if state.wrote and user_id is not None:
+            caches[settings.REPLICA_STICKY_CACHE_ALIAS].set(
+                _sticky_key(user_id), True, timeout=settings.REPLICA_STICKY_SECONDS)
+        return response
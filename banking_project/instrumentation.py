@@ -0,0 +1,135 @@
+from django.conf import settings
+from django.db import connections
+from contextlib import ExitStack
+import contextvars
+import logging
+import random
+import time
+
+logger = logging.getLogger('banking_project.requests')
+
+LOCKING_STATEMENTS = ('UPDATE', 'DELETE')
+
+class RequestBudgetExceeded(AssertionError):
+    pass
+
+class RequestMetrics:
+    """Database and rendering costs of one request"""
+
+    def __init__(self):
+        self.queries = 0
+        self.sql_time = 0.0
+        self.lock_time = 0.0
+        self.slowest_sql = None
+        self.slowest_time = 0.0
+        self.render_started = None
+        self.render_time = 0.0
+        self.total_time = 0.0
+
+    def record(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.queries += 1
+            self.sql_time += elapsed
+            # Balances are locked by guarded UPDATEs as well as SELECT ... FOR UPDATE;
+            # a row-lock wait shows up as time spent in either
+            if sql.startswith(LOCKING_STATEMENTS) or 'FOR UPDATE' in sql:
+                self.lock_time += elapsed
+            if elapsed > self.slowest_time:
+                self.slowest_time = elapsed
+                self.slowest_sql = sql
+
+    def fields(self):
+        return {
+            'queries': self.queries,
+            'sql_ms': round(self.sql_time * 1000, 2),
+            'lock_ms': round(self.lock_time * 1000, 2),
+            'render_ms': round(self.render_time * 1000, 2),
+            'total_ms': round(self.total_time * 1000, 2),
+            'slowest_sql_ms': round(self.slowest_time * 1000, 2),
+            'slowest_sql': self.slowest_sql[:500] if self.slowest_sql else None,
+        }
+
+    def server_timing(self):
+        return ', '.join([
+            f'db;desc="{self.queries} queries";dur={self.sql_time * 1000:.2f}',
+            f'lock;dur={self.lock_time * 1000:.2f}',
+            f'render;dur={self.render_time * 1000:.2f}',
+            f'total;dur={self.total_time * 1000:.2f}',
+        ])
+
+_metrics = contextvars.ContextVar('request_metrics', default=None)
+
+def current():
+    """Metrics of the request being handled, or None when it is not sampled"""
+    return _metrics.get()
+
+def over_budget(view_name, fields):
+    """Describe each REQUEST_BUDGETS limit of the view that the request's fields exceed"""
+    budget = settings.REQUEST_BUDGETS.get(view_name)
+    if not budget:
+        return []
+    return [
+        f'{key} {fields[key]} > {limit}'
+        for key, limit in budget.items() if fields[key] > limit
+    ]
+
+class RequestMetricsMiddleware:
+    """
+    Record query count, SQL time, the slowest statement, time in row-locking
+    statements and response render time for a sample of requests. Sampled
+    requests get a Server-Timing header (when enabled), a structured log line
+    and a check against REQUEST_BUDGETS; the rest only pay for one random().
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        rate = settings.REQUEST_METRICS_SAMPLE_RATE
+        if rate <= 0 or (rate < 1 and random.random() >= rate):
+            return self.get_response(request)
+
+        metrics = RequestMetrics()
+        token = _metrics.set(metrics)
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for alias in connections:
+                    stack.enter_context(connections[alias].execute_wrapper(metrics.record))
+                response = self.get_response(request)
+        finally:
+            _metrics.reset(token)
+        metrics.total_time = time.perf_counter() - started
+        self.report(request, response, metrics)
+        return response
+
+    def process_template_response(self, request, response):
+        metrics = _metrics.get()
+        if metrics is not None:
+            metrics.render_started = time.perf_counter()
+
+            def rendered(response):
+                metrics.render_time = time.perf_counter() - metrics.render_started
+            response.add_post_render_callback(rendered)
+        return response
+
+    def report(self, request, response, metrics):
+        match = getattr(request, 'resolver_match', None)
+        view_name = match.view_name if match else None
+        fields = metrics.fields()
+        if settings.REQUEST_METRICS_SERVER_TIMING:
+            response['Server-Timing'] = metrics.server_timing()
+        logger.info('%s %s %s', request.method, request.path, response.status_code, extra={
+            'view': view_name, 'method': request.method, 'path': request.path,
+            'status': response.status_code, **fields,
+        })
+        exceeded = over_budget(view_name, fields)
+        if exceeded:
+            message = f"{view_name} over budget: {', '.join(exceeded)}"
+            if settings.REQUEST_BUDGET_ACTION == 'raise':
+                raise RequestBudgetExceeded(message)
+            logger.warning(message, extra={'view': view_name, 'path': request.path, **fields})
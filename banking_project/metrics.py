@@ -0,0 +1,163 @@
+from django.conf import settings
+from django.core.signals import request_finished
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+from functools import wraps
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess,
+)
+from prometheus_client.core import GaugeMetricFamily
+import os
+import threading
+import time
+
+# Worker processes share metrics through files in this directory when it is set (see gunicorn.conf.py)
+MULTIPROCESS = bool(os.environ.get('PROMETHEUS_MULTIPROC_DIR'))
+
+OUTCOMES = ('success', 'insufficient_funds', 'inactive_account', 'lock_conflict', 'invalid')
+
+REQUEST_LATENCY = Histogram(
+    'banking_http_request_duration_seconds', 'Request latency by URL name',
+    ['view', 'method'], buckets=(.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10),
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    'banking_http_requests_in_flight', 'Requests being handled', multiprocess_mode='livesum')
+DB_CONNECTIONS = Gauge(
+    'banking_db_connections_open', 'Open database connections by alias', ['alias'], multiprocess_mode='livesum')
+MONEY_MOVEMENTS = Counter(
+    'banking_money_movements_total', 'Deposits, withdrawals and transfers by outcome', ['kind', 'outcome'])
+
+class BacklogCollector:
+    """Settlement and payment file backlogs, counted from the database at scrape time"""
+
+    def describe(self):
+        # Without this, registering would call collect() and query the database at import time
+        return []
+
+    def collect(self):
+        from transactions.models import Transaction
+        from transactions.payment_files import unfiled_entries
+        from transactions.settlement import pending_settlements
+
+        backlog = GaugeMetricFamily(
+            'banking_settlement_backlog', 'External transfers waiting at each settlement stage', labels=['stage'])
+        backlog.add_metric(['awaiting_approval'], Transaction.objects.filter(
+            transaction_type='external', status='pending', settlement_action__isnull=True).count())
+        backlog.add_metric(['queued'], pending_settlements().count())
+        backlog.add_metric(['unfiled_payment'], unfiled_entries().count())
+        yield backlog
+
+_backlog = BacklogCollector()
+if not MULTIPROCESS:
+    REGISTRY.register(_backlog)
+
+def registry():
+    if not MULTIPROCESS:
+        return REGISTRY
+    scraped = CollectorRegistry()
+    multiprocess.MultiProcessCollector(scraped)
+    scraped.register(_backlog)
+    return scraped
+
+def metrics_view(request):
+    """Prometheus text exposition; requires METRICS_TOKEN as a bearer token when one is configured"""
+    token = settings.METRICS_TOKEN
+    if token:
+        if not constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}'):
+            return HttpResponseForbidden()
+    elif not settings.DEBUG:
+        return HttpResponseForbidden()
+    return HttpResponse(generate_latest(registry()), content_type=CONTENT_TYPE_LATEST)
+
+class PrometheusMiddleware:
+    """Latency histogram by URL name and the in-flight request gauge"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        REQUESTS_IN_FLIGHT.inc()
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            REQUESTS_IN_FLIGHT.dec()
+        match = request.resolver_match
+        REQUEST_LATENCY.labels(match.view_name if match else 'unmatched', request.method).observe(
+            time.perf_counter() - started)
+        return response
+
+def error_outcome(exc):
+    from accounts.locking import AccountLockConflict
+    from accounts.services import AccountInactive, InsufficientFunds
+
+    if isinstance(exc, InsufficientFunds):
+        return 'insufficient_funds'
+    if isinstance(exc, AccountInactive):
+        return 'inactive_account'
+    if isinstance(exc, AccountLockConflict):
+        return 'lock_conflict'
+    return None
+
+def counted(kind):
+    """Count the outcome of each call of a money-movement service"""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            try:
+                result = func(*args, **kwargs)
+            except Exception as exc:
+                outcome = error_outcome(exc)
+                if outcome:
+                    MONEY_MOVEMENTS.labels(kind, outcome).inc()
+                raise
+            MONEY_MOVEMENTS.labels(kind, 'success').inc()
+            return result
+        return wrapper
+    return decorator
+
+def _codes(errors):
+    if isinstance(errors, dict):
+        errors = errors.values()
+    for error in errors:
+        if isinstance(error, (dict, list)):
+            yield from _codes(error)
+        else:
+            yield getattr(error, 'code', None)
+
+def count_rejected(kind, errors):
+    """Count a request refused by serializer validation, by the outcome its error codes name"""
+    codes = set(_codes(errors))
+    outcome = next((outcome for outcome in OUTCOMES if outcome in codes), 'invalid')
+    MONEY_MOVEMENTS.labels(kind, outcome).inc()
+
+# Open connections are counted when created and uncounted once a finished request finds them closed
+_lock = threading.Lock()
+_open = {}
+
+def _reset():
+    global _lock, _open
+    _lock = threading.Lock()
+    _open = {}
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset)
+
+def _connection_created(sender, connection, **kwargs):
+    with _lock:
+        if id(connection) in _open:
+            return
+        _open[id(connection)] = connection
+    DB_CONNECTIONS.labels(connection.alias).inc()
+
+def prune_closed_connections(**kwargs):
+    with _lock:
+        closed = [key for key, connection in _open.items() if connection.connection is None]
+        closed = [_open.pop(key) for key in closed]
+    for connection in closed:
+        DB_CONNECTIONS.labels(connection.alias).dec()
+
+connection_created.connect(_connection_created)
+# Registered after Django's close_old_connections, so connections it closed are already gone
+request_finished.connect(prune_closed_connections)
@@ -1,7 +1,9 @@
 import os
 from pathlib import Path
 from decouple import config
+from django.core.exceptions import ImproperlyConfigured
 from datetime import timedelta
+from decimal import Decimal
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -27,6 +29,7 @@ DJANGO_APPS = [
 THIRD_PARTY_APPS = [
     'rest_framework',
     'rest_framework_simplejwt',
+    'rest_framework_simplejwt.token_blacklist',
     'corsheaders',
     'django_filters',
 ]
@@ -40,6 +43,8 @@ LOCAL_APPS = [
 INSTALLED_APPS = DJANGO_APPS + THIRD_PARTY_APPS + LOCAL_APPS
 
 MIDDLEWARE = [
+    'banking_project.metrics.PrometheusMiddleware',
+    'banking_project.structured_logging.RequestIdMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.middleware.security.SecurityMiddleware',
@@ -49,7 +54,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    
+    'banking_project.db_routing.ReplicaRoutingMiddleware',
+    'banking_project.instrumentation.RequestMetricsMiddleware',
 ]
 
 ROOT_URLCONF = 'banking_project.urls'
@@ -140,6 +146,151 @@ else:  # Defaults to PostgreSQL
         }
     }
 
+# Read replicas: DB_REPLICA_HOSTS is a comma-separated list of host[:port] entries that
+# share the primary's credentials. Safe requests read from a replica unless the user
+# wrote within REPLICA_STICKY_SECONDS; replicas lagging more than
+# REPLICA_MAX_LAG_SECONDS are skipped. Point a replica at the primary's own host to try
+# the routing locally with two aliases.
+LOCMEM_CACHE_BACKEND = 'django.core.cache.backends.locmem.LocMemCache'
+REPLICA_DATABASES = []
+for index, replica in enumerate(config('DB_REPLICA_HOSTS', default='', cast=lambda v: [s.strip() for s in v.split(',') if s.strip()]), 1):
+    host, _, port = replica.partition(':')
+    alias = f'replica_{index}'
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'HOST': host,
+        'PORT': port or DATABASES['default'].get('PORT', ''),
+        'TEST': {'MIRROR': 'default'},
+    }
+    REPLICA_DATABASES.append(alias)
+DATABASE_ROUTERS = ['banking_project.db_routing.ReplicaRouter']
+REPLICA_STICKY_SECONDS = config('REPLICA_STICKY_SECONDS', default=5, cast=int)
+# Stickiness must follow a user to whichever worker serves their next request, so reads
+# only go to replicas when REPLICA_STICKY_CACHE_BACKEND names a shared cache
+REPLICA_STICKY_CACHE_ALIAS = 'replica-sticky'
+REPLICA_STICKY_CACHE_BACKEND = config('REPLICA_STICKY_CACHE_BACKEND', default='')
+REPLICA_READS_ENABLED = bool(REPLICA_DATABASES) and REPLICA_STICKY_CACHE_BACKEND not in ('', LOCMEM_CACHE_BACKEND)
+REPLICA_MAX_LAG_SECONDS = config('REPLICA_MAX_LAG_SECONDS', default=2.0, cast=float)
+REPLICA_LAG_CHECK_INTERVAL = config('REPLICA_LAG_CHECK_INTERVAL', default=5.0, cast=float)
+
+# Balance reads are cached under BALANCE_CACHE_ALIAS. Invalidation only reaches other
+# workers through a shared cache, so the balance cache is off unless BALANCE_CACHE_BACKEND
+# names one, e.g. django.core.cache.backends.redis.RedisCache.
+BALANCE_CACHE_BACKEND = config('BALANCE_CACHE_BACKEND', default='')
+RECIPIENT_CACHE_BACKEND = config('RECIPIENT_CACHE_BACKEND', default='')
+CACHES = {
+    'default': {
+        'BACKEND': LOCMEM_CACHE_BACKEND,
+    },
+    'balances': {
+        'BACKEND': BALANCE_CACHE_BACKEND or LOCMEM_CACHE_BACKEND,
+        'LOCATION': config('BALANCE_CACHE_LOCATION', default='balances'),
+        'TIMEOUT': config('BALANCE_CACHE_TIMEOUT', default=300, cast=int),
+    },
+    # Without a shared RECIPIENT_CACHE_BACKEND, entries only live a few seconds: other
+    # workers never see the invalidation when an account is closed
+    'recipients': {
+        'BACKEND': RECIPIENT_CACHE_BACKEND or LOCMEM_CACHE_BACKEND,
+        'LOCATION': config('RECIPIENT_CACHE_LOCATION', default='recipients'),
+        'TIMEOUT': config('RECIPIENT_CACHE_TIMEOUT', default=5 if RECIPIENT_CACHE_BACKEND in ('', LOCMEM_CACHE_BACKEND) else 600, cast=int),
+        'OPTIONS': {'MAX_ENTRIES': config('RECIPIENT_CACHE_MAX_ENTRIES', default=50000, cast=int)},
+    },
+    'replica-sticky': {
+        'BACKEND': REPLICA_STICKY_CACHE_BACKEND or LOCMEM_CACHE_BACKEND,
+        'LOCATION': config('REPLICA_STICKY_CACHE_LOCATION', default='replica-sticky'),
+    },
+    # Authenticated user state for JWT requests; see AUTH_USER_CACHE_ALIAS
+    'auth-users': {
+        'BACKEND': config('AUTH_USER_CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('AUTH_USER_CACHE_LOCATION', default='auth-users'),
+        'TIMEOUT': config('AUTH_USER_CACHE_TTL', default=30, cast=int),
+    },
+}
+BALANCE_CACHE_ALIAS = 'balances'
+BALANCE_CACHE_ENABLED = config(
+    'BALANCE_CACHE_ENABLED', default=BALANCE_CACHE_BACKEND not in ('', LOCMEM_CACHE_BACKEND), cast=bool)
+if BALANCE_CACHE_ENABLED and CACHES['balances']['BACKEND'] == LOCMEM_CACHE_BACKEND:
+    raise ImproperlyConfigured(
+        'BALANCE_CACHE_ENABLED needs a shared BALANCE_CACHE_BACKEND; a per-process cache serves '
+        'balances other workers have changed')
+
+# With a per-process cache, other workers can keep serving a deactivated user or
+# old role for up to AUTH_USER_CACHE_TTL seconds; a shared backend removes that window
+AUTH_USER_CACHE_ALIAS = 'auth-users'
+
+# Recipient lookups: unknown numbers are remembered briefly, bulk requests are capped
+RECIPIENT_LOOKUP_CACHE_ALIAS = 'recipients'
+RECIPIENT_LOOKUP_NEGATIVE_TTL = config(
+    'RECIPIENT_LOOKUP_NEGATIVE_TTL', default=min(10, CACHES['recipients']['TIMEOUT']), cast=int)
+RECIPIENT_LOOKUP_MAX_BULK = config('RECIPIENT_LOOKUP_MAX_BULK', default=100, cast=int)
+
+# Per-request instrumentation: a REQUEST_METRICS_SAMPLE_RATE share of requests records
+# query count, SQL time, row-lock time and render time into a log line on banking_project.requests
+# and, with REQUEST_METRICS_SERVER_TIMING, a Server-Timing header. Sampled requests are
+# checked against REQUEST_BUDGETS (by URL name; keys queries, sql_ms, lock_ms, render_ms,
+# total_ms) and either log a warning or, with REQUEST_BUDGET_ACTION = 'raise', fail.
+REQUEST_METRICS_SAMPLE_RATE = config('REQUEST_METRICS_SAMPLE_RATE', default=0.0, cast=float)
+REQUEST_METRICS_SERVER_TIMING = config('REQUEST_METRICS_SERVER_TIMING', default=DEBUG, cast=bool)
+REQUEST_BUDGET_ACTION = config('REQUEST_BUDGET_ACTION', default='log')
+# Worst cases as measured by transactions.tests.RequestBudgetTests, which fails when a view
+# outgrows its budget. Each includes loading the request user on an auth cache miss.
+REQUEST_BUDGETS = {
+    'transaction-list': {'queries': 4},
+    'transaction-detail': {'queries': 2},
+    'transaction-summary': {'queries': 2},
+    'lookup-recipient': {'queries': 2},
+    'bulk-lookup-recipient': {'queries': 2},
+    'account-list': {'queries': 3},
+    'account-detail': {'queries': 2},
+    'account-balance': {'queries': 2},
+    'user-accounts': {'queries': 2},
+    # A user's first postings also create their rollup rows; sharded accounts credit a shard
+    # and read their available balance back, and a debit may fold the shards first
+    'deposit': {'queries': 14, 'lock_ms': 500},
+    'withdraw': {'queries': 17, 'lock_ms': 500},
+    'transfer': {'queries': 20, 'lock_ms': 500},
+}
+
+# Logging: records go through a queue to a background thread that writes them to stderr,
+# as JSON objects (LOG_FORMAT = 'json') or plain lines ('text'), tagged with the request id
+# from X-Request-ID. Secrets are removed and account numbers masked. Money-movement views
+# log a redacted request dump at DEBUG for LOG_REQUEST_DUMP_SAMPLE_RATE of requests.
+LOG_LEVEL = config('LOG_LEVEL', default='INFO')
+LOG_FORMAT = config('LOG_FORMAT', default='json')
+LOG_REQUEST_DUMP_SAMPLE_RATE = config('LOG_REQUEST_DUMP_SAMPLE_RATE', default=0.0, cast=float)
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'filters': {
+        'request_id': {'()': 'banking_project.structured_logging.RequestIdFilter'},
+    },
+    'formatters': {
+        'json': {'()': 'banking_project.structured_logging.JsonFormatter'},
+        'text': {
+            '()': 'banking_project.structured_logging.TextFormatter',
+            'format': '%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s',
+        },
+    },
+    'handlers': {
+        'background': {
+            '()': 'banking_project.structured_logging.BackgroundStreamHandler',
+            'formatter': LOG_FORMAT,
+            'filters': ['request_id'],
+        },
+    },
+    'root': {'handlers': ['background'], 'level': LOG_LEVEL},
+    'loggers': {
+        # Django's own handlers would print a second, unstructured copy
+        'django': {'handlers': ['background'], 'level': LOG_LEVEL, 'propagate': False},
+        'django.server': {'handlers': ['background'], 'level': LOG_LEVEL, 'propagate': False},
+    },
+}
+
+# Prometheus metrics are served at /metrics. Requests must carry METRICS_TOKEN as a bearer
+# token; without one the endpoint is only open under DEBUG. Gunicorn workers share metrics
+# through PROMETHEUS_MULTIPROC_DIR, see gunicorn.conf.py.
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+
 
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
@@ -169,17 +320,25 @@ USE_TZ = True
 STATIC_URL = "static/"
 STATIC_ROOT = "staticfiles"
 STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
-# Media files
+# Media files. Django only serves them with DEBUG on; in production the front-end
+# server maps MEDIA_URL to MEDIA_ROOT and can cache content-addressed profile
+# pictures (profile_pics/<2 hex>/<sha256>...) as immutable
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Profile pictures are stored under their content hash and resized to these
+# WebP variants (longest side in pixels) on a background thread pool
+PROFILE_IMAGE_VARIANTS = {'thumb': 64, 'small': 160, 'medium': 320}
+PROFILE_IMAGE_WEBP_QUALITY = config('PROFILE_IMAGE_WEBP_QUALITY', default=80, cast=int)
+PROFILE_IMAGE_WORKERS = config('PROFILE_IMAGE_WORKERS', default=2, cast=int)
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # REST Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'users.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
@@ -193,6 +352,47 @@ REST_FRAMEWORK = {
     ],
 }
 
+# Maximum number of legs accepted by the batch transfer endpoint
+BATCH_TRANSFER_MAX_LEGS = config('BATCH_TRANSFER_MAX_LEGS', default=5000, cast=int)
+
+# Rows fetched per server-side cursor round trip when streaming exports
+TRANSACTION_EXPORT_CHUNK_SIZE = config('TRANSACTION_EXPORT_CHUNK_SIZE', default=2000, cast=int)
+
+# Outbound ACH payment files: where they are written, the originator and
+# destination identities in their headers, and rows fetched per cursor round trip
+PAYMENT_FILE_DIR = config('PAYMENT_FILE_DIR', default=os.path.join(BASE_DIR, 'payment_files'))
+PAYMENT_FILE_ORIGIN_ROUTING = config('PAYMENT_FILE_ORIGIN_ROUTING', default='011000015')
+PAYMENT_FILE_ORIGIN_NAME = config('PAYMENT_FILE_ORIGIN_NAME', default='BANKING PROJECT')
+PAYMENT_FILE_DESTINATION_ROUTING = config('PAYMENT_FILE_DESTINATION_ROUTING', default='011000015')
+PAYMENT_FILE_DESTINATION_NAME = config('PAYMENT_FILE_DESTINATION_NAME', default='FEDERAL RESERVE BANK')
+PAYMENT_FILE_COMPANY_ID = config('PAYMENT_FILE_COMPANY_ID', default='1234567890')
+PAYMENT_FILE_COMPANY_NAME = config('PAYMENT_FILE_COMPANY_NAME', default='BANKING PROJECT')
+PAYMENT_FILE_CHUNK_SIZE = config('PAYMENT_FILE_CHUNK_SIZE', default=5000, cast=int)
+
+# Row-lock wait bound and retry policy for posting transactions
+ACCOUNT_LOCK_TIMEOUT_MS = config('ACCOUNT_LOCK_TIMEOUT_MS', default=2000, cast=int)
+ACCOUNT_LOCK_RETRIES = config('ACCOUNT_LOCK_RETRIES', default=3, cast=int)
+ACCOUNT_LOCK_RETRY_BACKOFF_MS = config('ACCOUNT_LOCK_RETRY_BACKOFF_MS', default=20, cast=int)
+
+# Hot receiving accounts can spread their credits over this many balance shards (admin
+# action); compact_balance_shards folds them back into the account row
+ACCOUNT_BALANCE_SHARDS = config('ACCOUNT_BALANCE_SHARDS', default=16, cast=int)
+
+# Annual interest rates by account type, accrued daily by accrue_interest on the balance
+# including shards; a day earns rate / days in its year, and sub-cent remainders carry over
+INTEREST_ANNUAL_RATES = {
+    'savings': config('INTEREST_SAVINGS_RATE', default='0.0200', cast=Decimal),
+}
+
+# Key of the account number permutation; changing it after go-live invites collisions
+ACCOUNT_NUMBER_KEY = config('ACCOUNT_NUMBER_KEY', default='account-numbers')
+
+# Refresh tokens are checked against a per-process filter of blacklisted jtis. New
+# blacklist rows from other processes are picked up every SYNC_INTERVAL seconds,
+# and the filter is rebuilt every REBUILD_INTERVAL seconds to shed pruned tokens.
+TOKEN_BLACKLIST_SYNC_INTERVAL = config('TOKEN_BLACKLIST_SYNC_INTERVAL', default=2.0, cast=float)
+TOKEN_BLACKLIST_REBUILD_INTERVAL = config('TOKEN_BLACKLIST_REBUILD_INTERVAL', default=3600, cast=int)
+
 # JWT Settings
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=60),
@@ -0,0 +1,156 @@
+from django.conf import settings
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import uuid
+
+# Values of these keys are never logged; account identifiers keep their last four characters
+SECRET_KEYS = ('password', 'token', 'secret', 'authorization', 'cookie', 'access', 'refresh', 'api_key')
+ACCOUNT_KEYS = ('account_number', 'routing_number', 'balance')
+REDACTED = '[redacted]'
+
+# Credentials that can end up in free text
+SECRET_PATTERNS = re.compile(r'(Bearer\s+)\S+|eyJ[\w-]+\.[\w-]+\.[\w-]+', re.IGNORECASE)
+
+# Attributes every LogRecord has; anything else was passed through extra=
+RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime', 'request_id'}
+
+REQUEST_ID_HEADER = 'X-Request-ID'
+REQUEST_ID_PATTERN = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+
+_request_id = contextvars.ContextVar('request_id', default=None)
+
+def current_request_id():
+    return _request_id.get()
+
+def _mask(value):
+    value = str(value)
+    return '*' * max(0, len(value) - 4) + value[-4:]
+
+def redact(value, key=''):
+    """Copy of value with secrets removed and account identifiers masked, at any depth"""
+    key = str(key).lower()
+    if any(secret in key for secret in SECRET_KEYS):
+        return REDACTED
+    if isinstance(value, dict):
+        return {k: redact(v, k) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [redact(item, key) for item in value]
+    if value is not None and any(account in key for account in ACCOUNT_KEYS):
+        return _mask(value)
+    if isinstance(value, str):
+        return redact_text(value)
+    return value
+
+def redact_text(text):
+    return SECRET_PATTERNS.sub(lambda match: f'{match.group(1) or ""}{REDACTED}', text)
+
+class RequestIdFilter(logging.Filter):
+    """Attach the current request's id to every record"""
+
+    def filter(self, record):
+        record.request_id = _request_id.get()
+        return True
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record with the extra= fields at top level, redacted"""
+
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': redact_text(record.getMessage()),
+            'request_id': getattr(record, 'request_id', None),
+        }
+        for key, value in vars(record).items():
+            if key not in RECORD_ATTRIBUTES and not key.startswith('_'):
+                entry[key] = redact(value, key)
+        if record.exc_info:
+            entry['exception'] = redact_text(self.formatException(record.exc_info))
+        elif record.exc_text:
+            entry['exception'] = redact_text(record.exc_text)
+        return json.dumps(entry, default=str)
+
+class TextFormatter(logging.Formatter):
+    """Plain one-line records for local development, with credentials removed from the text"""
+
+    def formatMessage(self, record):
+        return redact_text(super().formatMessage(record))
+
+class BackgroundStreamHandler(logging.handlers.QueueHandler):
+    """
+    Format records on the calling thread and write them to a stream from a
+    background thread, so a slow stdout or log shipper never blocks a request.
+    When the queue is full records are dropped and counted rather than waited on.
+    """
+
+    def __init__(self, stream=None, max_queue=10000):
+        super().__init__(queue.Queue(max_queue))
+        self.target = logging.StreamHandler(stream)
+        self.listener = None
+        self.pid = None
+        self.dropped = 0
+
+    def _start(self):
+        # A forked child inherits the queue but not the listener thread
+        self.queue = queue.Queue(self.queue.maxsize)
+        self.listener = logging.handlers.QueueListener(self.queue, self.target)
+        self.listener.start()
+        self.pid = os.getpid()
+
+    def enqueue(self, record):
+        if self.pid != os.getpid():
+            self._start()
+        try:
+            if self.dropped:
+                self.queue.put_nowait(logging.makeLogRecord({
+                    'name': __name__, 'levelno': logging.WARNING, 'levelname': 'WARNING',
+                    'msg': f'Dropped {self.dropped} log records while the queue was full',
+                }))
+                self.dropped = 0
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self):
+        if self.listener is not None and self.pid == os.getpid():
+            self.listener.stop()
+            self.listener = None
+        self.target.close()
+        super().close()
+
+class RequestIdMiddleware:
+    """Tag the request's log records with the caller's X-Request-ID, or a new one, and echo it back"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request_id = request.headers.get(REQUEST_ID_HEADER, '')
+        if not REQUEST_ID_PATTERN.match(request_id):
+            request_id = uuid.uuid4().hex
+        request.request_id = request_id
+        token = _request_id.set(request_id)
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_id.reset(token)
+        response[REQUEST_ID_HEADER] = request_id
+        return response
+
+def log_request_dump(logger, request):
+    """Log a redacted debug dump of a DRF request for LOG_REQUEST_DUMP_SAMPLE_RATE of requests"""
+    rate = settings.LOG_REQUEST_DUMP_SAMPLE_RATE
+    if rate <= 0 or not logger.isEnabledFor(logging.DEBUG) or random.random() >= rate:
+        return
+    logger.debug('%s %s request dump', request.method, request.path, extra={
+        'user_id': request.user.pk,
+        'data': redact(dict(request.data)),
+        'headers': redact(dict(request.headers)),
+    })
@@ -1,14 +1,22 @@
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from django.conf import settings
 from django.conf.urls.static import static
+from banking_project.metrics import metrics_view
+from users import images
+from users.views import profile_picture
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('metrics', metrics_view, name='metrics'),
     path('api/auth/', include('users.urls')),
     path('api/accounts/', include('accounts.urls')),
     path('api/transactions/', include('transactions.urls')),
 ]
 
 if settings.DEBUG:
+    # Outside DEBUG the front-end server serves MEDIA_ROOT (see MEDIA_URL in settings)
+    urlpatterns += [
+        re_path(rf"^{settings.MEDIA_URL.lstrip('/')}{images.UPLOAD_DIR}/(?P<path>.+)$", profile_picture),
+    ]
     urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
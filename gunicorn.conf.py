@@ -0,0 +1,18 @@
+import os
+import shutil
+
+# Each worker writes its metrics to files in PROMETHEUS_MULTIPROC_DIR and /metrics merges them.
+# Files left by an earlier run would be counted again, so the directory is emptied on startup.
+# Set the variable for gunicorn only: other processes writing there (management commands,
+# settlement workers) would be merged into the web workers' figures.
+
+def on_starting(server):
+    directory = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+    if directory:
+        shutil.rmtree(directory, ignore_errors=True)
+        os.makedirs(directory)
+
+def child_exit(server, worker):
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
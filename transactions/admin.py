@@ -1,6 +1,25 @@
 from django.contrib import admin
-from .models import Transaction
-import uuid
+from .models import PaymentFile, PaymentFileEntry, Transaction
+from .references import new_reference
+from .rollups import record_completed, record_reversed
+from .settlement import enqueue_settlements
+from accounts import services as balances
+
+def balance_effect(trans):
+    """{account_id: balance change} of a completed deposit or withdrawal entered in the admin"""
+    if trans is None or trans.status != 'completed':
+        return {}
+    if trans.transaction_type == 'deposit' and trans.to_account_id:
+        return {trans.to_account_id: trans.amount}
+    if trans.transaction_type == 'withdrawal' and trans.from_account_id:
+        return {trans.from_account_id: -trans.amount}
+    return {}
+
+def rollup_key(trans):
+    """What the rollups record of a transaction, or None when they leave it out"""
+    if trans is None or trans.status != 'completed':
+        return None
+    return (trans.user_id, trans.transaction_type, trans.amount, trans.from_account_id, trans.to_account_id)
 
 @admin.register(Transaction)
 class TransactionAdmin(admin.ModelAdmin):
@@ -14,7 +33,7 @@ class TransactionAdmin(admin.ModelAdmin):
     search_fields = [
         'reference_number', 'user__email', 'description', 'bank_name', 'beneficiary_name', 'routing_number', 'beneficiary_address'
     ]
-    readonly_fields = ['reference_number',]
+    readonly_fields = ['reference_number', 'payment_file']
     ordering = ['-created_at']
     actions = ['approve_external_transfers', 'reject_external_transfers']
 
@@ -26,7 +45,7 @@ class TransactionAdmin(admin.ModelAdmin):
             'fields': ('from_account', 'to_account')
         }),
         ('Transaction Details', {
-            'fields': ('amount', 'description', 'status', 'bank_name', 'beneficiary_name', 'routing_number', 'beneficiary_address')
+            'fields': ('amount', 'description', 'status', 'bank_name', 'beneficiary_name', 'routing_number', 'beneficiary_address', 'beneficiary_account_number', 'payment_file')
         }),
         ('Timestamps', {
             'fields': ('created_at', 'updated_at'),
@@ -34,47 +53,46 @@ class TransactionAdmin(admin.ModelAdmin):
         }),
     )
 
+    def payment_file(self, obj):
+        # Only settled external transfers have an entry, and only a claimed entry has a file
+        entry = PaymentFileEntry.objects.filter(transaction_id=obj.pk).select_related('payment_file').first()
+        return entry.payment_file if entry and entry.payment_file else '-'
+
     def approve_external_transfers(self, request, queryset):
-        for transaction in queryset.filter(transaction_type='external', status='pending'):
-            # Move funds here if needed
-            from_account = transaction.from_account
-            if from_account and from_account.can_debit(transaction.amount):
-                from_account.balance -= transaction.amount
-                from_account.save()
-                transaction.status = 'completed'
-                transaction.save()
-        self.message_user(request, "Selected external transfers have been approved and processed.")
+        queued = enqueue_settlements(queryset, 'approve')
+        self.message_user(request, f"{queued} pending external transfers queued for approval.")
     approve_external_transfers.short_description = "Approve selected pending external transfers"
 
     def reject_external_transfers(self, request, queryset):
-        for transaction in queryset.filter(transaction_type='external', status='pending'):
-            from_account = transaction.from_account
-            if from_account:
-                # Refund the amount if not already refunded
-                from_account.balance += transaction.amount
-                from_account.save()
-            transaction.status = 'cancelled'
-            transaction.save()
-        self.message_user(request, "Selected external transfers have been rejected and refunded.")
+        queued = enqueue_settlements(queryset, 'reject')
+        self.message_user(request, f"{queued} pending external transfers queued for rejection and refund.")
     reject_external_transfers.short_description = "Reject selected pending external transfers and refund sender"
 
     def save_model(self, request, obj, form, change):
         if not obj.reference_number:
-            prefix = {
-                'deposit': 'DEP',
-                'withdrawal': 'WTD',
-                'transfer': 'TRF',
-                'external': 'EXT'
-            }.get(obj.transaction_type, 'TRX')
-            obj.reference_number = f"{prefix}{uuid.uuid4().hex[:8].upper()}"
+            obj.reference_number = new_reference(obj.transaction_type)
+        # The change view runs in a transaction, so the stored row stays as read until commit
+        previous = Transaction.objects.select_for_update().filter(pk=obj.pk).first() if change else None
         super().save_model(request, obj, form, change)
-        # Update account balances for deposit
-        if obj.transaction_type == 'deposit' and obj.to_account and obj.status == 'completed':
-            account = obj.to_account
-            account.balance += obj.amount
-            account.save()
-        # Update account balances for withdrawal
-        if obj.transaction_type == 'withdrawal' and obj.from_account and obj.status == 'completed':
-            account = obj.from_account
-            account.balance -= obj.amount
-            account.save()
\ No newline at end of file
+        # Post only what the save changed, so re-saving a completed deposit or withdrawal moves nothing
+        before, after = balance_effect(previous), balance_effect(obj)
+        for account_id in sorted(before.keys() | after.keys()):
+            delta = after.get(account_id, 0) - before.get(account_id, 0)
+            if delta:
+                balances.adjust(account_id, delta)
+        # Rollups count every completed transaction, so they follow the same transitions
+        if rollup_key(previous) != rollup_key(obj):
+            if rollup_key(previous):
+                record_reversed([previous])
+            if rollup_key(obj):
+                record_completed([obj])
+
+@admin.register(PaymentFile)
+class PaymentFileAdmin(admin.ModelAdmin):
+    list_display = ['id', 'file_name', 'status', 'batch_count', 'entry_count', 'total_amount', 'created_at', 'generated_at']
+    list_filter = ['status', 'created_at']
+    readonly_fields = [field.name for field in PaymentFile._meta.fields]
+    ordering = ['-created_at']
+
+    def has_add_permission(self, request):
+        return False
@@ -2,4 +2,7 @@ from django.apps import AppConfig
 
 class TransactionsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'transactions'
\ No newline at end of file
+    name = 'transactions'
+
+    def ready(self):
+        from . import signals  # noqa: F401
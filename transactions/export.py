@@ -0,0 +1,79 @@
+from django.core.serializers.json import DjangoJSONEncoder
+import csv
+import zlib
+
+EXPORT_COLUMNS = [
+    ('id', 'id'),
+    ('reference_number', 'reference_number'),
+    ('created_at', 'created_at'),
+    ('transaction_type', 'transaction_type'),
+    ('status', 'status'),
+    ('amount', 'amount'),
+    ('description', 'description'),
+    ('user_id', 'user_id'),
+    ('from_account', 'from_account__account_number'),
+    ('to_account', 'to_account__account_number'),
+    ('bank_name', 'bank_name'),
+    ('beneficiary_name', 'beneficiary_name'),
+    ('routing_number', 'routing_number'),
+    ('beneficiary_address', 'beneficiary_address'),
+]
+
+EXPORT_FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+}
+
+# Rows are joined into chunks of roughly this size before being handed to the server
+FLUSH_BYTES = 64 * 1024
+
+class _Echo:
+    """File-like object whose write() returns the value instead of storing it"""
+    def write(self, value):
+        return value
+
+def _buffered(lines):
+    buffer = []
+    size = 0
+    for line in lines:
+        buffer.append(line)
+        size += len(line)
+        if size >= FLUSH_BYTES:
+            yield ''.join(buffer).encode('utf-8')
+            buffer = []
+            size = 0
+    if buffer:
+        yield ''.join(buffer).encode('utf-8')
+
+def export_rows(queryset, chunk_size):
+    """Stream the export columns of queryset through a server-side cursor"""
+    return queryset.values_list(*[source for _, source in EXPORT_COLUMNS]).iterator(chunk_size=chunk_size)
+
+def csv_lines(rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow([name for name, _ in EXPORT_COLUMNS])
+    for row in rows:
+        yield writer.writerow(
+            [value.isoformat() if hasattr(value, 'isoformat') else value for value in row]
+        )
+
+def ndjson_lines(rows):
+    names = [name for name, _ in EXPORT_COLUMNS]
+    encoder = DjangoJSONEncoder()
+    for row in rows:
+        yield encoder.encode(dict(zip(names, row))) + '\n'
+
+def gzip_chunks(chunks):
+    compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+def stream_export(queryset, export_format, chunk_size, compress=False):
+    """Return an iterator of encoded byte chunks for a transaction export"""
+    rows = export_rows(queryset, chunk_size)
+    lines = csv_lines(rows) if export_format == 'csv' else ndjson_lines(rows)
+    chunks = _buffered(lines)
+    return gzip_chunks(chunks) if compress else chunks
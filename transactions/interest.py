@@ -0,0 +1,180 @@
+from django.conf import settings
+from django.db import connection, models
+from django.utils import timezone
+from calendar import isleap
+from datetime import timedelta
+from decimal import Decimal, ROUND_DOWN, ROUND_HALF_EVEN
+
+from .models import InterestAccrualChunk, Transaction
+from .references import new_reference
+from .rollups import record_completed_in_bulk
+from accounts import balance_cache
+from accounts.locking import atomic_with_retry
+from accounts.models import Account
+from accounts.sharding import with_available_balance
+
+ZERO = Decimal('0.00')
+CENT = Decimal('0.01')
+# Precision of the sub-cent remainder carried to the next day (Account.accrued_interest)
+CARRY = Decimal('0.00000001')
+
+class AccrualGap(Exception):
+    """Some due accounts have days before the accrual date that were never accrued"""
+
+    def __init__(self, missed_date):
+        super().__init__(f'Some accounts have not been accrued for {missed_date}; accrue the days from then in order')
+        self.missed_date = missed_date
+
+def due_accounts(accrual_date):
+    """Active interest-bearing accounts not yet accrued for accrual_date"""
+    return Account.objects.filter(
+        account_type__in=settings.INTEREST_ANNUAL_RATES, status='active',
+    ).filter(models.Q(interest_accrued_on__isnull=True) | models.Q(interest_accrued_on__lt=accrual_date))
+
+def first_missed_date(accrual_date):
+    """The earliest day before accrual_date that a due account was not accrued for, or None"""
+    last_accrued = due_accounts(accrual_date).filter(
+        interest_accrued_on__lt=accrual_date - timedelta(days=1),
+    ).aggregate(earliest=models.Min('interest_accrued_on'))['earliest']
+    return last_accrued + timedelta(days=1) if last_accrued else None
+
+def accrual_ranges(accrual_date, chunk_size):
+    """Split the due accounts into (first_id, last_id) ranges of up to chunk_size accounts"""
+    ids = due_accounts(accrual_date).order_by('id').values_list('id', flat=True)
+    ranges = []
+    after = 0
+    while True:
+        # Each step reads chunk_size ids off the primary key, so planning is one pass over the accounts
+        last = ids.filter(id__gt=after)[chunk_size - 1:chunk_size].first() or ids.filter(id__gt=after).last()
+        if last is None:
+            return ranges
+        ranges.append((after + 1, last))
+        after = last
+
+def daily_rates(accrual_date):
+    days = 366 if isleap(accrual_date.year) else 365
+    return {account_type: rate / days for account_type, rate in settings.INTEREST_ANNUAL_RATES.items()}
+
+def accrue(balance, carry, daily_rate):
+    """
+    Return (posted, carry): a day's interest on balance plus the carried
+    remainder, truncated to whole cents, and the remainder left over.
+    """
+    accrued = max(balance, ZERO) * daily_rate + carry
+    posted = accrued.quantize(CENT, rounding=ROUND_DOWN)
+    return posted, (accrued - posted).quantize(CARRY, rounding=ROUND_HALF_EVEN)
+
+def _case(field, values, output_field):
+    return models.Case(
+        *[models.When(id=account_id, then=value) for account_id, value in values.items()],
+        default=models.F(field), output_field=output_field,
+    )
+
+def _post_accruals(accrual_date, postings, carries, now):
+    """Add each account's posted interest to its balance and store its carry and accrual date in one UPDATE"""
+    if connection.vendor == 'postgresql':
+        # Arrays keep the statement the same size whatever the chunk size; a CASE per
+        # account costs more to build in Python than the update costs to run
+        table = connection.ops.quote_name(Account._meta.db_table)
+        ids = list(carries)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {table} SET balance = {table}.balance + chunk.posted, accrued_interest = chunk.carry, "
+                f"interest_accrued_on = %s, updated_at = %s "
+                f"FROM unnest(%s::bigint[], %s::numeric[], %s::numeric[]) AS chunk (id, posted, carry) "
+                f"WHERE {table}.id = chunk.id",
+                [accrual_date, connection.ops.adapt_datetimefield_value(now), ids,
+                 [postings.get(account_id, ZERO) for account_id in ids], [carries[account_id] for account_id in ids]],
+            )
+        return
+    Account.objects.filter(id__in=carries).update(
+        balance=_case('balance', {
+            account_id: models.F('balance') + models.Value(posted) for account_id, posted in postings.items()
+        }, Account._meta.get_field('balance')),
+        accrued_interest=_case('accrued_interest', {
+            account_id: models.Value(carry) for account_id, carry in carries.items()
+        }, Account._meta.get_field('accrued_interest')),
+        interest_accrued_on=accrual_date,
+        updated_at=now,
+    )
+
+@atomic_with_retry
+def accrue_chunk(accrual_date, first_id, last_id):
+    """
+    Accrue a day's interest for the due accounts with first_id <= id <= last_id
+    in one transaction and return (accounts, credited, total_interest).
+
+    The accounts are read with their shards and locked in one query; balances,
+    carries and the accrual date are written in one UPDATE and the interest
+    transactions in one insert, along with an InterestAccrualChunk. An account
+    is due until a chunk marks it, so a rerun for the same date only picks up
+    accounts whose chunk did not commit.
+    """
+    queryset = with_available_balance(due_accounts(accrual_date).filter(id__gte=first_id, id__lte=last_id))
+    # Balances change but the key does not, so postings' foreign key checks need not wait
+    lock = {'no_key': True} if connection.features.has_select_for_no_key_update else {}
+    rows = list(
+        queryset.select_for_update(**lock).order_by('id')
+        .values_list('id', 'user_id', 'account_type', 'available', 'accrued_interest')
+    )
+    if not rows:
+        return 0, 0, ZERO
+
+    rates = daily_rates(accrual_date)
+    credits, carries = {}, {}
+    for account_id, _, account_type, balance, carry in rows:
+        posted, carries[account_id] = accrue(balance, carry, rates[account_type])
+        if posted:
+            credits[account_id] = posted
+
+    now = timezone.now()
+    _post_accruals(accrual_date, credits, carries, now)
+    users = {account_id: user_id for account_id, user_id, _, _, _ in rows}
+    interest = Transaction.objects.bulk_create([
+        Transaction(
+            user_id=users[account_id], to_account_id=account_id, transaction_type='interest',
+            amount=posted, description=f'Interest for {accrual_date.isoformat()}',
+            reference_number=new_reference('interest'), status='completed', created_at=now, updated_at=now,
+        )
+        for account_id, posted in credits.items()
+    ], batch_size=500)
+    record_completed_in_bulk(interest)
+    balance_cache.invalidate_on_commit(credits)
+
+    total = sum(credits.values(), ZERO)
+    InterestAccrualChunk.objects.create(
+        accrual_date=accrual_date, first_account_id=rows[0][0], last_account_id=rows[-1][0],
+        accounts=len(rows), credited=len(credits), total_interest=total,
+    )
+    return len(rows), len(credits), total
+
+def _accrue_chunk_in_worker(accrual_date, first_id, last_id):
+    try:
+        return accrue_chunk(accrual_date, first_id, last_id)
+    finally:
+        # The pool's workers are not request threads, so nothing else closes what they open
+        connection.close()
+
+def accrue_interest(accrual_date, pool, chunk_size, progress=None):
+    """
+    Accrue accrual_date's interest for every due account, one accrue_chunk per
+    id range, run on pool (an Executor). Returns (accounts, credited, total_interest).
+    Raises AccrualGap, before accruing anything, when an account missed an earlier day.
+    """
+    missed = first_missed_date(accrual_date)
+    if missed is not None:
+        raise AccrualGap(missed)
+    ranges = accrual_ranges(accrual_date, chunk_size)
+    # Workers open their own connections rather than share this process's
+    connection.close()
+    futures = [pool.submit(_accrue_chunk_in_worker, accrual_date, first_id, last_id) for first_id, last_id in ranges]
+    accounts = credited = 0
+    total = ZERO
+    for future in futures:
+        chunk_accounts, chunk_credited, chunk_total = future.result()
+        accounts += chunk_accounts
+        credited += chunk_credited
+        total += chunk_total
+        if progress:
+            progress(accounts, credited, total)
+    return accounts, credited, total
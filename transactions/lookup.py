@@ -0,0 +1,105 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, transaction
+import threading
+import time
+
+from accounts.models import Account
+
+# Stored for unknown or closed account numbers so repeated misses skip the database
+NOT_FOUND = 'not-found'
+
+# Entries are stored under the current version of their account number, as in
+# accounts.balance_cache: invalidation deletes the version, so a value filled
+# from a read that raced with the change lands under a version nobody asks for again.
+
+RECIPIENT_FIELDS = ['account_number', 'status', 'user__first_name', 'user__last_name', 'user__email']
+
+_stats = {'hits': 0, 'negative_hits': 0, 'misses': 0}
+_stats_lock = threading.Lock()
+
+def _cache():
+    return caches[settings.RECIPIENT_LOOKUP_CACHE_ALIAS]
+
+def _version_key(account_number):
+    return f'recipient:version:{account_number}'
+
+def _keys(cache, account_numbers):
+    """{account number: entry key under its current version}"""
+    version_keys = {number: _version_key(number) for number in account_numbers}
+    versions = cache.get_many(list(version_keys.values()))
+    for key in version_keys.values():
+        if key not in versions:
+            initial = time.time_ns()
+            cache.add(key, initial)
+            versions[key] = cache.get(key, initial)
+    return {number: f'recipient:{number}:{versions[key]}' for number, key in version_keys.items()}
+
+def _count(**counts):
+    with _stats_lock:
+        for name, value in counts.items():
+            _stats[name] += value
+
+def stats():
+    with _stats_lock:
+        counters = dict(_stats)
+    total = sum(counters.values())
+    counters['hit_rate'] = (counters['hits'] + counters['negative_hits']) / total if total else 0.0
+    return counters
+
+def _recipient(account):
+    return {
+        'name': f"{account.user.first_name} {account.user.last_name}",
+        'email': account.user.email,
+        'account_number': account.account_number,
+    }
+
+def _load(account_numbers):
+    # Read from the primary so a lagging replica cannot refill an invalidated entry
+    accounts = (
+        Account.objects.using(DEFAULT_DB_ALIAS).select_related('user').only(*RECIPIENT_FIELDS)
+        .filter(account_number__in=account_numbers)
+    )
+    return {account.account_number: _recipient(account) for account in accounts if account.status != 'closed'}
+
+def lookup_recipients(account_numbers):
+    """Resolve account numbers to recipient details; unknown or closed numbers map to None"""
+    account_numbers = list(dict.fromkeys(account_numbers))
+    # Reads inside a transaction may see uncommitted rows, so they are neither served from nor stored in the cache
+    if transaction.get_connection().in_atomic_block:
+        found = _load(account_numbers)
+        return {number: found.get(number) for number in account_numbers}
+
+    cache = _cache()
+    keys = _keys(cache, account_numbers)
+    cached = cache.get_many(list(keys.values()))
+    results = {}
+    missing = []
+    for number in account_numbers:
+        entry = cached.get(keys[number])
+        if entry is None:
+            missing.append(number)
+        else:
+            results[number] = None if entry == NOT_FOUND else entry
+    _count(hits=sum(1 for number in results if results[number] is not None),
+           negative_hits=sum(1 for number in results if results[number] is None),
+           misses=len(missing))
+
+    if missing:
+        found = _load(missing)
+        cache.set_many({keys[number]: entry for number, entry in found.items()})
+        unknown = [number for number in missing if number not in found]
+        if unknown:
+            cache.set_many({keys[number]: NOT_FOUND for number in unknown},
+                           timeout=settings.RECIPIENT_LOOKUP_NEGATIVE_TTL)
+        for number in missing:
+            results[number] = found.get(number)
+    return results
+
+def lookup_recipient(account_number):
+    return lookup_recipients([account_number])[account_number]
+
+def invalidate_on_commit(account_numbers):
+    account_numbers = [number for number in account_numbers if number]
+    if account_numbers:
+        transaction.on_commit(lambda: _cache().delete_many([_version_key(number) for number in account_numbers]))
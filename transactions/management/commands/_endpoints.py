@@ -0,0 +1,13 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import resolve
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+def call_endpoint(path, user, method='get', data=None):
+    """Call an API view in-process as user and return (response, captured queries)"""
+    request = getattr(APIRequestFactory(), method)(path, data, format='json' if data else None)
+    force_authenticate(request, user=user)
+    match = resolve(path.split('?')[0])
+    with override_settings(ALLOWED_HOSTS=['testserver']), CaptureQueriesContext(connection) as queries:
+        response = match.func(request, *match.args, **match.kwargs)
+    return response, queries.captured_queries
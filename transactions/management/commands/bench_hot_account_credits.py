@@ -0,0 +1,116 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from decimal import Decimal
+import threading
+import time
+import uuid
+
+from accounts.locking import AccountLockConflict
+from accounts.models import Account
+from accounts.sharding import available_balance, compact_account, set_balance_shards
+from transactions.rollups import (
+    ACCOUNT_SUMMARY_FIELDS, compute_account_rollups, diff_rollups, fold_summary_shards, stored_account_rollups,
+)
+from transactions.services import post_transfer
+from users.models import User
+
+AMOUNT = Decimal('1.00')
+
+class Command(BaseCommand):
+    help = ('Benchmark transfers from many senders into a single hot account, with its credits on the '
+            'account row and then spread over balance shards, and check the balances and rollups after each run')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=16, help='Concurrent senders, one account each')
+        parser.add_argument('--duration', type=float, default=10.0, help='Seconds per case')
+        parser.add_argument('--shards', type=int, default=16)
+        parser.add_argument('--compact-interval', type=float, default=1.0,
+                            help='Seconds between compactions during the sharded case')
+        parser.add_argument('--keep', action='store_true', help='Keep the generated users and accounts')
+
+    def handle(self, *args, **options):
+        if connection.vendor == 'sqlite':
+            raise CommandError('SQLite serialises all writers; run this against PostgreSQL or MySQL.')
+        suffix = uuid.uuid4().hex[:8]
+        users = [
+            User.objects.create_user(
+                username=f'hot-{suffix}-{i}', email=f'hot-{suffix}-{i}@example.com',
+                password=None, first_name='Hot', last_name=str(i))
+            for i in range(options['threads'] + 1)
+        ]
+        hot = Account.objects.create(user=users[0], account_type='business')
+        senders = [Account.objects.create(user=user, balance=Decimal('1000000.00')) for user in users[1:]]
+        try:
+            self.run_case('account row', hot, senders, options, compact=False)
+            set_balance_shards(hot.id, options['shards'])
+            self.run_case(f"{options['shards']} shards", hot, senders, options, compact=True)
+        finally:
+            if not options['keep']:
+                User.objects.filter(id__in=[user.id for user in users]).delete()
+
+    def run_case(self, name, hot, senders, options, compact):
+        hot = Account.objects.get(id=hot.id)
+        before = available_balance(hot.id)
+        stop = threading.Event()
+        lock = threading.Lock()
+        latencies = []
+        outcomes = {'completed': 0, 'conflict': 0}
+
+        def sender(account):
+            own = []
+            conflicts = 0
+            try:
+                while not stop.is_set():
+                    started = time.perf_counter()
+                    try:
+                        post_transfer(account.user, account, hot, AMOUNT)
+                    except AccountLockConflict:
+                        conflicts += 1
+                        continue
+                    own.append(time.perf_counter() - started)
+            finally:
+                connections.close_all()
+            with lock:
+                latencies.extend(own)
+                outcomes['completed'] += len(own)
+                outcomes['conflict'] += conflicts
+
+        def compactor():
+            try:
+                while not stop.wait(options['compact_interval']):
+                    compact_account(hot.id, fold_summary_shards)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=sender, args=(account,)) for account in senders]
+        if compact:
+            threads.append(threading.Thread(target=compactor))
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        time.sleep(options['duration'])
+        stop.set()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        latencies.sort()
+        p50 = latencies[len(latencies) // 2] * 1000 if latencies else 0
+        p99 = latencies[int(len(latencies) * 0.99)] * 1000 if latencies else 0
+        self.stdout.write(
+            f"{name:<14} {outcomes['completed'] / elapsed:>8.0f} credits/s  p50 {p50:>7.2f} ms  "
+            f"p99 {p99:>7.2f} ms  {outcomes['conflict']} lock conflicts"
+        )
+
+        expected = before + AMOUNT * outcomes['completed']
+        actual = available_balance(hot.id)
+        rollup_diffs = diff_rollups(
+            compute_account_rollups(hot.id, hot.id), stored_account_rollups(hot.id, hot.id), ACCOUNT_SUMMARY_FIELDS)
+        if actual != expected or rollup_diffs:
+            raise CommandError(f'{name}: balance {actual}, expected {expected}; rollups differ: {bool(rollup_diffs)}')
+        if compact:
+            compact_account(hot.id, fold_summary_shards)
+            hot.refresh_from_db()
+            if hot.balance != expected:
+                raise CommandError(f'{name}: compacted balance {hot.balance}, expected {expected}')
+        self.stdout.write(f"{'':<14} balance {actual} matches the {outcomes['completed']} credits and the rollups")
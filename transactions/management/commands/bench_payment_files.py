@@ -0,0 +1,116 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from decimal import Decimal
+import multiprocessing
+import os
+import random
+import resource
+import tempfile
+import time
+import uuid
+
+from accounts.models import Account
+from transactions.models import PaymentFile, Transaction
+from transactions.payment_files import (
+    BLOCKING_FACTOR, RECORD_SIZE, claim_entries, eligible_entries, queue_for_payment, write_payment_file,
+)
+from transactions.references import new_reference
+from users.models import User
+
+def routing_number(prefix):
+    digits = [int(digit) for digit in f'{prefix:08d}']
+    total = 3 * (digits[0] + digits[3] + digits[6]) + 7 * (digits[1] + digits[4] + digits[7]) + digits[2] + digits[5]
+    return f'{prefix:08d}{(10 - total % 10) % 10}'
+
+class Command(BaseCommand):
+    help = ('Seed approved external transfers, write them to one ACH file and report entries per '
+            'second and how much the peak memory grew while writing; fails below --target entries/s')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--transfers', type=int, default=1000000)
+        parser.add_argument('--routing-numbers', type=int, default=500)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--chunk-size', type=int)
+        parser.add_argument('--target', type=float, default=25000, help='Minimum entries/s')
+
+    def handle(self, *args, **options):
+        suffix = uuid.uuid4().hex[:8]
+        user = User.objects.create_user(
+            username=f'ach-{suffix}', email=f'ach-{suffix}@example.com',
+            password=None, first_name='Payment', last_name='Bench')
+        account = Account.objects.create(user=user)
+        try:
+            # Seed from a child process so this one's peak RSS reflects the writer alone
+            connections.close_all()
+            process = multiprocessing.get_context('fork').Process(target=self.seed, args=(user, account, options))
+            process.start()
+            process.join()
+            if process.exitcode:
+                raise CommandError('Seeding failed')
+            with tempfile.TemporaryDirectory() as directory:
+                self.run(user, directory, options)
+        finally:
+            files = list(PaymentFile.objects.filter(entries__transaction__user=user).distinct().values_list('id', flat=True))
+            Transaction.objects.filter(user=user).delete()
+            PaymentFile.objects.filter(id__in=files).delete()
+            user.delete()
+
+    def seed(self, user, account, options):
+        rng = random.Random(0)
+        routing_numbers = [routing_number(rng.randrange(10 ** 7, 10 ** 8)) for _ in range(options['routing_numbers'])]
+        started = time.perf_counter()
+        total = options['transfers']
+        for offset in range(0, total, options['batch_size']):
+            with transaction.atomic():
+                queue_for_payment(Transaction.objects.bulk_create([
+                    Transaction(user=user, from_account=account, transaction_type='external', status='completed',
+                                amount=Decimal(rng.randrange(100, 10 ** 6)) / 100,
+                                reference_number=new_reference('external'),
+                                routing_number=rng.choice(routing_numbers),
+                                beneficiary_account_number=str(rng.randrange(10 ** 9, 10 ** 12)),
+                                beneficiary_name=f'Beneficiary {i}')
+                    for i in range(offset, min(offset + options['batch_size'], total))
+                ]))
+        self.stdout.write(f'Seeded {total} transfers in {time.perf_counter() - started:.1f}s')
+        connections.close_all()
+
+    def run(self, user, directory, options):
+        rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        started = time.perf_counter()
+        queryset = eligible_entries().filter(transaction__user=user)
+        paths = []
+        # Files close at the ACH total amount limit and leave the rest for the next one
+        while True:
+            payment_file = claim_entries(queryset=queryset)
+            if payment_file is None:
+                break
+            with transaction.atomic():
+                paths.append(write_payment_file(payment_file, directory, options['chunk_size']))
+        elapsed = time.perf_counter() - started
+        growth_mb = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before) / 1024
+
+        files = PaymentFile.objects.filter(file_name__in=[os.path.basename(path) for path in paths])
+        entries = sum(self.verify(path) for path in paths)
+        expected = Transaction.objects.filter(user=user).count()
+        if entries != expected or sum(files.values_list('entry_count', flat=True)) != expected:
+            raise CommandError(f'Expected {expected} entries, found {entries}')
+        rate = entries / elapsed
+        self.stdout.write(
+            f'{entries} entries in {len(paths)} files, {sum(os.path.getsize(path) for path in paths) / 2 ** 20:.0f} MiB '
+            f'in {elapsed:.1f}s: {rate:.0f} entries/s, peak RSS grew {growth_mb:.0f} MiB'
+        )
+        if rate < options['target']:
+            raise CommandError(f"Below the target of {options['target']:.0f} entries/s")
+
+    def verify(self, path):
+        """Check the record layout of a file and return its entry count"""
+        entries = lines = 0
+        with open(path, encoding='ascii') as output:
+            for line in output:
+                lines += 1
+                if len(line.rstrip('\n')) != RECORD_SIZE:
+                    raise CommandError(f'{path}: line {lines} is not {RECORD_SIZE} characters')
+                entries += line.startswith('6')
+        if lines % BLOCKING_FACTOR:
+            raise CommandError(f'{path}: not padded to a whole block')
+        return entries
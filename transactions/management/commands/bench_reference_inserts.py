@@ -0,0 +1,63 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from decimal import Decimal
+import time
+import uuid
+
+from transactions.models import Transaction
+from transactions.references import new_reference
+from users.models import User
+
+def random_reference(transaction_type):
+    return f"TRF{uuid.uuid4().hex[:8].upper()}"
+
+class Command(BaseCommand):
+    help = ('Benchmark inserting transactions with random uuid4 references against time-ordered '
+            'references, counting rows lost to reference collisions; on PostgreSQL also report how '
+            'much the unique index grew per row')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=200000)
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        suffix = uuid.uuid4().hex[:8]
+        user = User.objects.create_user(
+            username=f'ref-{suffix}', email=f'ref-{suffix}@example.com',
+            password=None, first_name='Reference', last_name='Bench')
+        try:
+            for name, generate in [('uuid4().hex[:8]', random_reference),
+                                   ('time-ordered', new_reference)]:
+                self.run_case(name, generate, user, options['rows'], options['batch_size'])
+        finally:
+            user.delete()
+
+    def index_size(self):
+        if connection.vendor != 'postgresql':
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT pg_relation_size(indexrelid) FROM pg_index "
+                "JOIN pg_attribute ON attrelid = indrelid AND attnum = indkey[0] "
+                "WHERE indrelid = 'transactions'::regclass AND indisunique AND attname = 'reference_number'"
+            )
+            row = cursor.fetchone()
+        return row[0] if row else None
+
+    def run_case(self, name, generate, user, rows, batch_size):
+        size_before = self.index_size()
+        existing = Transaction.objects.filter(user=user).count()
+        started = time.perf_counter()
+        for offset in range(0, rows, batch_size):
+            with transaction.atomic():
+                Transaction.objects.bulk_create([
+                    Transaction(user=user, transaction_type='transfer', amount=Decimal('1.00'),
+                                reference_number=generate('transfer'), status='failed')
+                    for _ in range(min(batch_size, rows - offset))
+                ], ignore_conflicts=True)
+        elapsed = time.perf_counter() - started
+        collisions = rows - (Transaction.objects.filter(user=user).count() - existing)
+        line = f'{name:<16} {rows / elapsed:>10.0f} rows/s  {collisions:>6} collisions'
+        if size_before is not None:
+            line += f'  index +{(self.index_size() - size_before) / rows:.1f} bytes/row'
+        self.stdout.write(line)
@@ -0,0 +1,97 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from decimal import Decimal
+import uuid
+
+from accounts.models import Account
+from transactions.services import post_deposit, post_transfer
+from users.models import User
+from ._endpoints import call_endpoint
+
+# Maximum queries per endpoint with full pages; a per-row query shows up as a large overshoot
+QUERY_BUDGETS = {
+    'user GET /api/transactions/': 3,
+    'user GET /api/transactions/?pagination=cursor': 3,
+    'user GET /api/transactions/{transaction}/': 1,
+    'user GET /api/transactions/summary/': 1,
+    'user GET /api/transactions/lookup/?account_number={recipient}': 1,
+    'admin GET /api/transactions/': 2,
+    'admin GET /api/transactions/?pagination=cursor': 2,
+    'user GET /api/accounts/': 2,
+    'user GET /api/accounts/{account}/': 1,
+    'user GET /api/accounts/{account}/balance/': 1,
+    'user GET /api/accounts/my-accounts/': 1,
+    'admin GET /api/accounts/': 2,
+    # Postings include a SAVEPOINT/RELEASE pair because the check runs inside its rollback transaction
+    'user POST /api/transactions/deposit/': 8,
+    'user POST /api/transactions/transfer/': 11,
+    'user POST /api/transactions/lookup/bulk/': 1,
+}
+
+def seed():
+    """Create three users with full pages of postings and return the values the budgets need"""
+    suffix = uuid.uuid4().hex[:8]
+    users = [
+        User.objects.create_user(
+            username=f'qc-{suffix}-{i}', email=f'qc-{suffix}-{i}@example.com', password=None,
+            first_name='Count', last_name=str(i), role='admin' if i == 0 else 'user')
+        for i in range(3)
+    ]
+    admin, user, other = users
+    account = Account.objects.create(user=user, balance=Decimal('10000.00'))
+    Account.objects.create(user=user, account_type='checking', balance=Decimal('0.00'))
+    recipient = Account.objects.create(user=other, balance=Decimal('10000.00'))
+    for _ in range(15):
+        post_deposit(user, account, Decimal('5.00'))
+        post_transfer(user, account, recipient, Decimal('1.00'))
+        post_transfer(other, recipient, account, Decimal('1.00'))
+    trans = post_deposit(user, account, Decimal('1.00'))
+    return {
+        'admin': admin,
+        'user': user,
+        'account': account.id,
+        'recipient': recipient.account_number,
+        'transaction': trans.id,
+        'payloads': {
+            '/api/transactions/deposit/': {'account_id': account.id, 'amount': '1.00'},
+            '/api/transactions/transfer/': {
+                'from_account_id': account.id, 'to_account_number': recipient.account_number, 'amount': '1.00'},
+            '/api/transactions/lookup/bulk/': {
+                'account_numbers': [recipient.account_number, account.account_number, '0000000000']},
+        },
+    }
+
+class Rollback(Exception):
+    pass
+
+class Command(BaseCommand):
+    help = ('Call every endpoint against a small throwaway dataset with full pages and fail if any '
+            'runs more queries than its budget. Everything is rolled back afterwards.')
+
+    def handle(self, *args, **options):
+        failures = []
+        try:
+            with transaction.atomic():
+                context = seed()
+                for key, budget in QUERY_BUDGETS.items():
+                    failures += self.check_budget(key, budget, context)
+                raise Rollback
+        except Rollback:
+            pass
+        if failures:
+            raise CommandError('Query budgets exceeded:\n' + '\n'.join(failures))
+        self.stdout.write(self.style.SUCCESS('Every endpoint is within its query budget'))
+
+    def check_budget(self, key, budget, context):
+        actor, method, path = key.split(' ', 2)
+        path = path.format(**context)
+        data = context['payloads'].get(path)
+        response, queries = call_endpoint(path, context[actor], method.lower(), data)
+        label = f'{actor} {method} {path}'
+        if response.status_code >= 400:
+            self.stdout.write(f"{self.style.ERROR('FAIL')} {label}: HTTP {response.status_code}")
+            return [f'{label}: HTTP {response.status_code}']
+        ok = len(queries) <= budget
+        status = self.style.SUCCESS('ok') if ok else self.style.ERROR('FAIL')
+        self.stdout.write(f'{status:<4} {label} ({len(queries)}/{budget} queries)')
+        return [] if ok else [f'{label}: {len(queries)} queries, budget {budget}']
@@ -0,0 +1,135 @@
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+from datetime import timedelta
+from decimal import Decimal
+import json
+import random
+
+from accounts.models import Account
+from transactions.models import Transaction
+from users.models import User
+from ._endpoints import call_endpoint
+
+CHECKED_TABLES = {'transactions', 'accounts'}
+
+class Rollback(Exception):
+    pass
+
+class Command(BaseCommand):
+    help = ('Seed a throwaway dataset, call every read endpoint, EXPLAIN the SQL it runs and fail '
+            'if any filtered query on transactions or accounts falls back to a sequential scan. '
+            'Everything is rolled back afterwards; PostgreSQL only.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=2000)
+        parser.add_argument('--transactions-per-user', type=int, default=50)
+        parser.add_argument('--verbose-plans', action='store_true')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Query plan checks require PostgreSQL')
+        self.options = options
+        failures = []
+        try:
+            with transaction.atomic():
+                user, admin, account, trans = self.seed(options['users'], options['transactions_per_user'])
+                for path, actor in self.endpoints(user, admin, account, trans):
+                    failures += self.check_endpoint(path, actor)
+                raise Rollback
+        except Rollback:
+            pass
+        if failures:
+            raise CommandError('Sequential scans found:\n' + '\n'.join(failures))
+        self.stdout.write(self.style.SUCCESS('No endpoint regressed to a sequential scan'))
+
+    def endpoints(self, user, admin, account, trans):
+        return [
+            ('/api/transactions/', user),
+            ('/api/transactions/?pagination=cursor', user),
+            ('/api/transactions/?transaction_type=transfer&status=completed', user),
+            ('/api/transactions/?search=' + trans.reference_number, user),
+            (f'/api/transactions/{trans.id}/', user),
+            ('/api/transactions/summary/', user),
+            (f'/api/transactions/lookup/?account_number={account.account_number}', user),
+            ('/api/transactions/?pagination=cursor', admin),
+            ('/api/accounts/', user),
+            (f'/api/accounts/{account.id}/', user),
+            (f'/api/accounts/{account.id}/balance/', user),
+            ('/api/accounts/my-accounts/', user),
+            ('/api/accounts/', admin),
+        ]
+
+    def seed(self, user_count, per_user):
+        self.stdout.write(f'Seeding {user_count} users and {user_count * per_user} transactions...')
+        rng = random.Random(0)
+        password = make_password(None)
+        users = User.objects.bulk_create([
+            User(username=f'qp-{i}', email=f'qp-{i}@example.com', password=password,
+                 first_name='Plan', last_name=str(i), role='admin' if i == 0 else 'user')
+            for i in range(user_count)
+        ])
+        accounts = Account.objects.bulk_create([
+            Account(user=user, account_number=f'QP{i:08d}', balance=Decimal('1000.00'))
+            for i, user in enumerate(users)
+        ])
+        types = [choice for choice, _ in Transaction.TRANSACTION_TYPES]
+        statuses = [choice for choice, _ in Transaction.STATUS_CHOICES]
+        now = timezone.now()
+        rows = []
+        for n in range(user_count * per_user):
+            sender = rng.randrange(user_count)
+            kind = rng.choice(types)
+            rows.append(Transaction(
+                user=users[sender],
+                from_account=accounts[sender] if kind != 'deposit' else None,
+                to_account=accounts[rng.randrange(user_count)] if kind in ('deposit', 'transfer') else None,
+                transaction_type=kind,
+                amount=Decimal(rng.randint(1, 100000)) / 100,
+                reference_number=f'QP{n:010d}',
+                status=rng.choice(statuses),
+                created_at=now - timedelta(seconds=rng.randrange(365 * 86400)),
+            ))
+        Transaction.objects.bulk_create(rows, batch_size=5000)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE transactions')
+            cursor.execute('ANALYZE accounts')
+        owned = next(row for row in reversed(rows) if row.user_id == users[1].id)
+        return users[1], users[0], accounts[1], owned
+
+    def check_endpoint(self, path, actor):
+        response, queries = call_endpoint(path, actor)
+        label = f"{'admin' if actor.is_admin else 'user'} GET {path}"
+        if response.status_code >= 400:
+            return [f'{label}: HTTP {response.status_code}']
+
+        failures = []
+        checked = 0
+        for query in queries:
+            sql = query['sql']
+            # Unfiltered reads such as the admin page count scan the table by design
+            if not sql.startswith('SELECT') or ' WHERE ' not in sql:
+                continue
+            with connection.cursor() as cursor:
+                cursor.execute('EXPLAIN (FORMAT JSON) ' + sql)
+                plan = cursor.fetchone()[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            checked += 1
+            scans = sorted(self.seq_scans(plan[0]['Plan']))
+            if scans:
+                failures.append(f"{label}: Seq Scan on {', '.join(scans)} in: {sql}")
+            if self.options['verbose_plans']:
+                self.stdout.write(json.dumps(plan[0]['Plan'], indent=2))
+        status = self.style.ERROR('FAIL') if failures else self.style.SUCCESS('ok')
+        self.stdout.write(f'{status:<4} {label} ({len(queries)} queries, {checked} explained)')
+        return failures
+
+    def seq_scans(self, node):
+        # A scan without a Filter is the build side of a join (e.g. select_related), not a missed index
+        if (node.get('Node Type') == 'Seq Scan' and node.get('Relation Name') in CHECKED_TABLES
+                and 'Filter' in node):
+            yield node['Relation Name']
+        for child in node.get('Plans', []):
+            yield from self.seq_scans(child)
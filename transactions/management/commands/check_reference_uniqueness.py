@@ -0,0 +1,63 @@
+from django.core.management.base import BaseCommand, CommandError
+import heapq
+import multiprocessing
+import os
+import tempfile
+import time
+
+from transactions.references import new_reference
+
+def _generate(args):
+    """Write count references to path, one per line, and report whether they increased"""
+    path, count = args
+    previous = ''
+    increasing = True
+    with open(path, 'w') as output:
+        for _ in range(count):
+            reference = new_reference('transfer')
+            increasing = increasing and reference > previous
+            previous = reference
+            output.write(reference + '\n')
+    return increasing
+
+class Command(BaseCommand):
+    help = ('Generate references in several forked worker processes and check that they are all '
+            'unique and strictly increasing within each process')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=os.cpu_count() or 4)
+        parser.add_argument('--per-process', type=int, default=1_000_000)
+
+    def handle(self, *args, **options):
+        processes, per_process = options['processes'], options['per_process']
+        # Draw once so every child inherits generator state that the fork hook must reset
+        new_reference('transfer')
+        context = multiprocessing.get_context('fork')
+
+        with tempfile.TemporaryDirectory() as directory:
+            paths = [os.path.join(directory, f'worker-{i}.txt') for i in range(processes)]
+            started = time.perf_counter()
+            with context.Pool(processes) as pool:
+                increasing = pool.map(_generate, [(path, per_process) for path in paths])
+            elapsed = time.perf_counter() - started
+            if not all(increasing):
+                raise CommandError('A worker issued references out of order')
+
+            # Each file is sorted already, so a k-way merge puts any duplicate next to its twin
+            files = [open(path) for path in paths]
+            try:
+                previous = None
+                total = 0
+                for reference in heapq.merge(*files):
+                    if reference == previous:
+                        raise CommandError(f'Duplicate reference {reference.strip()}')
+                    previous = reference
+                    total += 1
+            finally:
+                for handle in files:
+                    handle.close()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{total} references from {processes} processes are unique '
+            f'({total / elapsed:.0f} references/s)'
+        ))
@@ -0,0 +1,107 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test import Client
+from django.test.utils import override_settings
+from decimal import Decimal
+from contextlib import ExitStack
+from rest_framework_simplejwt.tokens import AccessToken
+import time
+import uuid
+
+from accounts.models import Account
+from banking_project import db_routing
+from transactions.services import post_deposit
+from users.models import User
+
+class Command(BaseCommand):
+    help = ('Call endpoints through the full middleware stack and check which database alias '
+            'served the transaction queries: replicas for plain reads, the primary for writes, '
+            'for reads right after a write and when every replica lags. Needs DB_REPLICA_HOSTS; '
+            'pointing a replica at the primary is enough to run it locally.')
+
+    def handle(self, *args, **options):
+        if not settings.REPLICA_DATABASES:
+            raise CommandError('No replicas configured; set DB_REPLICA_HOSTS')
+        suffix = uuid.uuid4().hex[:8]
+        users = []
+        for name in ('writer', 'reader'):
+            user = User.objects.create_user(
+                username=f'rr-{name}-{suffix}', email=f'rr-{name}-{suffix}@example.com',
+                password=None, first_name='Routing', last_name=name)
+            post_deposit(user, Account.objects.create(user=user), Decimal('10.00'))
+            users.append(user)
+        writer, reader = users
+        try:
+            self.wait_for_replicas(reader)
+            # One process, so the sticky cache is shared with every request made here
+            with override_settings(REPLICA_READS_ENABLED=True):
+                failures = self.run_checks(writer, reader)
+        finally:
+            for user in users:
+                user.delete()
+        if failures:
+            raise CommandError('Routing checks failed:\n' + '\n'.join(failures))
+        self.stdout.write(self.style.SUCCESS('Reads and writes were routed as expected'))
+
+    def wait_for_replicas(self, user, timeout=10):
+        deadline = time.monotonic() + timeout
+        for alias in settings.REPLICA_DATABASES:
+            while not User.objects.using(alias).filter(id=user.id).exists():
+                if time.monotonic() > deadline:
+                    raise CommandError(f'Seed data did not reach {alias} within {timeout}s')
+                time.sleep(0.1)
+
+    def call(self, method, path, user, data=None):
+        """Return the aliases that ran queries on the transactions table during the request"""
+        aliases = set()
+
+        def recorder(alias):
+            def record(execute, sql, params, many, context):
+                if '"transactions"' in sql or '`transactions`' in sql:
+                    aliases.add(alias)
+                return execute(sql, params, many, context)
+            return record
+
+        client = Client(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}')
+        with ExitStack() as stack:
+            stack.enter_context(override_settings(ALLOWED_HOSTS=['testserver']))
+            for alias in [DEFAULT_DB_ALIAS, *settings.REPLICA_DATABASES]:
+                stack.enter_context(connections[alias].execute_wrapper(recorder(alias)))
+            response = getattr(client, method)(path, data, content_type='application/json')
+        if response.status_code >= 400:
+            raise CommandError(f'{method.upper()} {path}: HTTP {response.status_code}')
+        return aliases
+
+    def run_checks(self, writer, reader):
+        sticky = caches[settings.REPLICA_STICKY_CACHE_ALIAS]
+        for user in (writer, reader):
+            sticky.delete(db_routing._sticky_key(user.id))
+        account = writer.accounts.get()
+        replicas = set(settings.REPLICA_DATABASES)
+        primary = {DEFAULT_DB_ALIAS}
+
+        checks = [
+            ('plain read uses a replica', lambda: self.call('get', '/api/transactions/', writer), replicas),
+            ('posting uses the primary', lambda: self.call(
+                'post', '/api/transactions/deposit/', writer, {'account_id': account.id, 'amount': '1.00'}), primary),
+            ('read after a write sticks to the primary', lambda: self.call('get', '/api/transactions/', writer), primary),
+            ('other users still read from a replica', lambda: self.call('get', '/api/transactions/', reader), replicas),
+        ]
+        failures = []
+        for label, run, expected in checks:
+            failures += self.report(label, run(), expected)
+
+        db_routing.replica_health.checked_at.clear()
+        with override_settings(REPLICA_MAX_LAG_SECONDS=-1):
+            aliases = self.call('get', '/api/transactions/', reader)
+        db_routing.replica_health.checked_at.clear()
+        failures += self.report('lagging replicas are skipped', aliases, primary)
+        return failures
+
+    def report(self, label, aliases, expected):
+        ok = bool(aliases) and aliases <= expected
+        status = self.style.SUCCESS('ok') if ok else self.style.ERROR('FAIL')
+        self.stdout.write(f"{status:<4} {label} ({', '.join(sorted(aliases)) or 'no queries'})")
+        return [] if ok else [f"{label}: ran on {', '.join(sorted(aliases)) or 'nothing'}"]
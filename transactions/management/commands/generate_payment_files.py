@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from transactions.payment_files import MAX_FILE_ENTRIES, eligible_entries, generate_payment_files, unfiled_entries
+
+class Command(BaseCommand):
+    help = ('Write approved external transfers that are not in a payment file yet to a new ACH batch '
+            'file, and finish any file a previous run left building')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--max-entries', type=int, default=MAX_FILE_ENTRIES)
+        parser.add_argument('--directory', help='Output directory (default: PAYMENT_FILE_DIR)')
+        parser.add_argument('--chunk-size', type=int, help='Rows per cursor round trip (default: PAYMENT_FILE_CHUNK_SIZE)')
+
+    def handle(self, *args, **options):
+        paths = generate_payment_files(options['max_entries'], options['directory'], options['chunk_size'])
+        for path in paths:
+            self.stdout.write(f'Wrote {path}')
+        if not paths:
+            self.stdout.write('No transfers to file')
+        skipped = unfiled_entries().count() - eligible_entries().count()
+        if skipped:
+            self.stdout.write(self.style.WARNING(
+                f'{skipped} transfers have a malformed routing number or an amount too large for an ACH entry'))
@@ -0,0 +1,381 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, models
+from django.utils import timezone
+from decimal import Decimal
+from collections import defaultdict
+from rest_framework_simplejwt.tokens import AccessToken
+import http.client
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+import uuid
+
+from accounts.models import Account
+from accounts.numbering import assign_account_numbers
+from accounts.sharding import with_available_balance
+from transactions.models import Transaction
+from transactions.rollups import USER_SUMMARY_FIELDS, compute_user_rollups, diff_rollups, stored_user_rollups
+from users.models import User
+
+DEFAULT_MIX = 'transfer=30,hot_transfer=20,deposit=10,withdraw=10,list=15,balance=15'
+OPENING_BALANCE = Decimal('1000.00')
+LOCAL_HOSTS = {'', 'localhost', '127.0.0.1', '::1'}
+PERCENTILES = [50, 90, 99]
+
+def percentile(ordered, pct):
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))]
+
+def parse_mix(value):
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        if name.strip() not in Scenarios.NAMES:
+            raise CommandError(f"Unknown scenario {name!r}; choose from {', '.join(Scenarios.NAMES)}")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+class Client:
+    """One keep-alive HTTP connection, reopened whenever the server closes it"""
+
+    def __init__(self, base_url):
+        url = urllib.parse.urlsplit(base_url)
+        self.host, self.port = url.hostname, url.port or 80
+        self.connection = None
+
+    def request(self, method, path, token, body=None):
+        headers = {'Authorization': f'Bearer {token}'}
+        if body is not None:
+            body = json.dumps(body)
+            headers['Content-Type'] = 'application/json'
+        for attempt in range(2):
+            if self.connection is None:
+                self.connection = http.client.HTTPConnection(self.host, self.port, timeout=30)
+            try:
+                self.connection.request(method, path, body, headers)
+                response = self.connection.getresponse()
+                response.read()
+                if response.getheader('Connection', '').lower() == 'close':
+                    self.close()
+                return response.status
+            except (ConnectionError, http.client.HTTPException):
+                # A kept-alive connection the server already dropped; retry once on a fresh one
+                self.close()
+                if attempt:
+                    raise
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+class Scenarios:
+    """Request builders for each scenario; each returns (method, path, token, body)"""
+    NAMES = ['transfer', 'hot_transfer', 'deposit', 'withdraw', 'list', 'balance']
+
+    def __init__(self, accounts, hot_accounts, tokens):
+        self.accounts = accounts
+        self.hot_accounts = hot_accounts
+        self.tokens = tokens
+
+    def amount(self, rng):
+        return str(Decimal(rng.randint(1, 500)) / 100)
+
+    def transfer(self, rng):
+        source, target = rng.sample(self.accounts, 2)
+        return ('POST', '/api/transactions/transfer/', self.tokens[source.user_id],
+                {'from_account_id': source.id, 'to_account_number': target.account_number, 'amount': self.amount(rng)})
+
+    def hot_transfer(self, rng):
+        # Hot accounts are credited by everyone and pay back out, so their rows see contention both ways
+        hot = rng.choice(self.hot_accounts)
+        other = rng.choice([account for account in self.accounts[:50] if account.id != hot.id])
+        source, target = (hot, other) if rng.random() < 0.5 else (other, hot)
+        return ('POST', '/api/transactions/transfer/', self.tokens[source.user_id],
+                {'from_account_id': source.id, 'to_account_number': target.account_number, 'amount': self.amount(rng)})
+
+    def deposit(self, rng):
+        account = rng.choice(self.accounts)
+        return ('POST', '/api/transactions/deposit/', self.tokens[account.user_id],
+                {'account_id': account.id, 'amount': self.amount(rng)})
+
+    def withdraw(self, rng):
+        account = rng.choice(self.accounts)
+        return ('POST', '/api/transactions/withdraw/', self.tokens[account.user_id],
+                {'account_id': account.id, 'amount': self.amount(rng)})
+
+    def list(self, rng):
+        account = rng.choice(self.accounts)
+        return 'GET', '/api/transactions/', self.tokens[account.user_id], None
+
+    def balance(self, rng):
+        account = rng.choice(self.accounts)
+        return 'GET', f'/api/accounts/{account.id}/balance/', self.tokens[account.user_id], None
+
+class Command(BaseCommand):
+    help = ('Load-test the money-movement endpoints over HTTP: seed users and accounts, start gunicorn '
+            'against the configured local database (or use --url), drive a weighted mix of scenarios '
+            'from concurrent clients, then report throughput, latency percentiles and error and '
+            'conflict rates, check the ledger, and optionally write the results as JSON')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--hot-accounts', type=int, default=4)
+        parser.add_argument('--clients', type=int, default=32, help='Concurrent client threads')
+        parser.add_argument('--duration', type=float, default=30.0, help='Seconds to run')
+        parser.add_argument('--mix', default=DEFAULT_MIX, help=f'Scenario weights (default: {DEFAULT_MIX})')
+        parser.add_argument('--url', help='Test an already running server instead of starting gunicorn')
+        parser.add_argument('--server-workers', type=int, default=4)
+        parser.add_argument('--server-threads', type=int, default=1)
+        parser.add_argument('--output', help='Write the results to this JSON file')
+        parser.add_argument('--baseline', help='Compare against the JSON results of an earlier run')
+        parser.add_argument('--allow-remote', action='store_true', help='Run against a non-local database')
+        parser.add_argument('--keep', action='store_true', help='Keep the seeded users and accounts')
+
+    def handle(self, *args, **options):
+        host = connection.settings_dict.get('HOST') or ''
+        # A host starting with a slash is a Unix socket directory
+        local = connection.vendor == 'sqlite' or host in LOCAL_HOSTS or host.startswith('/')
+        if not local and not options['allow_remote']:
+            raise CommandError(f'The database at {host} is not local; pass --allow-remote to load it anyway')
+        if connection.vendor == 'sqlite':
+            self.stderr.write('SQLite serialises all writers; latencies will not reflect PostgreSQL or MySQL.')
+        mix = parse_mix(options['mix'])
+
+        prefix = f'load-{uuid.uuid4().hex[:8]}'
+        users, accounts = self.seed(prefix, options['users'])
+        server = None
+        try:
+            tokens = {user.id: str(AccessToken.for_user(user)) for user in users}
+            scenarios = Scenarios(accounts, accounts[:max(1, options['hot_accounts'])], tokens)
+            base_url = options['url']
+            if base_url is None:
+                server, base_url = self.start_server(options)
+            started_at = timezone.now()
+            samples, elapsed = self.drive(base_url, scenarios, mix, options['clients'], options['duration'])
+            results = self.summarize(samples, elapsed)
+            results['checks'] = self.reconcile(users, accounts, samples, started_at)
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait(timeout=30)
+            if not options['keep']:
+                User.objects.filter(username__startswith=f'{prefix}-').delete()
+
+        results.update({
+            'commit': self.commit(),
+            'started_at': started_at.isoformat(),
+            'database': connection.vendor,
+            'config': {key: options[key] for key in ('users', 'hot_accounts', 'clients', 'duration',
+                                                     'mix', 'server_workers', 'server_threads')},
+        })
+        self.report(results)
+        if options['baseline']:
+            with open(options['baseline']) as baseline:
+                self.compare(results, json.load(baseline))
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(results, output, indent=2)
+            self.stdout.write(f"Results written to {options['output']}")
+        failed = [name for name, check in results['checks'].items() if not check['ok']]
+        if failed:
+            raise CommandError(f"Correctness checks failed: {', '.join(failed)}")
+
+    def seed(self, prefix, count):
+        users = User.objects.bulk_create([
+            User(username=f'{prefix}-{i}', email=f'{prefix}-{i}@example.com', password='!',
+                 first_name='Load', last_name=f'User {i}')
+            for i in range(count)
+        ])
+        if not connection.features.can_return_rows_from_bulk_insert:
+            users = list(User.objects.filter(username__startswith=f'{prefix}-').order_by('id'))
+        accounts = Account.objects.bulk_create(assign_account_numbers([
+            Account(user_id=user.id, balance=OPENING_BALANCE) for user in users
+        ]))
+        if not connection.features.can_return_rows_from_bulk_insert:
+            accounts = list(Account.objects.filter(user__in=users).order_by('id'))
+        return users, accounts
+
+    def start_server(self, options):
+        with socket.socket() as probe:
+            probe.bind(('127.0.0.1', 0))
+            port = probe.getsockname()[1]
+        log = tempfile.NamedTemporaryFile(prefix='loadtest-server-', suffix='.log', delete=False)
+        env = dict(os.environ, ALLOWED_HOSTS='127.0.0.1,localhost')
+        env.setdefault('DJANGO_SETTINGS_MODULE', settings.SETTINGS_MODULE)
+        server = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', 'banking_project.wsgi:application',
+             '--bind', f'127.0.0.1:{port}', '--workers', str(options['server_workers']),
+             '--threads', str(options['server_threads']), '--keep-alive', '5'],
+            cwd=settings.BASE_DIR, env=env, stdout=log, stderr=subprocess.STDOUT,
+        )
+        deadline = time.monotonic() + 30
+        while True:
+            if server.poll() is not None:
+                raise CommandError(f'gunicorn exited with {server.returncode}; see {log.name}')
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=1).close()
+                break
+            except OSError:
+                if time.monotonic() > deadline:
+                    server.terminate()
+                    raise CommandError(f'gunicorn did not start listening; see {log.name}')
+                time.sleep(0.2)
+        self.stdout.write(f'Started gunicorn on 127.0.0.1:{port} (log: {log.name})')
+        return server, f'http://127.0.0.1:{port}'
+
+    def drive(self, base_url, scenarios, mix, clients, duration):
+        names = list(mix)
+        weights = [mix[name] for name in names]
+        samples = []
+        lock = threading.Lock()
+        deadline = time.monotonic() + duration
+
+        def run(seed):
+            rng = random.Random(seed)
+            client = Client(base_url)
+            local = []
+            try:
+                while time.monotonic() < deadline:
+                    name = rng.choices(names, weights)[0]
+                    method, path, token, body = getattr(scenarios, name)(rng)
+                    started = time.perf_counter()
+                    try:
+                        status = client.request(method, path, token, body)
+                    except (OSError, http.client.HTTPException):
+                        status = 0
+                    local.append((name, status, time.perf_counter() - started))
+            finally:
+                client.close()
+                with lock:
+                    samples.extend(local)
+
+        threads = [threading.Thread(target=run, args=(seed,)) for seed in range(clients)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return samples, time.perf_counter() - started
+
+    def summarize(self, samples, elapsed):
+        def stats(rows):
+            latencies = sorted(latency * 1000 for _, _, latency in rows)
+            statuses = [status for _, status, _ in rows]
+            count = len(rows)
+            summary = {
+                'requests': count,
+                'throughput': round(count / elapsed, 1),
+                'ok': sum(1 for status in statuses if 200 <= status < 300),
+                'rejected': sum(1 for status in statuses if status == 400),
+                'conflicts': sum(1 for status in statuses if status == 409),
+                'errors': sum(1 for status in statuses if status == 0 or status >= 500 or status in (401, 403, 404)),
+                'max_ms': round(latencies[-1], 2) if latencies else None,
+            }
+            for pct in PERCENTILES:
+                value = percentile(latencies, pct)
+                summary[f'p{pct}_ms'] = round(value, 2) if value is not None else None
+            summary['error_rate'] = round(summary['errors'] / count, 4) if count else 0.0
+            summary['conflict_rate'] = round(summary['conflicts'] / count, 4) if count else 0.0
+            return summary
+
+        by_scenario = defaultdict(list)
+        for sample in samples:
+            by_scenario[sample[0]].append(sample)
+        return {
+            'elapsed': round(elapsed, 2),
+            'overall': stats(samples),
+            'scenarios': {name: stats(rows) for name, rows in sorted(by_scenario.items())},
+        }
+
+    def reconcile(self, users, accounts, samples, started_at):
+        """Reconcile the seeded accounts with the ledger and with what the clients were told"""
+        account_ids = [account.id for account in accounts]
+        balances = dict(with_available_balance(Account.objects.filter(id__in=account_ids)).values_list('id', 'available'))
+        posted = Transaction.objects.filter(
+            models.Q(from_account_id__in=account_ids) | models.Q(to_account_id__in=account_ids),
+            status='completed', created_at__gte=started_at,
+        )
+        credits = defaultdict(Decimal)
+        debits = defaultdict(Decimal)
+        counts = defaultdict(int)
+        external = Decimal('0')
+        for trans in posted.values('transaction_type', 'from_account_id', 'to_account_id', 'amount').iterator():
+            counts[trans['transaction_type']] += 1
+            if trans['to_account_id']:
+                credits[trans['to_account_id']] += trans['amount']
+            if trans['from_account_id']:
+                debits[trans['from_account_id']] += trans['amount']
+            if trans['transaction_type'] == 'deposit':
+                external += trans['amount']
+            elif trans['transaction_type'] == 'withdrawal':
+                external -= trans['amount']
+
+        expected_total = OPENING_BALANCE * len(accounts) + external
+        actual_total = sum(balances.values())
+        drifted = [account_id for account_id in account_ids
+                   if balances[account_id] != OPENING_BALANCE + credits[account_id] - debits[account_id]]
+        ok_by_type = defaultdict(int)
+        for name, status, _ in samples:
+            if 200 <= status < 300:
+                ok_by_type[{'hot_transfer': 'transfer', 'withdraw': 'withdrawal'}.get(name, name)] += 1
+        mismatched = {kind: {'responses': ok_by_type[kind], 'posted': counts[kind]}
+                      for kind in ('transfer', 'deposit', 'withdrawal') if ok_by_type[kind] != counts[kind]}
+
+        user_ids = [user.id for user in users]
+        first_id, last_id = min(user_ids), max(user_ids)
+        rollup_diffs = diff_rollups(
+            compute_user_rollups(first_id, last_id),
+            stored_user_rollups(first_id, last_id),
+            USER_SUMMARY_FIELDS,
+        )
+        return {
+            'balance_conserved': {'ok': actual_total == expected_total,
+                                  'expected': str(expected_total), 'actual': str(actual_total)},
+            'accounts_match_ledger': {'ok': not drifted, 'drifted': drifted[:20]},
+            'no_negative_balances': {'ok': all(balance >= 0 for balance in balances.values())},
+            'responses_match_ledger': {'ok': not mismatched, 'mismatched': mismatched},
+            'rollups_match_ledger': {'ok': not rollup_diffs, 'differences': len(rollup_diffs)},
+        }
+
+    def commit(self):
+        try:
+            return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+                                  capture_output=True, text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    def report(self, results):
+        header = f"{'scenario':<14}{'req/s':>9}{'p50 ms':>9}{'p90 ms':>9}{'p99 ms':>9}{'max ms':>9}{'409':>7}{'400':>7}{'err':>6}"
+        self.stdout.write(header)
+        for name, stats in [*results['scenarios'].items(), ('overall', results['overall'])]:
+            self.stdout.write(
+                f"{name:<14}{stats['throughput']:>9.1f}{stats['p50_ms'] or 0:>9.1f}{stats['p90_ms'] or 0:>9.1f}"
+                f"{stats['p99_ms'] or 0:>9.1f}{stats['max_ms'] or 0:>9.1f}{stats['conflicts']:>7}"
+                f"{stats['rejected']:>7}{stats['errors']:>6}"
+            )
+        for name, check in results['checks'].items():
+            status = self.style.SUCCESS('ok') if check['ok'] else self.style.ERROR('FAIL')
+            details = {key: value for key, value in check.items() if key != 'ok'}
+            self.stdout.write(f"{status:<4} {name}{' ' + json.dumps(details) if details and not check['ok'] else ''}")
+
+    def compare(self, results, baseline):
+        self.stdout.write(f"Against {baseline.get('commit') or 'baseline'}:")
+        for name, stats in [*results['scenarios'].items(), ('overall', results['overall'])]:
+            before = baseline['overall'] if name == 'overall' else baseline.get('scenarios', {}).get(name)
+            if not before:
+                continue
+            changes = []
+            for key in ('throughput', 'p50_ms', 'p99_ms'):
+                if before.get(key) and stats.get(key) is not None:
+                    changes.append(f'{key} {(stats[key] - before[key]) / before[key] * 100:+.0f}%')
+            self.stdout.write(f"  {name:<14}{'  '.join(changes)}")
@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import models
+
+from accounts.models import Account
+from transactions import rollups
+from users.models import User
+
+class Command(BaseCommand):
+    help = 'Rebuild the per-user and per-account transaction rollups in chunks, or check them with --check'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Ids per chunk')
+        parser.add_argument('--check', action='store_true', help='Compare rollups with the raw data without writing')
+        parser.add_argument('--users-only', action='store_true')
+        parser.add_argument('--accounts-only', action='store_true')
+
+    def handle(self, *args, **options):
+        targets = []
+        if not options['accounts_only']:
+            targets.append(('user', User, rollups.USER_SUMMARY_FIELDS, rollups.stored_user_rollups,
+                            rollups.compute_user_rollups, rollups.rebuild_user_rollups))
+        if not options['users_only']:
+            targets.append(('account', Account, rollups.ACCOUNT_SUMMARY_FIELDS, rollups.stored_account_rollups,
+                            rollups.compute_account_rollups, rollups.rebuild_account_rollups))
+
+        mismatched = 0
+        for name, model, fields, stored_for, compute, rebuild in targets:
+            bounds = model.objects.aggregate(first=models.Min('id'), last=models.Max('id'))
+            if bounds['first'] is None:
+                continue
+            processed = 0
+            for first_id in range(bounds['first'], bounds['last'] + 1, options['chunk_size']):
+                last_id = first_id + options['chunk_size'] - 1
+                if options['check']:
+                    expected = compute(first_id, last_id)
+                    stored = stored_for(first_id, last_id)
+                    keys = rollups.diff_rollups(expected, stored, fields)
+                    mismatched += len(keys)
+                    for key in keys[:20]:
+                        self.stdout.write(f'{name} {key}: stored={stored.get(key)} expected={expected.get(key)}')
+                else:
+                    processed += rebuild(first_id, last_id)
+            if not options['check']:
+                self.stdout.write(f'Rebuilt {processed} {name} rollups')
+
+        if options['check']:
+            if mismatched:
+                raise CommandError(f'{mismatched} rollups differ from the raw transactions')
+            self.stdout.write(self.style.SUCCESS('Rollups match the raw transactions'))
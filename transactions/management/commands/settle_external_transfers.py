@@ -0,0 +1,58 @@
+from django.core.management.base import BaseCommand
+from django.db import connections
+import multiprocessing
+import os
+import socket
+import time
+
+from transactions.settlement import settle_chunk
+
+class Command(BaseCommand):
+    help = ('Settle external transfers queued by the admin approve/reject actions, chunk by chunk. '
+            'Several instances (or --workers) can run side by side; each claims rows with SKIP LOCKED.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500)
+        parser.add_argument('--workers', type=int, default=1, help='Worker processes to fork')
+        parser.add_argument('--loop', action='store_true', help='Keep polling for new work instead of exiting when idle')
+        parser.add_argument('--poll-interval', type=float, default=5.0, help='Seconds to sleep when idle with --loop')
+        parser.add_argument('--name', default=f'{socket.gethostname()}-{os.getpid()}',
+                            help='Checkpoint name prefix of this instance')
+
+    def handle(self, *args, **options):
+        if options['workers'] == 1:
+            self.work(f"{options['name']}-0", options)
+            return
+        # Children must open their own connections rather than share the parent's sockets
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        processes = [
+            context.Process(target=self.work, args=(f"{options['name']}-{i}", options))
+            for i in range(options['workers'])
+        ]
+        for process in processes:
+            process.start()
+        try:
+            for process in processes:
+                process.join()
+        except KeyboardInterrupt:
+            for process in processes:
+                process.join()
+
+    def work(self, worker, options):
+        approved = rejected = 0
+        try:
+            while True:
+                chunk_approved, chunk_rejected = settle_chunk(worker, options['chunk_size'])
+                approved += chunk_approved
+                rejected += chunk_rejected
+                if chunk_approved or chunk_rejected:
+                    continue
+                if not options['loop']:
+                    break
+                time.sleep(options['poll_interval'])
+        except KeyboardInterrupt:
+            pass
+        finally:
+            connections.close_all()
+        self.stdout.write(f'{worker}: approved {approved}, rejected {rejected}')
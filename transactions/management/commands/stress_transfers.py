@@ -0,0 +1,88 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+import random
+import threading
+import uuid
+
+from accounts.locking import AccountLockConflict
+from accounts.models import Account
+from accounts.services import BalanceUpdateError
+from transactions.models import Transaction
+from transactions.services import post_transfer
+from users.models import User
+
+class Command(BaseCommand):
+    help = ('Fire crossed transfers between a few accounts from many threads and check that '
+            'no deadlock escapes and the total balance is conserved')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--accounts', type=int, default=4)
+        parser.add_argument('--threads', type=int, default=16)
+        parser.add_argument('--transfers', type=int, default=200, help='Transfers per thread')
+        parser.add_argument('--keep', action='store_true', help='Keep the generated users and accounts')
+
+    def handle(self, *args, **options):
+        if connection.vendor == 'sqlite':
+            self.stderr.write('SQLite serialises all writers; run this against PostgreSQL or MySQL.')
+        suffix = uuid.uuid4().hex[:8]
+        user = User.objects.create_user(
+            username=f'stress-{suffix}', email=f'stress-{suffix}@example.com',
+            password=None, first_name='Stress', last_name='Test')
+        accounts = [
+            Account.objects.create(user=user, balance=Decimal('1000.00'))
+            for _ in range(options['accounts'])
+        ]
+        expected_total = sum(account.balance for account in accounts)
+        outcomes = {'completed': 0, 'rejected': 0, 'conflict': 0, 'error': 0}
+        errors = []
+        lock = threading.Lock()
+
+        def worker(seed):
+            rng = random.Random(seed)
+            try:
+                for _ in range(options['transfers']):
+                    # Always pick a pair and send in both directions to provoke crossed locks
+                    source, target = rng.sample(accounts, 2)
+                    if rng.random() < 0.5:
+                        source, target = target, source
+                    try:
+                        post_transfer(user, Account(id=source.id), Account(id=target.id),
+                                      Decimal(rng.randint(1, 5000)) / 100)
+                        outcome = 'completed'
+                    except BalanceUpdateError:
+                        outcome = 'rejected'
+                    except AccountLockConflict:
+                        outcome = 'conflict'
+                    except Exception as exc:
+                        outcome = 'error'
+                        errors.append(repr(exc))
+                    with lock:
+                        outcomes[outcome] += 1
+            finally:
+                connections.close_all()
+
+        with ThreadPoolExecutor(max_workers=options['threads']) as pool:
+            list(pool.map(worker, range(options['threads'])))
+
+        account_ids = [account.id for account in accounts]
+        balances = Account.objects.filter(id__in=account_ids).values_list('balance', flat=True)
+        actual_total = sum(balances)
+        posted = Transaction.objects.filter(from_account_id__in=account_ids).count()
+
+        self.stdout.write(
+            f"completed={outcomes['completed']} rejected={outcomes['rejected']} "
+            f"conflict={outcomes['conflict']} error={outcomes['error']} posted={posted}")
+        self.stdout.write(f"total balance before={expected_total} after={actual_total}")
+
+        if not options['keep']:
+            user.delete()
+
+        if errors:
+            raise CommandError(f"{len(errors)} unexpected errors, first: {errors[0]}")
+        if actual_total != expected_total:
+            raise CommandError('Total balance was not conserved')
+        if posted != outcomes['completed']:
+            raise CommandError('Posted transactions do not match completed transfers')
+        self.stdout.write(self.style.SUCCESS('No deadlocks escaped and the total balance was conserved'))
@@ -0,0 +1,77 @@
+# Generated by Django 4.1.10 on 2026-10-18 18:13
+
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_summaries(apps, schema_editor):
+    # Seed the rollups from existing history; rebuild_transaction_summaries can redo this in chunks
+    Transaction = apps.get_model('transactions', 'Transaction')
+    UserTransactionSummary = apps.get_model('transactions', 'UserTransactionSummary')
+    AccountTransactionSummary = apps.get_model('transactions', 'AccountTransactionSummary')
+    completed = Transaction.objects.filter(status='completed').order_by()
+
+    def total(kind):
+        return models.Sum('amount', filter=models.Q(transaction_type=kind), default=Decimal('0.00'))
+
+    users = completed.values('user_id').annotate(
+        total_deposits=total('deposit'),
+        total_withdrawals=total('withdrawal'),
+        total_transfers_sent=total('transfer'),
+        transaction_count=models.Count('id'),
+    )
+    UserTransactionSummary.objects.bulk_create(
+        (UserTransactionSummary(**row) for row in users.iterator()), batch_size=1000
+    )
+
+    accounts = {}
+    for column, field in [('from_account_id', 'total_debits'), ('to_account_id', 'total_credits')]:
+        rows = completed.filter(**{f'{column}__isnull': False}).values(column).annotate(
+            total=models.Sum('amount'), count=models.Count('id'))
+        for row in rows.iterator():
+            summary = accounts.setdefault(row[column], AccountTransactionSummary(account_id=row[column]))
+            setattr(summary, field, row['total'])
+            summary.transaction_count += row['count']
+    AccountTransactionSummary.objects.bulk_create(accounts.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_alter_user_groups_alter_user_user_permissions'),
+        ('accounts', '0004_composite_indexes'),
+        ('transactions', '0010_composite_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AccountTransactionSummary',
+            fields=[
+                ('account', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='transaction_summary', serialize=False, to='accounts.account')),
+                ('total_credits', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=18)),
+                ('total_debits', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=18)),
+                ('transaction_count', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'transaction_account_summaries',
+            },
+        ),
+        migrations.CreateModel(
+            name='UserTransactionSummary',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='transaction_summary', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('total_deposits', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=18)),
+                ('total_withdrawals', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=18)),
+                ('total_transfers_sent', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=18)),
+                ('transaction_count', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'transaction_user_summaries',
+            },
+        ),
+        migrations.RunPython(backfill_summaries, migrations.RunPython.noop),
+    ]
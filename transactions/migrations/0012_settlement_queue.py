@@ -0,0 +1,37 @@
+# Generated by Django 4.1.10 on 2026-10-18 18:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0011_transaction_summaries'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SettlementCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('worker', models.CharField(max_length=100, unique=True)),
+                ('last_transaction_id', models.BigIntegerField(default=0)),
+                ('chunks', models.BigIntegerField(default=0)),
+                ('approved', models.BigIntegerField(default=0)),
+                ('rejected', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'transaction_settlement_checkpoints',
+            },
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='settlement_action',
+            field=models.CharField(blank=True, choices=[('approve', 'Approve'), ('reject', 'Reject')], max_length=10, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(condition=models.Q(('settlement_action__isnull', False), ('status', 'pending')), fields=['id'], name='transactions_settlement_idx'),
+        ),
+    ]
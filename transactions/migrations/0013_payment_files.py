@@ -0,0 +1,54 @@
+# Generated by Django 4.1.10 on 2026-10-18 18:37
+
+from decimal import Decimal
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0012_settlement_queue'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PaymentFile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('building', 'Building'), ('generated', 'Generated')], default='building', max_length=20)),
+                ('file_name', models.CharField(blank=True, max_length=255)),
+                ('entry_count', models.BigIntegerField(default=0)),
+                ('batch_count', models.IntegerField(default=0)),
+                ('total_amount', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=18)),
+                ('sha256', models.CharField(blank=True, max_length=64)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('generated_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'db_table': 'transaction_payment_files',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='beneficiary_account_number',
+            field=models.CharField(blank=True, max_length=17, null=True),
+        ),
+        migrations.CreateModel(
+            name='PaymentFileEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('payment_file', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='entries', to='transactions.paymentfile')),
+                ('transaction', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='payment_file_entry', to='transactions.transaction')),
+            ],
+            options={
+                'db_table': 'transaction_payment_file_entries',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='paymentfileentry',
+            index=models.Index(condition=models.Q(('payment_file__isnull', True)), fields=['id'], name='payment_entries_unfiled_idx'),
+        ),
+    ]
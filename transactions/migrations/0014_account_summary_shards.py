@@ -0,0 +1,34 @@
+# Generated by Django 4.1.10 on 2026-10-18 19:08
+
+from decimal import Decimal
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0006_balance_shards'),
+        ('transactions', '0013_payment_files'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AccountSummaryShard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('shard', models.PositiveSmallIntegerField()),
+                ('total_credits', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=18)),
+                ('transaction_count', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='summary_shards', to='accounts.account')),
+            ],
+            options={
+                'db_table': 'transaction_account_summary_shards',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='accountsummaryshard',
+            constraint=models.UniqueConstraint(fields=('account', 'shard'), name='account_summary_shards_unique'),
+        ),
+    ]
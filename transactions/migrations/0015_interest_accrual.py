@@ -0,0 +1,40 @@
+# Generated by Django 4.1.10 on 2026-10-18 19:13
+
+from decimal import Decimal
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0014_account_summary_shards'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InterestAccrualChunk',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('accrual_date', models.DateField()),
+                ('first_account_id', models.BigIntegerField()),
+                ('last_account_id', models.BigIntegerField()),
+                ('accounts', models.IntegerField(default=0)),
+                ('credited', models.IntegerField(default=0)),
+                ('total_interest', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=18)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'db_table': 'transaction_interest_accrual_chunks',
+            },
+        ),
+        migrations.AlterField(
+            model_name='transaction',
+            name='transaction_type',
+            field=models.CharField(choices=[('deposit', 'Deposit'), ('withdrawal', 'Withdrawal'), ('transfer', 'Transfer'), ('external', 'External Transfer'), ('interest', 'Interest')], max_length=20),
+        ),
+        migrations.AddConstraint(
+            model_name='interestaccrualchunk',
+            constraint=models.UniqueConstraint(fields=('accrual_date', 'first_account_id'), name='interest_chunks_unique'),
+        ),
+    ]
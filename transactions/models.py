@@ -2,6 +2,7 @@ from django.db import models
 from django.conf import settings
 from decimal import Decimal
 from django.core.validators import MinValueValidator
+from django.utils import timezone
 
 class Transaction(models.Model):
     TRANSACTION_TYPES = [
@@ -9,6 +10,7 @@ class Transaction(models.Model):
         ('withdrawal', 'Withdrawal'),
         ('transfer', 'Transfer'),
         ('external', 'External Transfer'),  # Added external transfer type
+        ('interest', 'Interest'),
     ]
     
     STATUS_CHOICES = [
@@ -17,6 +19,11 @@ class Transaction(models.Model):
         ('failed', 'Failed'),
         ('cancelled', 'Cancelled'),
     ]
+
+    SETTLEMENT_ACTIONS = [
+        ('approve', 'Approve'),
+        ('reject', 'Reject'),
+    ]
     
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='transactions')
     from_account = models.ForeignKey('accounts.Account', on_delete=models.CASCADE, related_name='sent_transactions', null=True, blank=True)
@@ -30,12 +37,37 @@ class Transaction(models.Model):
     beneficiary_name = models.CharField(max_length=100, blank=True, null=True)
     routing_number = models.CharField(max_length=50, blank=True, null=True)
     beneficiary_address = models.CharField(max_length=255, blank=True, null=True)
-    created_at = models.DateTimeField(null=True, blank=True)
+    beneficiary_account_number = models.CharField(max_length=17, blank=True, null=True)
+    # Set by the admin actions; the settlement worker applies it and clears it
+    settlement_action = models.CharField(max_length=10, choices=SETTLEMENT_ACTIONS, blank=True, null=True)
+    created_at = models.DateTimeField(default=timezone.now, null=True, blank=True)
     updated_at = models.DateTimeField(null=True, blank=True)
     
     class Meta:
         db_table = 'transactions'
         ordering = ['-created_at']
+        indexes = [
+            # Sent side of the history, seeked on (created_at, id)
+            models.Index(fields=['user', '-created_at', '-id'], name='transactions_user_created_idx'),
+            # Received side of the history
+            models.Index(fields=['to_account', '-created_at', '-id'], name='transactions_to_created_idx'),
+            # Admin history across all users
+            models.Index(fields=['-created_at', '-id'], name='transactions_created_idx'),
+            # Summary aggregates, answered from the index alone
+            models.Index(fields=['user', 'status', 'transaction_type', 'amount'], name='transactions_summary_idx'),
+            # Settlement queue of external transfers awaiting approval
+            models.Index(
+                fields=['id'],
+                name='transactions_pending_ext_idx',
+                condition=models.Q(transaction_type='external', status='pending'),
+            ),
+            # Pending transfers with a queued settlement action, claimed in id order
+            models.Index(
+                fields=['id'],
+                name='transactions_settlement_idx',
+                condition=models.Q(status='pending', settlement_action__isnull=False),
+            ),
+        ]
     
     def __str__(self):
         return f"{self.transaction_type.title()} - ${self.amount} - {self.reference_number}"
@@ -46,4 +78,131 @@ class Transaction(models.Model):
     
     @property
     def can_be_cancelled(self):
-        return self.status == 'pending'
\ No newline at end of file
+        return self.status == 'pending'
+
+
+class UserTransactionSummary(models.Model):
+    """Running totals of a user's completed transactions, kept in step by every posting path"""
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, primary_key=True, related_name='transaction_summary')
+    total_deposits = models.DecimalField(max_digits=18, decimal_places=2, default=Decimal('0.00'))
+    total_withdrawals = models.DecimalField(max_digits=18, decimal_places=2, default=Decimal('0.00'))
+    total_transfers_sent = models.DecimalField(max_digits=18, decimal_places=2, default=Decimal('0.00'))
+    transaction_count = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'transaction_user_summaries'
+
+    def __str__(self):
+        return f"Summary for user {self.user_id}"
+
+class AccountTransactionSummary(models.Model):
+    """Running totals of completed transactions debiting or crediting an account"""
+    account = models.OneToOneField('accounts.Account', on_delete=models.CASCADE, primary_key=True, related_name='transaction_summary')
+    total_credits = models.DecimalField(max_digits=18, decimal_places=2, default=Decimal('0.00'))
+    total_debits = models.DecimalField(max_digits=18, decimal_places=2, default=Decimal('0.00'))
+    transaction_count = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'transaction_account_summaries'
+
+    def __str__(self):
+        return f"Summary for account {self.account_id}"
+
+class AccountSummaryShard(models.Model):
+    """
+    Credits to an account with balance shards, spread over rows like its balance
+    so they do not contend on the AccountTransactionSummary row; folded into it
+    by compact_balance_shards.
+    """
+    account = models.ForeignKey('accounts.Account', on_delete=models.CASCADE, related_name='summary_shards')
+    shard = models.PositiveSmallIntegerField()
+    total_credits = models.DecimalField(max_digits=18, decimal_places=2, default=Decimal('0.00'))
+    transaction_count = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'transaction_account_summary_shards'
+        constraints = [
+            models.UniqueConstraint(fields=['account', 'shard'], name='account_summary_shards_unique'),
+        ]
+
+    def __str__(self):
+        return f"Summary shard {self.shard} of account {self.account_id}"
+
+class SettlementCheckpoint(models.Model):
+    """Progress of one settlement worker, committed together with each chunk it settles"""
+    worker = models.CharField(max_length=100, unique=True)
+    last_transaction_id = models.BigIntegerField(default=0)
+    chunks = models.BigIntegerField(default=0)
+    approved = models.BigIntegerField(default=0)
+    rejected = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'transaction_settlement_checkpoints'
+
+    def __str__(self):
+        return f"Settlement worker {self.worker}"
+
+class InterestAccrualChunk(models.Model):
+    """One committed chunk of an interest accrual run, written together with its postings"""
+    accrual_date = models.DateField()
+    first_account_id = models.BigIntegerField()
+    last_account_id = models.BigIntegerField()
+    accounts = models.IntegerField(default=0)
+    credited = models.IntegerField(default=0)
+    total_interest = models.DecimalField(max_digits=18, decimal_places=2, default=Decimal('0.00'))
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = 'transaction_interest_accrual_chunks'
+        constraints = [
+            models.UniqueConstraint(fields=['accrual_date', 'first_account_id'], name='interest_chunks_unique'),
+        ]
+
+    def __str__(self):
+        return f"Interest for {self.accrual_date}, accounts {self.first_account_id}-{self.last_account_id}"
+
+class PaymentFile(models.Model):
+    """Outbound ACH batch file written from the entries it claimed"""
+    STATUS_CHOICES = [
+        ('building', 'Building'),
+        ('generated', 'Generated'),
+    ]
+
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='building')
+    file_name = models.CharField(max_length=255, blank=True)
+    entry_count = models.BigIntegerField(default=0)
+    batch_count = models.IntegerField(default=0)
+    total_amount = models.DecimalField(max_digits=18, decimal_places=2, default=Decimal('0.00'))
+    sha256 = models.CharField(max_length=64, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    generated_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'transaction_payment_files'
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Payment file {self.id} ({self.status})"
+
+class PaymentFileEntry(models.Model):
+    """
+    Completed external transfer queued for an outbound payment file. Settlement
+    queues it and a payment file run claims it, so each transfer is paid out
+    in exactly one file.
+    """
+    transaction = models.OneToOneField(Transaction, on_delete=models.CASCADE, related_name='payment_file_entry')
+    payment_file = models.ForeignKey(PaymentFile, on_delete=models.PROTECT, related_name='entries', null=True, blank=True)
+
+    class Meta:
+        db_table = 'transaction_payment_file_entries'
+        indexes = [
+            # Entries not yet claimed by a file
+            models.Index(fields=['id'], name='payment_entries_unfiled_idx', condition=models.Q(payment_file__isnull=True)),
+        ]
+
+    def __str__(self):
+        return f"Payment file entry for transaction {self.transaction_id}"
@@ -0,0 +1,121 @@
+from django.conf import settings
+from django.db import connection, models
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+
+# Matches the (created_at DESC, id DESC) indexes, so NULL created_at rows from
+# before the column had a default keep the backend's native position
+KEYSET_ORDERING = ('-created_at', '-id')
+# ?ordering= values that keyset pages follow; any other ordering is refused rather than ignored
+KEYSET_ORDERING_PARAMS = {'-created_at', ','.join(KEYSET_ORDERING)}
+
+class KeysetPagination(BasePagination):
+    """
+    Forward-only cursor pagination on (created_at, id) without a count query.
+    Any other ?ordering= is refused with a 400.
+
+    When the view provides get_union_querysets(queryset), every branch is
+    seeked and limited on its own and the branches are combined with
+    UNION ALL, so each side can walk its own index. Only the ids of the page
+    are selected by the union; the rows are then fetched by primary key.
+    """
+    page_size = settings.REST_FRAMEWORK['PAGE_SIZE']
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        ordering = request.query_params.get(api_settings.ORDERING_PARAM)
+        if ordering and ordering.replace(' ', '') not in KEYSET_ORDERING_PARAMS:
+            raise ValidationError({api_settings.ORDERING_PARAM: [
+                f"Cursor pagination is always ordered by {','.join(KEYSET_ORDERING)}; "
+                f"use page number pagination for other orderings."]})
+        position = self.decode_cursor(request)
+        branches = [queryset]
+        if hasattr(view, 'get_union_querysets') and connection.features.supports_slicing_ordering_in_compound:
+            branches = view.get_union_querysets(queryset)
+
+        limit = self.page_size + 1
+        pages = [
+            self.seek(branch, position).order_by(*KEYSET_ORDERING).values_list('id', 'created_at')[:limit]
+            for branch in branches
+        ]
+        keys = pages[0]
+        if len(pages) > 1:
+            keys = pages[0].union(*pages[1:], all=True).order_by(*KEYSET_ORDERING)[:limit]
+        keys = list(keys)
+
+        self.has_next = len(keys) > self.page_size
+        keys = keys[:self.page_size]
+        if not keys:
+            return []
+        last_id, created_at = keys[-1]
+        self.next_position = (created_at, last_id)
+        rows = queryset.filter(id__in=[key[0] for key in keys]).order_by()
+        rows = {row.id: row for row in rows}
+        return [rows[key[0]] for key in keys]
+
+    def seek(self, queryset, position):
+        if position is None:
+            return queryset
+        created_at, last_id = position
+        # NULL sorts lowest on MySQL and SQLite (last when descending) and highest on PostgreSQL
+        nulls_last = connection.features.order_by_nulls_first
+        if created_at is None:
+            before = models.Q(created_at__isnull=True, id__lt=last_id)
+            return queryset.filter(before if nulls_last else before | models.Q(created_at__isnull=False))
+        before = models.Q(created_at__lt=created_at) | models.Q(created_at=created_at, id__lt=last_id)
+        return queryset.filter(before | models.Q(created_at__isnull=True) if nulls_last else before)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            created_at, last_id = urlsafe_b64decode(encoded.encode('ascii')).decode('ascii').split('|')
+            return (parse_datetime(created_at) if created_at else None), int(last_id)
+        except (TypeError, ValueError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, position):
+        created_at, last_id = position
+        raw = f"{created_at.isoformat() if created_at else ''}|{last_id}"
+        return urlsafe_b64encode(raw.encode('ascii')).decode('ascii')
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.next_position))
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': None,
+            'results': data,
+        })
+
+class TransactionPagination(PageNumberPagination):
+    """
+    Page-number pagination that switches to keyset pagination when the client
+    sends ?pagination=cursor or follows a cursor link.
+    """
+    mode_query_param = 'pagination'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        if KeysetPagination.cursor_query_param in request.query_params or \
+                request.query_params.get(self.mode_query_param) == 'cursor':
+            self.keyset = KeysetPagination()
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
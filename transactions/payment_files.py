@@ -0,0 +1,279 @@
+from django.conf import settings
+from django.db import connection, models, transaction
+from django.utils import timezone
+from datetime import timedelta
+from decimal import Decimal
+import hashlib
+import os
+import unicodedata
+
+from .models import PaymentFile, PaymentFileEntry
+
+# Fixed-width NACHA layout: 94-character records written in blocks of ten
+RECORD_SIZE = 94
+BLOCKING_FACTOR = 10
+SERVICE_CLASS_CREDITS = '220'
+CHECKING_CREDIT = '22'
+FILE_ID_MODIFIERS = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789'
+
+# Field widths bound what a single entry, batch and file can hold
+MAX_ENTRY_AMOUNT = Decimal('100000000.00')
+MAX_BATCH_ENTRIES = 999999
+MAX_BATCH_CENTS = 10 ** 12 - 1
+MAX_FILE_CENTS = 10 ** 12 - 1
+MAX_FILE_ENTRIES = 10 ** 7 - 1
+# Entries locked and claimed per statement, so a large file never holds every id in memory
+CLAIM_BATCH = 10000
+
+ROUTING_NUMBER_REGEX = r'^[0-9]{9}$'
+
+ENTRY_FIELDS = [
+    'transaction_id', 'transaction__routing_number', 'transaction__beneficiary_account_number',
+    'transaction__beneficiary_name', 'transaction__amount',
+]
+
+# Lines are joined and written in groups of this many records
+WRITE_RECORDS = 4096
+
+class PaymentFileError(Exception):
+    pass
+
+def is_valid_routing_number(value):
+    """Check the length and ABA checksum of a routing number"""
+    if len(value) != 9 or not (value.isascii() and value.isdigit()):
+        return False
+    digits = [int(digit) for digit in value]
+    return (3 * (digits[0] + digits[3] + digits[6])
+            + 7 * (digits[1] + digits[4] + digits[7])
+            + digits[2] + digits[5] + digits[8]) % 10 == 0
+
+def queue_for_payment(transactions):
+    """Queue completed external transfers for the next payment file"""
+    PaymentFileEntry.objects.bulk_create(
+        [PaymentFileEntry(transaction_id=trans.id) for trans in transactions], ignore_conflicts=True)
+
+def unfiled_entries():
+    return PaymentFileEntry.objects.filter(payment_file__isnull=True)
+
+def eligible_entries():
+    """Unfiled entries whose transfer fits an ACH entry; the rest stay unfiled for manual handling"""
+    return unfiled_entries().filter(
+        transaction__routing_number__regex=ROUTING_NUMBER_REGEX, transaction__amount__lt=MAX_ENTRY_AMOUNT)
+
+def claim_entries(max_entries=MAX_FILE_ENTRIES, queryset=None):
+    """Create a payment file owning up to max_entries eligible entries, or return None when there are none"""
+    max_entries = min(max_entries, MAX_FILE_ENTRIES)
+    with transaction.atomic():
+        eligible = eligible_entries() if queryset is None else queryset
+        # Concurrent claims skip the entries this one has locked; the transfers joined in are not locked
+        lock = {}
+        if connection.features.has_select_for_update_skip_locked:
+            lock['skip_locked'] = True
+        if connection.features.has_select_for_update_of:
+            lock['of'] = ('self',)
+        payment_file = PaymentFile.objects.create()
+        claimed = last_id = 0
+        while claimed < max_entries:
+            ids = list(
+                eligible.filter(id__gt=last_id).select_for_update(**lock).order_by('id')
+                .values_list('id', flat=True)[:min(CLAIM_BATCH, max_entries - claimed)]
+            )
+            if not ids:
+                break
+            # No join here, so the NULL guard is re-checked on each row after a lock wait
+            # and an entry another claim committed first is never taken over
+            claimed += PaymentFileEntry.objects.filter(id__in=ids, payment_file__isnull=True).update(
+                payment_file=payment_file)
+            last_id = ids[-1]
+        if not claimed:
+            payment_file.delete()
+            return None
+    return payment_file
+
+def _alpha(value, width):
+    value = unicodedata.normalize('NFKD', value or '').encode('ascii', 'ignore').decode().upper()
+    return value[:width].ljust(width)
+
+def _num(value, width):
+    value = str(value)
+    if len(value) > width:
+        raise PaymentFileError(f"{value} does not fit a {width}-digit field")
+    return value.rjust(width, '0')
+
+def _effective_date(day):
+    day += timedelta(days=1)
+    while day.weekday() >= 5:
+        day += timedelta(days=1)
+    return day
+
+class _Writer:
+    """Buffered record writer that hashes what it writes"""
+
+    def __init__(self, path):
+        self.file = open(path, 'w', encoding='ascii', newline='')
+        self.sha256 = hashlib.sha256()
+        self.buffer = []
+        self.records = 0
+
+    def write(self, record):
+        self.buffer.append(record)
+        self.records += 1
+        if len(self.buffer) >= WRITE_RECORDS:
+            self.flush()
+
+    def flush(self):
+        data = '\n'.join(self.buffer) + '\n' if self.buffer else ''
+        self.file.write(data)
+        self.sha256.update(data.encode('ascii'))
+        self.buffer = []
+
+    def close(self):
+        self.flush()
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.file.close()
+
+class _Batches:
+    """Turns entries sorted by routing number into batch and entry records"""
+
+    def __init__(self, writer, created):
+        self.writer = writer
+        self.origin = settings.PAYMENT_FILE_ORIGIN_ROUTING[:8]
+        self.company_id = _alpha(settings.PAYMENT_FILE_COMPANY_ID, 10)
+        self.header = (
+            f"5{SERVICE_CLASS_CREDITS}{_alpha(settings.PAYMENT_FILE_COMPANY_NAME, 16)}{' ' * 20}"
+            f"{self.company_id}PPD{_alpha('PAYMENT', 10)}{created:%y%m%d}"
+            f"{_effective_date(created.date()):%y%m%d}   1{self.origin}"
+        )
+        self.count = 0
+        self.entries = 0
+        self.hash = 0
+        self.cents = 0
+        self.routing_number = None
+        self.batch_entries = 0
+        self.batch_hash = 0
+        self.batch_cents = 0
+
+    def fits(self, amount):
+        return self.cents + self.batch_cents + int(amount * 100) <= MAX_FILE_CENTS
+
+    def add(self, transaction_id, routing_number, account_number, name, amount):
+        cents = int(amount * 100)
+        if (routing_number != self.routing_number or self.batch_entries == MAX_BATCH_ENTRIES
+                or self.batch_cents + cents > MAX_BATCH_CENTS):
+            self.close()
+            self.count += 1
+            self.routing_number = routing_number
+            self.writer.write(f"{self.header}{_num(self.count, 7)}")
+        self.entries += 1
+        self.batch_entries += 1
+        self.batch_hash += int(routing_number[:8])
+        self.batch_cents += cents
+        self.writer.write(
+            f"6{CHECKING_CREDIT}{routing_number}{_alpha(account_number, 17)}{_num(cents, 10)}"
+            f"{_num(transaction_id, 15)}{_alpha(name, 22)}  0{self.origin}{_num(self.entries, 7)}"
+        )
+
+    def close(self):
+        if not self.batch_entries:
+            return
+        self.writer.write(
+            f"8{SERVICE_CLASS_CREDITS}{_num(self.batch_entries, 6)}{_num(self.batch_hash % 10 ** 10, 10)}"
+            f"{'0' * 12}{_num(self.batch_cents, 12)}{self.company_id}{' ' * 25}{self.origin}{_num(self.count, 7)}"
+        )
+        self.hash += self.batch_hash
+        self.cents += self.batch_cents
+        self.batch_entries = self.batch_hash = self.batch_cents = 0
+
+def write_payment_file(payment_file, directory=None, chunk_size=None):
+    """
+    Stream the entries claimed by payment_file into an ACH file and mark it generated.
+
+    Entries are read in (routing_number, transaction id) order through a server-side
+    cursor, so memory stays flat however many the file holds. Entries past the
+    file's total amount limit are released for the next file. The output only
+    depends on the claimed rows and the file's creation time, so a file left
+    building by a crash is rewritten identically. Call it inside the
+    transaction holding the file's row lock.
+    """
+    directory = directory or settings.PAYMENT_FILE_DIR
+    os.makedirs(directory, exist_ok=True)
+    created = timezone.localtime(payment_file.created_at)
+    file_name = f"ach-{created:%Y%m%d}-{payment_file.id:08d}.txt"
+    path = os.path.join(directory, file_name)
+
+    writer = _Writer(path + '.part')
+    try:
+        modifier = FILE_ID_MODIFIERS[(payment_file.id - 1) % len(FILE_ID_MODIFIERS)]
+        writer.write(
+            f"101 {settings.PAYMENT_FILE_DESTINATION_ROUTING} {settings.PAYMENT_FILE_ORIGIN_ROUTING}"
+            f"{created:%y%m%d%H%M}{modifier}{RECORD_SIZE:03d}{BLOCKING_FACTOR}1"
+            f"{_alpha(settings.PAYMENT_FILE_DESTINATION_NAME, 23)}{_alpha(settings.PAYMENT_FILE_ORIGIN_NAME, 23)}"
+            f"{_num(payment_file.id, 8)}"
+        )
+        batches = _Batches(writer, created)
+        rows = (
+            payment_file.entries.order_by('transaction__routing_number', 'transaction_id').values_list(*ENTRY_FIELDS)
+            .iterator(chunk_size=chunk_size or settings.PAYMENT_FILE_CHUNK_SIZE)
+        )
+        overflow = None
+        for row in rows:
+            if not batches.fits(row[4]):
+                overflow = row
+                rows.close()
+                break
+            batches.add(*row)
+        batches.close()
+
+        blocks = -(-(writer.records + 1) // BLOCKING_FACTOR)
+        writer.write(
+            f"9{_num(batches.count, 6)}{_num(blocks, 6)}{_num(batches.entries, 8)}"
+            f"{_num(batches.hash % 10 ** 10, 10)}{'0' * 12}{_num(batches.cents, 12)}{' ' * 39}"
+        )
+        while writer.records % BLOCKING_FACTOR:
+            writer.write('9' * RECORD_SIZE)
+        writer.close()
+    except BaseException:
+        writer.file.close()
+        os.remove(path + '.part')
+        raise
+    os.replace(path + '.part', path)
+
+    if overflow is not None:
+        transaction_id, routing_number = overflow[:2]
+        payment_file.entries.filter(
+            models.Q(transaction__routing_number__gt=routing_number)
+            | models.Q(transaction__routing_number=routing_number, transaction_id__gte=transaction_id)
+        ).update(payment_file=None)
+    PaymentFile.objects.filter(pk=payment_file.pk).update(
+        status='generated',
+        file_name=file_name,
+        entry_count=batches.entries,
+        batch_count=batches.count,
+        total_amount=Decimal(batches.cents) / 100,
+        sha256=writer.sha256.hexdigest(),
+        generated_at=timezone.now(),
+    )
+    payment_file.refresh_from_db()
+    return path
+
+def _write_building_file(directory, chunk_size):
+    # Hold the file's row lock while writing so two generators never write the same file
+    with transaction.atomic():
+        queryset = PaymentFile.objects.filter(status='building').order_by('id')
+        if connection.features.has_select_for_update_skip_locked:
+            queryset = queryset.select_for_update(skip_locked=True)
+        payment_file = queryset.first()
+        if payment_file is None:
+            return None
+        return write_payment_file(payment_file, directory, chunk_size)
+
+def generate_payment_files(max_entries=MAX_FILE_ENTRIES, directory=None, chunk_size=None):
+    """Finish files left building, then write new files until no eligible entries remain; returns their paths"""
+    paths = []
+    while True:
+        path = _write_building_file(directory, chunk_size)
+        if path is not None:
+            paths.append(path)
+        elif claim_entries(max_entries) is None:
+            return paths
@@ -0,0 +1,67 @@
+import os
+import secrets
+import threading
+import time
+
+REFERENCE_PREFIXES = {
+    'deposit': 'DEP',
+    'withdrawal': 'WTD',
+    'transfer': 'TRF',
+    'external': 'EXT',
+    'interest': 'INT',
+}
+DEFAULT_PREFIX = 'TRX'
+
+# Crockford base32; ordered like ASCII so encoded ids sort like the integers
+ALPHABET = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+ENCODED_LENGTH = 26  # 128 bits
+
+NODE_BITS = 48
+SEQUENCE_BITS = 32
+MAX_SEQUENCE = (1 << SEQUENCE_BITS) - 1
+
+def _encode(value):
+    chars = []
+    for _ in range(ENCODED_LENGTH):
+        value, index = divmod(value, 32)
+        chars.append(ALPHABET[index])
+    return ''.join(reversed(chars))
+
+class _Generator:
+    """
+    Issues 128-bit ids of 48-bit milliseconds, a 48-bit random node and a
+    32-bit sequence. Ids from one process strictly increase even if the clock
+    steps back; ids from different processes differ in the node.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.lock = threading.Lock()
+        self.node = secrets.randbits(NODE_BITS)
+        self.millis = 0
+        self.sequence = 0
+
+    def next_id(self):
+        with self.lock:
+            millis = time.time_ns() // 1_000_000
+            if millis > self.millis:
+                self.millis = millis
+                self.sequence = 0
+            elif self.sequence < MAX_SEQUENCE:
+                self.sequence += 1
+            else:
+                # Sequence exhausted within this millisecond: borrow the next one
+                self.millis += 1
+                self.sequence = 0
+            return (self.millis << (NODE_BITS + SEQUENCE_BITS)) | (self.node << SEQUENCE_BITS) | self.sequence
+
+_generator = _Generator()
+if hasattr(os, 'register_at_fork'):
+    # A forked child would otherwise share the parent's node and sequence
+    os.register_at_fork(after_in_child=_generator.reset)
+
+def new_reference(transaction_type):
+    """Return a unique, time-ordered reference number such as TRF01J9Z3..."""
+    return REFERENCE_PREFIXES.get(transaction_type, DEFAULT_PREFIX) + _encode(_generator.next_id())
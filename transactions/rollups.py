@@ -0,0 +1,266 @@
+from django.db import IntegrityError, connection, models, transaction
+from django.db.models.functions import Coalesce
+from collections import defaultdict
+from decimal import Decimal
+import random
+
+from .models import Transaction, UserTransactionSummary, AccountTransactionSummary, AccountSummaryShard
+from accounts.models import Account, AccountBalanceShard
+
+ZERO = Decimal('0.00')
+
+USER_SUMMARY_FIELDS = ['total_deposits', 'total_withdrawals', 'total_transfers_sent', 'transaction_count']
+ACCOUNT_SUMMARY_FIELDS = ['total_credits', 'total_debits', 'transaction_count']
+
+def _sum_of(transaction_type):
+    return Coalesce(
+        models.Sum('amount', filter=models.Q(transaction_type=transaction_type)),
+        models.Value(ZERO),
+        output_field=models.DecimalField(max_digits=18, decimal_places=2),
+    )
+
+USER_SUMMARY_AGGREGATES = {
+    'total_deposits': _sum_of('deposit'),
+    'total_withdrawals': _sum_of('withdrawal'),
+    'total_transfers_sent': _sum_of('transfer'),
+    'transaction_count': models.Count('id'),
+}
+
+def summarize_user(user):
+    """Compute a user's summary from the raw transactions in one conditional-aggregation query"""
+    return Transaction.objects.filter(user=user, status='completed').aggregate(**USER_SUMMARY_AGGREGATES)
+
+def get_user_summary(user):
+    """Read the user's rollup row, falling back to the raw aggregate if it does not exist yet"""
+    summary = UserTransactionSummary.objects.filter(user=user).values(*USER_SUMMARY_FIELDS).first()
+    return summary if summary is not None else summarize_user(user)
+
+def _increment(model, lookup, deltas):
+    """Add deltas to the rollup row matching lookup, creating it on first use"""
+    changes = {field: models.F(field) + value for field, value in deltas.items()}
+    if model.objects.filter(**lookup).update(**changes):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**lookup, **deltas)
+    except IntegrityError:
+        # Created concurrently since our UPDATE; the row exists now
+        model.objects.filter(**lookup).update(**changes)
+
+def _rollup_deltas(transactions):
+    users = defaultdict(lambda: dict.fromkeys(USER_SUMMARY_FIELDS, ZERO))
+    accounts = defaultdict(lambda: dict.fromkeys(ACCOUNT_SUMMARY_FIELDS, ZERO))
+    for trans in transactions:
+        user = users[trans.user_id]
+        user['transaction_count'] += 1
+        if trans.transaction_type == 'deposit':
+            user['total_deposits'] += trans.amount
+        elif trans.transaction_type == 'withdrawal':
+            user['total_withdrawals'] += trans.amount
+        elif trans.transaction_type == 'transfer':
+            user['total_transfers_sent'] += trans.amount
+        if trans.from_account_id:
+            accounts[trans.from_account_id]['total_debits'] += trans.amount
+            accounts[trans.from_account_id]['transaction_count'] += 1
+        if trans.to_account_id:
+            accounts[trans.to_account_id]['total_credits'] += trans.amount
+            accounts[trans.to_account_id]['transaction_count'] += 1
+    return users, accounts
+
+def record_completed(transactions):
+    """
+    Fold newly completed transactions into the user and account rollups.
+
+    Call inside the database transaction that posts them so the rollups commit
+    or roll back together with the ledger. Rows are updated in key order to
+    keep lock acquisition consistent between concurrent postings. Credits to an
+    account with balance shards go to a random summary shard instead.
+    """
+    users, accounts = _rollup_deltas(transactions)
+    sharded = {
+        trans.to_account_id: trans.to_account.balance_shards for trans in transactions
+        if trans.to_account_id and Transaction.to_account.is_cached(trans) and trans.to_account.balance_shards
+    }
+    for user_id in sorted(users):
+        _increment(UserTransactionSummary, {'pk': user_id}, {k: v for k, v in users[user_id].items() if v})
+    for account_id in sorted(accounts):
+        deltas = {k: v for k, v in accounts[account_id].items() if v}
+        if account_id in sharded and 'total_debits' not in deltas:
+            shard = random.randrange(sharded[account_id])
+            _increment(AccountSummaryShard, {'account_id': account_id, 'shard': shard}, deltas)
+        else:
+            _increment(AccountTransactionSummary, {'pk': account_id}, deltas)
+
+def record_reversed(transactions):
+    """
+    Take transactions that are no longer completed, or no longer as they were
+    recorded, back out of the user and account rollups. Call inside the
+    database transaction that changes them.
+    """
+    users, accounts = _rollup_deltas(transactions)
+    for user_id in sorted(users):
+        _increment(UserTransactionSummary, {'pk': user_id}, {k: -v for k, v in users[user_id].items() if v})
+    for account_id in sorted(accounts):
+        # Credits recorded in a summary shard still add up with the account's summary row
+        _increment(AccountTransactionSummary, {'pk': account_id},
+                   {k: -v for k, v in accounts[account_id].items() if v})
+
+def _increment_many(model, key, deltas_by_key):
+    """Add each key's deltas to its rollup row: one lock, one insert of the missing rows and one UPDATE"""
+    deltas_by_key = {k: deltas for k, deltas in deltas_by_key.items() if any(deltas.values())}
+    if not deltas_by_key:
+        return
+    rows = model.objects.filter(**{f'{key}__in': deltas_by_key})
+    existing = set(rows.select_for_update().order_by(key).values_list(key, flat=True))
+    # Rows another posting creates meanwhile are skipped here and locked by the UPDATE
+    model.objects.bulk_create(
+        [model(**{key: k}) for k in deltas_by_key if k not in existing], ignore_conflicts=True)
+    fields = sorted({field for deltas in deltas_by_key.values() for field, value in deltas.items() if value})
+    if connection.vendor == 'postgresql':
+        # One array per column rather than a CASE branch per row, which is slow to build in Python
+        quote = connection.ops.quote_name
+        table = quote(model._meta.db_table)
+        columns = [key, *fields]
+        arrays = ', '.join(f'%s::{model._meta.get_field(column).db_type(connection)}[]' for column in columns)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {table} SET {', '.join(f'{quote(f)} = {table}.{quote(f)} + deltas.{quote(f)}' for f in fields)} "
+                f"FROM unnest({arrays}) AS deltas ({', '.join(quote(column) for column in columns)}) "
+                f"WHERE {table}.{quote(key)} = deltas.{quote(key)}",
+                [list(deltas_by_key)] + [[deltas[field] for deltas in deltas_by_key.values()] for field in fields],
+            )
+        return
+    rows.update(**{
+        field: models.Case(
+            *[models.When(**{key: k}, then=models.F(field) + models.Value(deltas[field]))
+              for k, deltas in deltas_by_key.items() if deltas[field]],
+            default=models.F(field),
+            output_field=model._meta.get_field(field),
+        )
+        for field in fields
+    })
+
+def record_completed_in_bulk(transactions):
+    """
+    Like record_completed, for many transactions over many users and accounts:
+    a few statements per rollup table instead of a few per row. Credits to
+    sharded accounts go to their summary row rather than a summary shard.
+    """
+    users, accounts = _rollup_deltas(transactions)
+    _increment_many(UserTransactionSummary, 'user_id', users)
+    _increment_many(AccountTransactionSummary, 'account_id', accounts)
+
+def fold_summary_shards(account_id):
+    """Move an account's summary shards into its AccountTransactionSummary; call inside a transaction"""
+    shards = list(
+        AccountSummaryShard.objects.select_for_update().filter(account_id=account_id)
+        .exclude(transaction_count=0).values_list('id', 'total_credits', 'transaction_count')
+    )
+    if not shards:
+        return
+    AccountSummaryShard.objects.filter(id__in=[shard_id for shard_id, _, _ in shards]).update(
+        total_credits=ZERO, transaction_count=0)
+    _increment(AccountTransactionSummary, {'pk': account_id}, {
+        'total_credits': sum((credits for _, credits, _ in shards), ZERO),
+        'transaction_count': sum(count for _, _, count in shards),
+    })
+
+def create_rollups(transactions):
+    """
+    Insert the rollups of users and accounts whose first completed transactions
+    these are, in two bulk inserts instead of a query per row. For rows created
+    in the same database transaction, e.g. by a bulk import.
+    """
+    users, accounts = _rollup_deltas(transactions)
+    UserTransactionSummary.objects.bulk_create(
+        [UserTransactionSummary(user_id=user_id, **deltas) for user_id, deltas in users.items()])
+    AccountTransactionSummary.objects.bulk_create(
+        [AccountTransactionSummary(account_id=account_id, **deltas) for account_id, deltas in accounts.items()])
+
+def compute_user_rollups(first_id, last_id):
+    """Aggregate the raw rollups of users with first_id <= id <= last_id"""
+    rows = (
+        Transaction.objects.filter(status='completed', user_id__gte=first_id, user_id__lte=last_id)
+        .order_by().values('user_id').annotate(**USER_SUMMARY_AGGREGATES)
+    )
+    return {row.pop('user_id'): row for row in rows}
+
+def compute_account_rollups(first_id, last_id):
+    """Aggregate the raw rollups of accounts with first_id <= id <= last_id"""
+    rollups = defaultdict(lambda: dict.fromkeys(ACCOUNT_SUMMARY_FIELDS, ZERO))
+    completed = Transaction.objects.filter(status='completed').order_by()
+    sides = [('from_account_id', 'total_debits'), ('to_account_id', 'total_credits')]
+    for column, total_field in sides:
+        rows = (
+            completed.filter(**{f'{column}__gte': first_id, f'{column}__lte': last_id})
+            .values(column).annotate(total=models.Sum('amount'), count=models.Count('id'))
+        )
+        for row in rows:
+            rollup = rollups[row[column]]
+            rollup[total_field] += row['total']
+            rollup['transaction_count'] += row['count']
+    return dict(rollups)
+
+def accounts_with_summary_shards(limit, after_id=0):
+    return list(
+        AccountSummaryShard.objects.filter(account_id__gt=after_id).exclude(transaction_count=0).order_by('account_id')
+        .values_list('account_id', flat=True).distinct()[:limit]
+    )
+
+def stored_rollups(model, first_id, last_id, fields):
+    rows = model.objects.filter(pk__gte=first_id, pk__lte=last_id).values('pk', *fields)
+    return {row.pop('pk'): row for row in rows}
+
+def stored_user_rollups(first_id, last_id):
+    return stored_rollups(UserTransactionSummary, first_id, last_id, USER_SUMMARY_FIELDS)
+
+def stored_account_rollups(first_id, last_id):
+    """Stored account rollups, including credits still waiting in summary shards"""
+    stored = stored_rollups(AccountTransactionSummary, first_id, last_id, ACCOUNT_SUMMARY_FIELDS)
+    shards = (
+        AccountSummaryShard.objects.filter(account_id__gte=first_id, account_id__lte=last_id)
+        .exclude(transaction_count=0).order_by().values('account_id')
+        .annotate(credits=models.Sum('total_credits'), count=models.Sum('transaction_count'))
+    )
+    for row in shards:
+        rollup = stored.setdefault(row['account_id'], dict.fromkeys(ACCOUNT_SUMMARY_FIELDS, ZERO))
+        rollup['total_credits'] += row['credits']
+        rollup['transaction_count'] += row['count']
+    return stored
+
+def _lock_range(accounts):
+    # Postings lock the sender's account first and sharded credits their balance shard,
+    # so holding both keeps the range quiet
+    list(accounts.select_for_update().values_list('id'))
+    list(AccountBalanceShard.objects.select_for_update().filter(account__in=accounts).values_list('id'))
+
+def rebuild_user_rollups(first_id, last_id):
+    """Replace the user rollups of an id range with freshly aggregated values"""
+    with transaction.atomic():
+        _lock_range(Account.objects.filter(user_id__gte=first_id, user_id__lte=last_id))
+        rollups = compute_user_rollups(first_id, last_id)
+        UserTransactionSummary.objects.filter(pk__gte=first_id, pk__lte=last_id).delete()
+        UserTransactionSummary.objects.bulk_create(
+            [UserTransactionSummary(user_id=user_id, **values) for user_id, values in rollups.items()]
+        )
+    return len(rollups)
+
+def rebuild_account_rollups(first_id, last_id):
+    """Replace the account rollups of an id range with freshly aggregated values"""
+    with transaction.atomic():
+        _lock_range(Account.objects.filter(id__gte=first_id, id__lte=last_id))
+        rollups = compute_account_rollups(first_id, last_id)
+        AccountTransactionSummary.objects.filter(pk__gte=first_id, pk__lte=last_id).delete()
+        AccountSummaryShard.objects.filter(account_id__gte=first_id, account_id__lte=last_id).delete()
+        AccountTransactionSummary.objects.bulk_create(
+            [AccountTransactionSummary(account_id=account_id, **values) for account_id, values in rollups.items()]
+        )
+    return len(rollups)
+
+def diff_rollups(expected, stored, fields):
+    """Return the keys whose stored rollup differs from the expected one"""
+    zero = dict.fromkeys(fields, 0)
+    return sorted(
+        key for key in set(expected) | set(stored)
+        if any(expected.get(key, zero)[field] != stored.get(key, zero)[field] for field in fields)
+    )
@@ -1,6 +1,8 @@
 from rest_framework import serializers
+from django.conf import settings
 from decimal import Decimal
 from .models import Transaction
+from .payment_files import is_valid_routing_number
 from accounts.models import Account
 from accounts.serializers import AccountSerializer
 
@@ -13,24 +15,33 @@ class TransactionSerializer(serializers.ModelSerializer):
         fields = ['id', 'user', 'from_account', 'to_account', 'transaction_type', 
                  'amount', 'description', 'reference_number', 'status', 
                  'created_at', 'updated_at', 'bank_name', 'beneficiary_name', 
-                 'routing_number', 'beneficiary_address']  # add bank_name
+                 'routing_number', 'beneficiary_address', 'beneficiary_account_number']  # add bank_name
         read_only_fields = ['id', 'user', 'reference_number', 'status', 
                            ]
 
+    def to_representation(self, instance):
+        # Available balances annotated by views.with_accounts
+        for side in ('from_account', 'to_account'):
+            account = getattr(instance, side)
+            if account is not None and hasattr(instance, f'{side}_available'):
+                account.available = getattr(instance, f'{side}_available')
+        return super().to_representation(instance)
+
 class DepositSerializer(serializers.Serializer):
     account_id = serializers.IntegerField()
     amount = serializers.DecimalField(max_digits=15, decimal_places=2, min_value=Decimal('0.01'))
     description = serializers.CharField(max_length=255, required=False, allow_blank=True)
     
-    def validate_account_id(self, value):
+    def validate(self, attrs):
         user = self.context['request'].user
         try:
-            account = Account.objects.get(id=value, user=user)
+            account = Account.objects.get(id=attrs['account_id'], user=user)
             if not account.is_active:
-                raise serializers.ValidationError("Account is not active")
-            return value
+                raise serializers.ValidationError({'account_id': "Account is not active"}, code='inactive_account')
+            attrs['account'] = account
+            return attrs
         except Account.DoesNotExist:
-            raise serializers.ValidationError("Account not found")
+            raise serializers.ValidationError({'account_id': "Account not found"})
 
 class WithdrawalSerializer(serializers.Serializer):
     account_id = serializers.IntegerField()
@@ -46,9 +57,9 @@ class WithdrawalSerializer(serializers.Serializer):
             account = Account.objects.get(id=account_id, user=user)
             if not account.can_debit(amount):
                 if not account.is_active:
-                    raise serializers.ValidationError("Account is not active")
+                    raise serializers.ValidationError("Account is not active", code='inactive_account')
                 else:
-                    raise serializers.ValidationError("Insufficient balance")
+                    raise serializers.ValidationError("Insufficient balance", code='insufficient_funds')
             attrs['account'] = account
             return attrs
         except Account.DoesNotExist:
@@ -71,9 +82,9 @@ class TransferSerializer(serializers.Serializer):
             from_account = Account.objects.get(id=from_account_id, user=user)
             if not from_account.can_debit(amount):
                 if not from_account.is_active:
-                    raise serializers.ValidationError("Your account is not active")
+                    raise serializers.ValidationError("Your account is not active", code='inactive_account')
                 else:
-                    raise serializers.ValidationError("Insufficient balance")
+                    raise serializers.ValidationError("Insufficient balance", code='insufficient_funds')
             attrs['from_account'] = from_account
         except Account.DoesNotExist:
             raise serializers.ValidationError("From account not found")
@@ -82,7 +93,7 @@ class TransferSerializer(serializers.Serializer):
         try:
             to_account = Account.objects.get(account_number=to_account_number)
             if not to_account.is_active:
-                raise serializers.ValidationError("Destination account is not active")
+                raise serializers.ValidationError("Destination account is not active", code='inactive_account')
             if to_account.id == from_account_id:
                 raise serializers.ValidationError("Cannot transfer to the same account")
             attrs['to_account'] = to_account
@@ -91,10 +102,40 @@ class TransferSerializer(serializers.Serializer):
         
         return attrs
 
+class BatchTransferLegSerializer(serializers.Serializer):
+    from_account_id = serializers.IntegerField()
+    to_account_number = serializers.CharField(max_length=20)
+    amount = serializers.DecimalField(max_digits=15, decimal_places=2, min_value=Decimal('0.01'))
+    description = serializers.CharField(max_length=255, required=False, allow_blank=True)
+
+class BatchTransferSerializer(serializers.Serializer):
+    MODE_CHOICES = [
+        ('atomic', 'All or nothing'),
+        ('best_effort', 'Best effort'),
+    ]
+
+    mode = serializers.ChoiceField(choices=MODE_CHOICES, default='atomic')
+    transfers = BatchTransferLegSerializer(many=True, allow_empty=False)
+
+    def validate_transfers(self, value):
+        if len(value) > settings.BATCH_TRANSFER_MAX_LEGS:
+            raise serializers.ValidationError(
+                f"A batch may contain at most {settings.BATCH_TRANSFER_MAX_LEGS} transfers")
+        return value
+
+class BulkRecipientLookupSerializer(serializers.Serializer):
+    account_numbers = serializers.ListField(child=serializers.CharField(max_length=20), allow_empty=False)
+
+    def validate_account_numbers(self, value):
+        if len(value) > settings.RECIPIENT_LOOKUP_MAX_BULK:
+            raise serializers.ValidationError(
+                f"At most {settings.RECIPIENT_LOOKUP_MAX_BULK} account numbers can be looked up at once")
+        return value
+
 class ExternalTransferSerializer(serializers.Serializer):
     from_account_id = serializers.IntegerField()
     beneficiary_name = serializers.CharField(max_length=100)
-    to_account_number = serializers.CharField(max_length=20)
+    to_account_number = serializers.CharField(max_length=17)
     routing_number = serializers.CharField(max_length=50)
     beneficiary_address = serializers.CharField(max_length=255)
     bank_name = serializers.CharField(max_length=100)
@@ -110,11 +151,17 @@ class ExternalTransferSerializer(serializers.Serializer):
             from_account = Account.objects.get(id=from_account_id, user=user)
             if not from_account.can_debit(amount):
                 if not from_account.is_active:
-                    raise serializers.ValidationError("Your account is not active")
+                    raise serializers.ValidationError("Your account is not active", code='inactive_account')
                 else:
-                    raise serializers.ValidationError("Insufficient balance")
+                    raise serializers.ValidationError("Insufficient balance", code='insufficient_funds')
             attrs['from_account'] = from_account
         except Account.DoesNotExist:
             raise serializers.ValidationError("From account not found")
         # No to_account validation for external
-        return attrs
\ No newline at end of file
+        return attrs
+
+    def validate_routing_number(self, value):
+        value = value.strip()
+        if not is_valid_routing_number(value):
+            raise serializers.ValidationError("Enter a valid 9-digit ABA routing number")
+        return value
\ No newline at end of file
@@ -0,0 +1,200 @@
+from .models import Transaction
+from .references import new_reference
+from .rollups import record_completed
+from accounts.models import Account
+from accounts import services as balances
+from accounts.locking import atomic_with_retry, lock_accounts
+from accounts.sharding import fold_shards
+from banking_project.metrics import MONEY_MOVEMENTS, counted, error_outcome
+
+def _set_balance(account, balance):
+    # A sharded account's postings return its available balance, not the row's own
+    if account.balance_shards:
+        account.available = balance
+    else:
+        account.balance = balance
+
+@counted('deposit')
+@atomic_with_retry
+def post_deposit(user, account, amount, description=''):
+    _set_balance(account, balances.credit(account.id, amount, account.balance_shards))
+    trans = Transaction.objects.create(
+        user=user,
+        to_account=account,
+        transaction_type='deposit',
+        amount=amount,
+        description=description,
+        reference_number=new_reference('deposit'),
+        status='completed'
+    )
+    record_completed([trans])
+    return trans
+
+@counted('withdrawal')
+@atomic_with_retry
+def post_withdrawal(user, account, amount, description=''):
+    _set_balance(account, balances.debit(account.id, amount))
+    trans = Transaction.objects.create(
+        user=user,
+        from_account=account,
+        transaction_type='withdrawal',
+        amount=amount,
+        description=description,
+        reference_number=new_reference('withdrawal'),
+        status='completed'
+    )
+    record_completed([trans])
+    return trans
+
+@counted('transfer')
+@atomic_with_retry
+def post_transfer(user, from_account, to_account, amount, description=''):
+    from_balance, to_balance = balances.transfer(
+        from_account.id, to_account.id, amount, to_account.balance_shards)
+    _set_balance(from_account, from_balance)
+    if to_balance is not None:
+        _set_balance(to_account, to_balance)
+    trans = Transaction.objects.create(
+        user=user,
+        from_account=from_account,
+        to_account=to_account,
+        transaction_type='transfer',
+        amount=amount,
+        description=description,
+        reference_number=new_reference('transfer'),
+        status='completed'
+    )
+    record_completed([trans])
+    return trans
+
+@counted('external_transfer')
+@atomic_with_retry
+def post_external_transfer(user, from_account, amount, description='', **beneficiary):
+    # Deduct funds immediately for pending external transfer
+    _set_balance(from_account, balances.debit(from_account.id, amount))
+    return Transaction.objects.create(
+        user=user,
+        from_account=from_account,
+        transaction_type='external',
+        amount=amount,
+        description=description,
+        reference_number=new_reference('external'),
+        status='pending',
+        **beneficiary
+    )
+
+# Metric outcomes of the leg errors that match a single transfer's; any other error is 'invalid'
+LEG_OUTCOMES = {
+    "Insufficient balance": 'insufficient_funds',
+    "Your account is not active": 'inactive_account',
+    "Destination account is not active": 'inactive_account',
+}
+
+def _check_leg(user, leg, from_account, to_account, running):
+    """Return the error message for a leg that cannot be posted, or None"""
+    amount = leg['amount']
+    if from_account is None or from_account.user_id != user.id:
+        return "From account not found"
+    if not from_account.is_active:
+        return "Your account is not active"
+    if running[from_account.id] < amount:
+        return "Insufficient balance"
+    if to_account is None:
+        return "Destination account not found"
+    if not to_account.is_active:
+        return "Destination account is not active"
+    if to_account.id == from_account.id:
+        return "Cannot transfer to the same account"
+    return None
+
+def post_batch_transfer(user, legs, mode='atomic'):
+    """
+    Post many internal transfers for one user in a single database transaction.
+
+    Every involved account is locked once, in primary key order, and the legs are
+    checked in order against running balances. In 'atomic' mode nothing is posted
+    unless every leg is valid, and the valid legs of a batch that fails are reported
+    as 'rolled_back'; in 'best_effort' mode invalid legs are skipped.
+    Returns (results, balances) where results holds one entry per leg.
+
+    Each leg is counted in the transfer metrics as a single transfer would be, once
+    the batch has committed; rolled back legs are not counted.
+    """
+    try:
+        results, own_balances = _post_batch_transfer(user, legs, mode)
+    except Exception as exc:
+        outcome = error_outcome(exc)
+        if outcome:
+            MONEY_MOVEMENTS.labels('transfer', outcome).inc(len(legs))
+        raise
+    for result in results:
+        if result['status'] == 'completed':
+            MONEY_MOVEMENTS.labels('transfer', 'success').inc()
+        elif result['status'] == 'failed':
+            MONEY_MOVEMENTS.labels('transfer', LEG_OUTCOMES.get(result['error'], 'invalid')).inc()
+    return results, own_balances
+
+@atomic_with_retry
+def _post_batch_transfer(user, legs, mode):
+    from_ids = {leg['from_account_id'] for leg in legs}
+    numbers = {leg['to_account_number'] for leg in legs}
+
+    destinations = dict(
+        Account.objects.filter(account_number__in=numbers).values_list('account_number', 'id')
+    )
+    accounts = lock_accounts(
+        from_ids | set(destinations.values()),
+        fields=['id', 'user_id', 'account_number', 'balance', 'balance_shards', 'status']
+    )
+    # Legs are checked against the account row, so debited accounts take in their shards first
+    for account_id in from_ids & set(accounts):
+        if accounts[account_id].balance_shards:
+            accounts[account_id].balance += fold_shards(account_id)
+    running = {account_id: account.balance for account_id, account in accounts.items()}
+
+    results = []
+    pending = []
+    for index, leg in enumerate(legs):
+        from_account = accounts.get(leg['from_account_id'])
+        to_account = accounts.get(destinations.get(leg['to_account_number']))
+        error = _check_leg(user, leg, from_account, to_account, running)
+        if error:
+            results.append({'index': index, 'status': 'failed', 'error': error})
+            continue
+        amount = leg['amount']
+        running[from_account.id] -= amount
+        running[to_account.id] += amount
+        trans = Transaction(
+            user=user,
+            from_account=from_account,
+            to_account=to_account,
+            transaction_type='transfer',
+            amount=amount,
+            description=leg.get('description', ''),
+            reference_number=new_reference('transfer'),
+            status='completed'
+        )
+        pending.append(trans)
+        results.append({'index': index, 'status': 'completed', 'reference_number': trans.reference_number})
+
+    failed = any(result['status'] == 'failed' for result in results)
+    if mode == 'atomic' and failed:
+        for result in results:
+            if result['status'] == 'completed':
+                result['status'] = 'rolled_back'
+                del result['reference_number']
+        return results, {}
+
+    Transaction.objects.bulk_create(pending, batch_size=500)
+    record_completed(pending)
+    balances.apply_balance_deltas({
+        account_id: balance - accounts[account_id].balance
+        for account_id, balance in running.items()
+    })
+
+    own_balances = {
+        account_id: running[account_id]
+        for account_id in from_ids
+        if account_id in accounts and accounts[account_id].user_id == user.id
+    }
+    return results, own_balances
@@ -0,0 +1,70 @@
+from django.db import connection, models
+from django.db.models.functions import Greatest
+from django.utils import timezone
+from collections import defaultdict
+from decimal import Decimal
+
+from .models import Transaction, SettlementCheckpoint
+from .payment_files import queue_for_payment
+from .rollups import record_completed
+from accounts import services as balances
+from accounts.locking import atomic_with_retry
+
+SETTLEMENT_FIELDS = ['id', 'user_id', 'from_account_id', 'to_account_id', 'transaction_type', 'amount', 'settlement_action']
+
+def pending_settlements():
+    return Transaction.objects.filter(
+        transaction_type='external', status='pending', settlement_action__isnull=False
+    )
+
+def enqueue_settlements(queryset, action):
+    """Queue pending external transfers for the settlement worker and return how many were queued"""
+    return queryset.filter(transaction_type='external', status='pending').update(settlement_action=action)
+
+@atomic_with_retry
+def settle_chunk(worker, chunk_size):
+    """
+    Claim up to chunk_size queued transfers and settle them in one transaction.
+
+    Rows are claimed with FOR UPDATE SKIP LOCKED, so parallel workers take
+    disjoint chunks instead of waiting on each other. Approved transfers were
+    debited when they were created; here they complete and are queued for the
+    next payment file. Rejected ones are refunded. Returns (approved, rejected) counts.
+    """
+    queryset = pending_settlements().order_by('id').only(*SETTLEMENT_FIELDS)
+    if connection.features.has_select_for_update_skip_locked:
+        queryset = queryset.select_for_update(skip_locked=True)
+    claimed = list(queryset[:chunk_size])
+    if not claimed:
+        return 0, 0
+
+    approved = [trans for trans in claimed if trans.settlement_action == 'approve']
+    rejected = [trans for trans in claimed if trans.settlement_action == 'reject']
+    now = timezone.now()
+
+    if approved:
+        Transaction.objects.filter(id__in=[trans.id for trans in approved]).update(
+            status='completed', settlement_action=None, updated_at=now)
+        for trans in approved:
+            trans.status = 'completed'
+        record_completed(approved)
+        queue_for_payment(approved)
+
+    if rejected:
+        refunds = defaultdict(Decimal)
+        for trans in rejected:
+            if trans.from_account_id:
+                refunds[trans.from_account_id] += trans.amount
+        balances.apply_balance_deltas(refunds)
+        Transaction.objects.filter(id__in=[trans.id for trans in rejected]).update(
+            status='cancelled', settlement_action=None, updated_at=now)
+
+    checkpoint, _ = SettlementCheckpoint.objects.get_or_create(worker=worker)
+    SettlementCheckpoint.objects.filter(pk=checkpoint.pk).update(
+        last_transaction_id=Greatest('last_transaction_id', claimed[-1].id),
+        chunks=models.F('chunks') + 1,
+        approved=models.F('approved') + len(approved),
+        rejected=models.F('rejected') + len(rejected),
+        updated_at=now,
+    )
+    return len(approved), len(rejected)
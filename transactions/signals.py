@@ -0,0 +1,21 @@
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from accounts.models import Account
+from . import lookup
+
+RECIPIENT_USER_FIELDS = {'first_name', 'last_name', 'email'}
+
+@receiver(post_save, sender=Account)
+@receiver(post_delete, sender=Account)
+def invalidate_recipient(sender, instance, **kwargs):
+    # Also clears a negative entry when a new account takes the number
+    lookup.invalidate_on_commit([instance.account_number])
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def invalidate_holder_recipients(sender, instance, created, update_fields=None, **kwargs):
+    # Skips saves such as the last_login update on every login
+    if created or (update_fields is not None and not RECIPIENT_USER_FIELDS & set(update_fields)):
+        return
+    lookup.invalidate_on_commit(instance.accounts.values_list('account_number', flat=True))
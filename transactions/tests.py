@@ -0,0 +1,190 @@
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase, TransactionTestCase
+from django.test.utils import override_settings
+from django.urls import reverse
+from decimal import Decimal
+from io import StringIO
+from rest_framework_simplejwt.tokens import AccessToken
+from unittest import mock, skipUnless
+import logging
+
+from accounts.models import Account
+from accounts.services import InsufficientFunds
+from accounts.sharding import set_balance_shards
+from banking_project.instrumentation import logger as request_logger
+from users.models import User
+from . import references
+from .management.commands._endpoints import call_endpoint
+from .management.commands.check_query_counts import QUERY_BUDGETS, seed
+from .management.commands.check_query_plans import Command as QueryPlanCommand
+from .models import Transaction
+from .services import post_transfer
+
+# Every cache misses, so each request also pays for loading its user, balances and recipients
+COLD_CACHES = {alias: {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'} for alias in settings.CACHES}
+
+class RequestRecords(logging.Handler):
+    """Keep the per-request records RequestMetricsMiddleware logs"""
+
+    def __init__(self):
+        super().__init__(logging.INFO)
+        self.records = []
+
+    def emit(self, record):
+        if record.levelno == logging.INFO and hasattr(record, 'queries'):
+            self.records.append(record)
+
+def make_user(name, balance='0.00', **account):
+    user = User.objects.create_user(
+        username=name, email=f'{name}@example.com', password=None, first_name='Test', last_name=name)
+    return user, Account.objects.create(user=user, balance=Decimal(balance), **account)
+
+# The budgets count PostgreSQL's lock timeout statement; other backends set it differently or not at all
+@skipUnless(connection.vendor == 'postgresql', 'Query budgets are counted on PostgreSQL')
+class QueryCountTests(TestCase):
+    """Every endpoint in QUERY_BUDGETS runs its budgeted queries with full pages"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.context = seed()
+
+    def test_endpoints_stay_within_their_query_budgets(self):
+        for key, budget in QUERY_BUDGETS.items():
+            actor, method, path = key.split(' ', 2)
+            path = path.format(**self.context)
+            with self.subTest(key), self.assertNumQueries(budget):
+                response, _ = call_endpoint(
+                    path, self.context[actor], method.lower(), self.context['payloads'].get(path))
+            self.assertLess(response.status_code, 400, key)
+
+# Not a TestCase: inside its transaction every atomic block would add SAVEPOINT queries to the count
+@override_settings(REQUEST_METRICS_SAMPLE_RATE=1.0, REQUEST_BUDGET_ACTION='log', CACHES=COLD_CACHES)
+class RequestBudgetTests(TransactionTestCase):
+    """The worst case of every view in REQUEST_BUDGETS, through the full middleware stack"""
+
+    def setUp(self):
+        self.records = RequestRecords()
+        self.addCleanup(request_logger.setLevel, request_logger.level)
+        self.addCleanup(setattr, request_logger, 'propagate', request_logger.propagate)
+        self.addCleanup(request_logger.removeHandler, self.records)
+        request_logger.addHandler(self.records)
+        request_logger.setLevel(logging.INFO)
+        request_logger.propagate = False
+        self.checked = set()
+
+    def assertWithinBudget(self, user, view, args=(), method='get', data=None):
+        client = Client(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}')
+        path = reverse(view, args=args)
+        if method == 'get':
+            response = client.get(path, data)
+        else:
+            response = getattr(client, method)(path, data, content_type='application/json')
+        self.assertLess(response.status_code, 400, f'{view}: {response.content}')
+        queries = self.records.records.pop().queries
+        self.assertLessEqual(queries, settings.REQUEST_BUDGETS[view]['queries'], view)
+        self.checked.add(view)
+        return response
+
+    def test_views_stay_within_their_request_budgets(self):
+        depositor, deposit_account = make_user('depositor')
+        withdrawer, withdrawal_account = make_user('withdrawer', '100.00')
+        sender, sender_account = make_user('sender', '100.00')
+        _, recipient_account = make_user('recipient')
+        merchant, hot_account = make_user('merchant', account_type='business')
+        customer, customer_account = make_user('customer', '100.00')
+        set_balance_shards(hot_account.id, settings.ACCOUNT_BALANCE_SHARDS)
+
+        # A user's first postings also create their rollup rows
+        self.assertWithinBudget(depositor, 'deposit', method='post',
+                                data={'account_id': deposit_account.id, 'amount': '1.00'})
+        self.assertWithinBudget(withdrawer, 'withdraw', method='post',
+                                data={'account_id': withdrawal_account.id, 'amount': '1.00'})
+        response = self.assertWithinBudget(sender, 'transfer', method='post', data={
+            'from_account_id': sender_account.id, 'to_account_number': recipient_account.account_number,
+            'amount': '1.00'})
+        self.assertWithinBudget(customer, 'transfer', method='post', data={
+            'from_account_id': customer_account.id, 'to_account_number': hot_account.account_number,
+            'amount': '1.00'})
+        self.assertWithinBudget(merchant, 'deposit', method='post',
+                                data={'account_id': hot_account.id, 'amount': '1.00'})
+        # More than the row holds, so the withdrawal folds the balance shards first
+        self.assertWithinBudget(merchant, 'withdraw', method='post',
+                                data={'account_id': hot_account.id, 'amount': '1.50'})
+
+        transaction_id = response.json()['transaction']['id']
+        self.assertWithinBudget(sender, 'transaction-list')
+        self.assertWithinBudget(sender, 'transaction-detail', args=[transaction_id])
+        self.assertWithinBudget(sender, 'transaction-summary')
+        self.assertWithinBudget(sender, 'lookup-recipient',
+                                data={'account_number': recipient_account.account_number})
+        self.assertWithinBudget(sender, 'bulk-lookup-recipient', method='post', data={
+            'account_numbers': [recipient_account.account_number, hot_account.account_number, '0000000000']})
+        self.assertWithinBudget(merchant, 'account-list')
+        self.assertWithinBudget(merchant, 'account-detail', args=[hot_account.id])
+        self.assertWithinBudget(merchant, 'account-balance', args=[hot_account.id])
+        self.assertWithinBudget(merchant, 'user-accounts')
+
+        self.assertEqual(self.checked, set(settings.REQUEST_BUDGETS))
+
+class CrossedTransferTests(TestCase):
+    """The invariants stress_transfers checks under concurrency, posted one at a time"""
+
+    def test_crossed_transfers_conserve_the_total_balance(self):
+        user, first = make_user('crossing', '100.00')
+        second = Account.objects.create(user=user, balance=Decimal('100.00'))
+        completed = 0
+        for source, target, amount in [(first, second, '30.00'), (second, first, '80.00'),
+                                       (first, second, '500.00'), (second, first, '50.00')]:
+            try:
+                post_transfer(user, Account(id=source.id), Account(id=target.id), Decimal(amount))
+            except InsufficientFunds:
+                continue
+            completed += 1
+
+        balances = Account.objects.filter(id__in=[first.id, second.id]).values_list('balance', flat=True)
+        self.assertEqual(sum(balances), Decimal('200.00'))
+        self.assertEqual(completed, 3)
+        self.assertEqual(Transaction.objects.filter(from_account__user=user).count(), completed)
+
+class QueryPlanTests(TestCase):
+    """Every filtered read check_query_plans covers has an index to use"""
+
+    def test_filtered_reads_have_an_index(self):
+        if connection.vendor != 'postgresql':
+            self.skipTest('Query plan checks require PostgreSQL')
+        command = QueryPlanCommand(stdout=StringIO())
+        command.options = {'verbose_plans': False}
+        user, admin, account, trans = command.seed(50, 10)
+        # Too few rows for the planner to prefer an index, so any Seq Scan left is one with no index to use
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+        for path, actor in command.endpoints(user, admin, account, trans):
+            with self.subTest(path):
+                self.assertEqual(command.check_endpoint(path, actor), [])
+
+    def test_only_filtered_scans_of_checked_tables_count(self):
+        plan = {'Node Type': 'Hash Join', 'Plans': [
+            {'Node Type': 'Seq Scan', 'Relation Name': 'accounts'},
+            {'Node Type': 'Seq Scan', 'Relation Name': 'users', 'Filter': 'is_active'},
+            {'Node Type': 'Seq Scan', 'Relation Name': 'transactions', 'Filter': 'user_id = 1'},
+        ]}
+        self.assertEqual(list(QueryPlanCommand().seq_scans(plan)), ['transactions'])
+
+class ReferenceTests(TestCase):
+    """Reference numbers are unique across processes and increase within one"""
+
+    def test_references_increase_when_the_clock_steps_back(self):
+        generator = references._Generator()
+        issued = []
+        with mock.patch.object(references.time, 'time_ns') as time_ns:
+            for millis in [2000, 2000, 1000, 1000, 3000]:
+                time_ns.return_value = millis * 1_000_000
+                issued.append(generator.next_id())
+        self.assertEqual(issued, sorted(set(issued)))
+
+    def test_forked_processes_issue_unique_references(self):
+        output = StringIO()
+        call_command('check_reference_uniqueness', processes=2, per_process=1000, stdout=output)
+        self.assertIn('2000 references from 2 processes are unique', output.getvalue())
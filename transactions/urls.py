@@ -4,10 +4,14 @@ from . import views
 urlpatterns = [
     path('', views.TransactionListView.as_view(), name='transaction-list'),
     path('<int:pk>/', views.TransactionDetailView.as_view(), name='transaction-detail'),
+    path('export/', views.TransactionExportView.as_view(), name='transaction-export'),
     path('deposit/', views.DepositView.as_view(), name='deposit'),
     path('withdraw/', views.WithdrawView.as_view(), name='withdraw'),
     path('transfer/', views.TransferView.as_view(), name='transfer'),
+    path('transfer/batch/', views.BatchTransferView.as_view(), name='batch-transfer'),
     path('external-transfer/', views.ExternalTransferView.as_view(), name='external-transfer'),
     path('summary/', views.TransactionSummaryView.as_view(), name='transaction-summary'),
     path('lookup/', views.LookupRecipientView.as_view(), name='lookup-recipient'),
+    path('lookup/bulk/', views.BulkLookupRecipientView.as_view(), name='bulk-lookup-recipient'),
+    path('lookup/stats/', views.RecipientLookupStatsView.as_view(), name='lookup-recipient-stats'),
 ]
\ No newline at end of file
@@ -1,154 +1,227 @@
 from rest_framework import generics, permissions, status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
-from django.db import transaction, models
+from django.conf import settings
+from django.db import models, router
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.filters import OrderingFilter, SearchFilter
-import uuid
-from decimal import Decimal
 
 from .models import Transaction
+from .export import EXPORT_FORMATS, stream_export
+from .lookup import lookup_recipient, lookup_recipients, stats as lookup_stats
+from .pagination import TransactionPagination
+from .rollups import get_user_summary
 from .serializers import (
     TransactionSerializer, 
     DepositSerializer, 
     WithdrawalSerializer, 
     TransferSerializer,
-    ExternalTransferSerializer
+    BatchTransferSerializer,
+    ExternalTransferSerializer,
+    BulkRecipientLookupSerializer
+)
+from .services import (
+    post_deposit,
+    post_withdrawal,
+    post_transfer,
+    post_external_transfer,
+    post_batch_transfer
 )
 from accounts.models import Account
+from accounts.services import BalanceUpdateError
+from accounts.sharding import shard_balance
+from banking_project.metrics import count_rejected
+from banking_project.structured_logging import log_request_dump
 from users.serializers import UserSerializer
 from rest_framework.views import APIView
+import logging
+
+logger = logging.getLogger(__name__)
+
+def with_accounts(queryset):
+    """Join both accounts, with their available balances, so sharded ones need no query per row"""
+    return queryset.select_related('from_account', 'to_account').annotate(
+        from_account_available=models.F('from_account__balance') + shard_balance('from_account_id'),
+        to_account_available=models.F('to_account__balance') + shard_balance('to_account_id'),
+    )
 
 class TransactionListView(generics.ListAPIView):
     serializer_class = TransactionSerializer
     permission_classes = [permissions.IsAuthenticated]
     filter_backends = [DjangoFilterBackend, OrderingFilter, SearchFilter]
-    filterset_fields = ['transaction_type', 'status']
+    filterset_fields = {
+        'transaction_type': ['exact'],
+        'status': ['exact'],
+        'created_at': ['gte', 'lte'],
+    }
+    # With ?pagination=cursor only the default newest-first ordering is accepted (see KeysetPagination)
     ordering_fields = ['created_at', 'amount']
     ordering = ['-created_at']
     search_fields = ['description', 'reference_number']
+    pagination_class = TransactionPagination
     
+    def get_received_account_ids(self):
+        if not hasattr(self, '_received_account_ids'):
+            self._received_account_ids = list(
+                Account.objects.filter(user=self.request.user).values_list('id', flat=True)
+            )
+        return self._received_account_ids
+
     def get_queryset(self):
         user = self.request.user
+        queryset = with_accounts(Transaction.objects.all())
         if user.is_admin:
-            return Transaction.objects.all()
+            return queryset
         # Show transactions where user is sender or recipient
-        return Transaction.objects.filter(
-            models.Q(user=user) | models.Q(to_account__user=user)
-        ).distinct()
+        return queryset.filter(
+            models.Q(user=user) | models.Q(to_account_id__in=self.get_received_account_ids())
+        )
+
+    def get_union_querysets(self, queryset):
+        # Sent and received sides as two seekable branches for keyset pagination
+        user = self.request.user
+        if user.is_admin:
+            return [queryset]
+        return [
+            queryset.filter(user=user),
+            queryset.filter(to_account_id__in=self.get_received_account_ids()).exclude(user=user),
+        ]
+
+class TransactionExportView(TransactionListView):
+    """Stream the filtered transaction history as CSV or NDJSON, optionally gzipped"""
+    pagination_class = None
+
+    def list(self, request, *args, **kwargs):
+        export_format = request.query_params.get('export_format', 'csv')
+        if export_format not in EXPORT_FORMATS:
+            return Response({'error': f"export_format must be one of: {', '.join(EXPORT_FORMATS)}"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        compress = request.query_params.get('gzip') in ('1', 'true')
+        content_type, extension = EXPORT_FORMATS[export_format]
+
+        # The body streams after the request's routing context has closed, so pick the database now
+        queryset = self.filter_queryset(self.get_queryset())
+        queryset = queryset.using(router.db_for_read(Transaction))
+        response = StreamingHttpResponse(
+            stream_export(queryset, export_format, settings.TRANSACTION_EXPORT_CHUNK_SIZE, compress),
+            content_type='application/gzip' if compress else content_type,
+        )
+        filename = f"transactions.{extension}{'.gz' if compress else ''}"
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
 
 class TransactionDetailView(generics.RetrieveAPIView):
     serializer_class = TransactionSerializer
     permission_classes = [permissions.IsAuthenticated]
     
     def get_queryset(self):
+        queryset = with_accounts(Transaction.objects.all())
         if self.request.user.is_admin:
-            return Transaction.objects.all()
-        return Transaction.objects.filter(user=self.request.user)
+            return queryset
+        return queryset.filter(user=self.request.user)
 
 class DepositView(APIView):
     permission_classes = [permissions.IsAuthenticated]
     def post(self, request):
+        log_request_dump(logger, request)
         serializer = DepositSerializer(data=request.data, context={'request': request})
         if serializer.is_valid():
-            account_id = serializer.validated_data['account_id']
+            account = serializer.validated_data['account']
             amount = serializer.validated_data['amount']
             description = serializer.validated_data.get('description', '')
-            with transaction.atomic():
-                account = Account.objects.select_for_update().get(id=account_id, user=request.user)
-                trans = Transaction.objects.create(
-                    user=request.user,
-                    to_account=account,
-                    transaction_type='deposit',
-                    amount=amount,
-                    description=description,
-                    reference_number=f"DEP{uuid.uuid4().hex[:8].upper()}",
-                    status='completed'
-                )
-                account.balance += amount
-                account.save()
-                return Response({
-                    'message': 'Deposit successful',
-                    'transaction': TransactionSerializer(trans).data,
-                    'new_balance': account.balance
-                }, status=status.HTTP_201_CREATED)
+            try:
+                trans = post_deposit(request.user, account, amount, description)
+            except BalanceUpdateError:
+                return Response({'error': 'Account is not active'}, status=status.HTTP_400_BAD_REQUEST)
+            return Response({
+                'message': 'Deposit successful',
+                'transaction': TransactionSerializer(trans).data,
+                'new_balance': account.available_balance
+            }, status=status.HTTP_201_CREATED)
+        count_rejected('deposit', serializer.errors)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 class WithdrawView(APIView):
     permission_classes = [permissions.IsAuthenticated]
     def post(self, request):
+        log_request_dump(logger, request)
         serializer = WithdrawalSerializer(data=request.data, context={'request': request})
         if serializer.is_valid():
             account = serializer.validated_data['account']
             amount = serializer.validated_data['amount']
             description = serializer.validated_data.get('description', '')
-            with transaction.atomic():
-                account = Account.objects.select_for_update().get(id=account.id)
-                if not account.can_debit(amount):
-                    return Response({'error': 'Insufficient balance or account not active'}, status=status.HTTP_400_BAD_REQUEST)
-                trans = Transaction.objects.create(
-                    user=request.user,
-                    from_account=account,
-                    transaction_type='withdrawal',
-                    amount=amount,
-                    description=description,
-                    reference_number=f"WTD{uuid.uuid4().hex[:8].upper()}",
-                    status='completed'
-                )
-                account.balance -= amount
-                account.save()
-                return Response({
-                    'message': 'Withdrawal successful',
-                    'transaction': TransactionSerializer(trans).data,
-                    'new_balance': account.balance
-                }, status=status.HTTP_201_CREATED)
+            try:
+                trans = post_withdrawal(request.user, account, amount, description)
+            except BalanceUpdateError:
+                return Response({'error': 'Insufficient balance or account not active'}, status=status.HTTP_400_BAD_REQUEST)
+            return Response({
+                'message': 'Withdrawal successful',
+                'transaction': TransactionSerializer(trans).data,
+                'new_balance': account.available_balance
+            }, status=status.HTTP_201_CREATED)
+        count_rejected('withdrawal', serializer.errors)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 class TransferView(APIView):
     permission_classes = [permissions.IsAuthenticated]
     def post(self, request):
-        print('TRANSFER REQUEST DATA:', request.data)  # Debug print for Postman testing
-        print('AUTH USER:', request.user)
-        print('AUTH TOKEN:', request.auth)
-        print('HEADERS:', dict(request.headers))
+        log_request_dump(logger, request)
         serializer = TransferSerializer(data=request.data, context={'request': request})
         if serializer.is_valid():
             from_account = serializer.validated_data['from_account']
             to_account = serializer.validated_data['to_account']
             amount = serializer.validated_data['amount']
             description = serializer.validated_data.get('description', '')
-            with transaction.atomic():
-                from_account = Account.objects.select_for_update().get(id=from_account.id)
-                to_account = Account.objects.select_for_update().get(id=to_account.id)
-                if not from_account.can_debit(amount):
-                    return Response({'error': 'Insufficient balance or account not active'}, status=status.HTTP_400_BAD_REQUEST)
-                if not to_account.can_credit(amount):
+            try:
+                trans = post_transfer(request.user, from_account, to_account, amount, description)
+            except BalanceUpdateError as exc:
+                if exc.account_id == to_account.id:
                     return Response({'error': 'Destination account cannot receive funds'}, status=status.HTTP_400_BAD_REQUEST)
-                trans = Transaction.objects.create(
-                    user=request.user,
-                    from_account=from_account,
-                    to_account=to_account,
-                    transaction_type='transfer',
-                    amount=amount,
-                    description=description,
-                    reference_number=f"TRF{uuid.uuid4().hex[:8].upper()}",
-                    status='completed'
-                )
-                from_account.balance -= amount
-                to_account.balance += amount
-                from_account.save()
-                to_account.save()
-                return Response({
-                    'message': 'Transfer successful',
-                    'transaction': TransactionSerializer(trans).data,
-                    'new_balance': from_account.balance
-                }, status=status.HTTP_201_CREATED)
+                return Response({'error': 'Insufficient balance or account not active'}, status=status.HTTP_400_BAD_REQUEST)
+            return Response({
+                'message': 'Transfer successful',
+                'transaction': TransactionSerializer(trans).data,
+                'new_balance': from_account.available_balance
+            }, status=status.HTTP_201_CREATED)
+        count_rejected('transfer', serializer.errors)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+class BatchTransferView(APIView):
+    """
+    Post several transfers at once. Every leg gets a result: 'completed', 'failed'
+    with its error, or in atomic mode 'rolled_back' for a valid leg that was not
+    posted because another leg of the batch failed.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    def post(self, request):
+        log_request_dump(logger, request)
+        serializer = BatchTransferSerializer(data=request.data)
+        if serializer.is_valid():
+            mode = serializer.validated_data['mode']
+            legs = serializer.validated_data['transfers']
+            results, balances = post_batch_transfer(request.user, legs, mode=mode)
+            posted = sum(1 for result in results if result['status'] == 'completed')
+            response = {
+                'mode': mode,
+                'posted': posted,
+                'failed': sum(1 for result in results if result['status'] == 'failed'),
+                'results': results,
+                'new_balances': balances,
+            }
+            if not posted:
+                response['error'] = 'No transfers were posted'
+                return Response(response, status=status.HTTP_400_BAD_REQUEST)
+            response['message'] = 'Batch transfer processed'
+            return Response(response, status=status.HTTP_201_CREATED)
+        count_rejected('transfer', serializer.errors)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 class ExternalTransferView(APIView):
     permission_classes = [permissions.IsAuthenticated]
     def post(self, request):
+        log_request_dump(logger, request)
         serializer = ExternalTransferSerializer(data=request.data, context={'request': request})
         if serializer.is_valid():
             from_account = serializer.validated_data['from_account']
@@ -159,54 +232,58 @@ class ExternalTransferView(APIView):
             routing_number = serializer.validated_data['routing_number']
             beneficiary_address = serializer.validated_data['beneficiary_address']
             description = serializer.validated_data.get('description', '')
-            # Deduct funds immediately for pending external transfer
-            from_account.balance -= amount
-            from_account.save()
-            trans = Transaction.objects.create(
-                user=request.user,
-                from_account=from_account,
-                transaction_type='external',
-                amount=amount,
-                description=description,
-                reference_number=f"EXT{uuid.uuid4().hex[:8].upper()}",
-                status='pending',
-                bank_name=bank_name,
-                beneficiary_name=beneficiary_name,
-                routing_number=routing_number,
-                beneficiary_address=beneficiary_address
-            )
+            try:
+                trans = post_external_transfer(
+                    request.user,
+                    from_account,
+                    amount,
+                    description,
+                    bank_name=bank_name,
+                    beneficiary_name=beneficiary_name,
+                    routing_number=routing_number,
+                    beneficiary_address=beneficiary_address,
+                    beneficiary_account_number=to_account_number
+                )
+            except BalanceUpdateError:
+                return Response({'error': 'Insufficient balance or account not active'}, status=status.HTTP_400_BAD_REQUEST)
             return Response({
                 'message': 'External transfer initiated and pending admin approval.',
                 'transaction': TransactionSerializer(trans).data
             }, status=status.HTTP_201_CREATED)
+        count_rejected('external_transfer', serializer.errors)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 class TransactionSummaryView(APIView):
     permission_classes = [permissions.IsAuthenticated]
     def get(self, request):
-        user_transactions = Transaction.objects.filter(user=request.user, status='completed')
-        summary = {
-            'total_deposits': user_transactions.filter(transaction_type='deposit').aggregate(
-                total=models.Sum('amount'))['total'] or Decimal('0.00'),
-            'total_withdrawals': user_transactions.filter(transaction_type='withdrawal').aggregate(
-                total=models.Sum('amount'))['total'] or Decimal('0.00'),
-            'total_transfers_sent': user_transactions.filter(transaction_type='transfer').aggregate(
-                total=models.Sum('amount'))['total'] or Decimal('0.00'),
-            'transaction_count': user_transactions.count(),
-        }
-        return Response(summary)
+        return Response(get_user_summary(request.user))
 
 class LookupRecipientView(APIView):
     permission_classes = [permissions.IsAuthenticated]
     def get(self, request):
         account_number = request.GET.get('account_number')
-        try:
-            account = Account.objects.get(account_number=account_number)
-            user = account.user
-            return Response({
-                'name': f"{user.first_name} {user.last_name}",
-                'email': user.email,
-                'account_number': account.account_number,
-            })
-        except Account.DoesNotExist:
-            return Response({'error': 'Account not found'}, status=status.HTTP_404_NOT_FOUND)
\ No newline at end of file
+        recipient = lookup_recipient(account_number) if account_number else None
+        if recipient is None:
+            return Response({'error': 'Account not found'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(recipient)
+
+class BulkLookupRecipientView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        serializer = BulkRecipientLookupSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        results = lookup_recipients(serializer.validated_data['account_numbers'])
+        return Response({
+            'recipients': [recipient for recipient in results.values() if recipient is not None],
+            'not_found': [number for number, recipient in results.items() if recipient is None],
+        })
+
+class RecipientLookupStatsView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        if not request.user.is_admin:
+            return Response({'error': 'Admin access required'}, status=status.HTTP_403_FORBIDDEN)
+        return Response(lookup_stats())
@@ -0,0 +1,77 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+import time
+
+from .models import User
+
+# Every column except the password hash, which stays deferred and is only loaded
+# if something (e.g. a password change) reads it
+CACHED_FIELDS = [field.attname for field in User._meta.concrete_fields if field.attname != 'password']
+
+def _cache():
+    return caches[settings.AUTH_USER_CACHE_ALIAS]
+
+def _version_key(user_id):
+    return f'auth-user:version:{user_id}'
+
+def _key(cache, user_id):
+    # Invalidation deletes the version, so state read before a change and cached after
+    # it lands under a key nobody asks for again
+    version = cache.get(_version_key(user_id))
+    if version is None:
+        initial = time.time_ns()
+        cache.add(_version_key(user_id), initial)
+        version = cache.get(_version_key(user_id), initial)
+    return f'auth-user:{user_id}:{version}'
+
+def invalidate_on_commit(user_id):
+    transaction.on_commit(lambda: _cache().delete(_version_key(user_id)))
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that rebuilds request.user from a short-lived cache
+    instead of querying the users table on every request. Entries are dropped
+    whenever the user is saved or deleted (see users.signals).
+    """
+
+    def _load(self, user_id):
+        fields = CACHED_FIELDS + (['password'] if getattr(api_settings, 'CHECK_REVOKE_TOKEN', False) else [])
+        # From the primary, so a role or password change is never re-cached from a lagging replica
+        users = User.objects.using(DEFAULT_DB_ALIAS)
+        state = users.filter(**{api_settings.USER_ID_FIELD: user_id}).values(*fields).first()
+        if state is not None and 'password' in state:
+            # Only a digest of the hash is needed to check revoked tokens
+            state['_revoke_hash'] = get_md5_hash_password(state.pop('password'))
+        return state
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        cache = _cache()
+        key = _key(cache, user_id)
+        state = cache.get(key)
+        if state is None:
+            state = self._load(user_id)
+            if state is None:
+                raise AuthenticationFailed(_("User not found"), code="user_not_found")
+            cache.set(key, state)
+
+        fields = {name: value for name, value in state.items() if name != '_revoke_hash'}
+        user = User.from_db(DEFAULT_DB_ALIAS, list(fields), list(fields.values()))
+        if not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        if getattr(api_settings, 'CHECK_REVOKE_TOKEN', False):
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != state.get('_revoke_hash'):
+                raise AuthenticationFailed(
+                    _("The user's password has been changed."), code="password_changed"
+                )
+        return user
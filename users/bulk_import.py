@@ -0,0 +1,238 @@
+from django.contrib.auth.hashers import identify_hasher, make_password
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import connection, transaction
+from decimal import Decimal, InvalidOperation
+import csv
+import json
+import os
+
+from .models import User
+from accounts.models import Account
+from accounts.numbering import assign_account_numbers
+from transactions.models import Transaction
+from transactions.references import new_reference
+from transactions.rollups import create_rollups
+
+ACCOUNT_TYPES = {choice for choice, _ in Account.ACCOUNT_TYPES}
+MAX_OPENING_BALANCE = Decimal('9999999999999.99')
+
+class ImportRecordError(Exception):
+    pass
+
+class UnreadableRecord(dict):
+    """An NDJSON line that is not a JSON object, kept as {'line': ...} for the rejects file"""
+
+    def __init__(self, line, error):
+        super().__init__(line=line)
+        self.error = error
+
+def read_records(path):
+    """Yield the records of a CSV file with a header row, or of an NDJSON file"""
+    with open(path, encoding='utf-8', newline='') as source:
+        if path.endswith(('.ndjson', '.jsonl')):
+            for line in source:
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError as error:
+                    yield UnreadableRecord(line.strip(), f'line is not valid JSON: {error.msg}')
+                    continue
+                if not isinstance(record, dict):
+                    yield UnreadableRecord(line.strip(), 'line is not a JSON object')
+                    continue
+                yield record
+        else:
+            yield from csv.DictReader(source)
+
+def _text(record, field, max_length):
+    value = record.get(field)
+    value = '' if value is None else str(value).strip()
+    if len(value) > max_length:
+        raise ImportRecordError(f'{field} is longer than {max_length} characters')
+    return value
+
+def parse_record(record):
+    """Validate one input record and return the values the import needs"""
+    if isinstance(record, UnreadableRecord):
+        raise ImportRecordError(record.error)
+    email = User.objects.normalize_email(_text(record, 'email', 254))
+    try:
+        validate_email(email)
+    except ValidationError:
+        raise ImportRecordError('email is not valid')
+    account_type = _text(record, 'account_type', 20) or 'savings'
+    if account_type not in ACCOUNT_TYPES:
+        raise ImportRecordError(f'account_type must be one of {", ".join(sorted(ACCOUNT_TYPES))}')
+    try:
+        opening_balance = Decimal(str(record.get('opening_balance') or '0').strip())
+    except InvalidOperation:
+        raise ImportRecordError('opening_balance is not a number')
+    # NaN and Infinity parse, but NaN cannot even be compared
+    if not opening_balance.is_finite():
+        raise ImportRecordError('opening_balance is not a number')
+    if not Decimal('0') <= opening_balance <= MAX_OPENING_BALANCE or opening_balance.as_tuple().exponent < -2:
+        raise ImportRecordError('opening_balance must be a non-negative amount with at most 2 decimal places')
+    password_hash = _text(record, 'password_hash', 128)
+    if password_hash:
+        try:
+            identify_hasher(password_hash)
+        except ValueError:
+            raise ImportRecordError('password_hash is not in a format any configured hasher recognises')
+    username = _text(record, 'username', 150) or email
+    if len(username) > 150:
+        raise ImportRecordError('username is longer than 150 characters; give one explicitly')
+    return {
+        'email': email,
+        'username': username,
+        'first_name': _text(record, 'first_name', 150),
+        'last_name': _text(record, 'last_name', 150),
+        'phone_number': _text(record, 'phone_number', 15),
+        'password': str(record['password']) if record.get('password') else None,
+        'password_hash': password_hash,
+        'account_type': account_type,
+        'opening_balance': opening_balance.quantize(Decimal('0.01')),
+    }
+
+def hash_passwords(passwords):
+    """Hash a slice of passwords; runs in a worker process, None gives an unusable password"""
+    return [make_password(password) for password in passwords]
+
+class Checkpoint:
+    """Number of input records already imported or rejected, kept in a small JSON file"""
+
+    def __init__(self, path):
+        self.path = path
+        self.records = 0
+        if os.path.exists(path):
+            with open(path) as checkpoint:
+                self.records = json.load(checkpoint)['records']
+
+    def save(self, records):
+        self.records = records
+        with open(self.path + '.tmp', 'w') as checkpoint:
+            json.dump({'records': records}, checkpoint)
+            checkpoint.flush()
+            os.fsync(checkpoint.fileno())
+        os.replace(self.path + '.tmp', self.path)
+
+class Chunk:
+    """Parsed records of one chunk, with their passwords being hashed in the pool"""
+
+    def __init__(self, end, rows, hashes):
+        self.end = end
+        self.rows = rows
+        self.hashes = hashes
+
+def prepare_chunk(numbered_records, end, seen, pool, slices, reject):
+    """Parse and de-duplicate a chunk of (number, record) pairs and start hashing its passwords"""
+    parsed = []
+    for number, record in numbered_records:
+        try:
+            row = parse_record(record)
+        except ImportRecordError as error:
+            reject(number, record, str(error))
+            continue
+        if row['email'].lower() in seen['emails'] or row['username'] in seen['usernames']:
+            reject(number, record, 'duplicate email or username in the input')
+            continue
+        seen['emails'].add(row['email'].lower())
+        seen['usernames'].add(row['username'])
+        parsed.append((number, record, row))
+
+    # Also users imported by an earlier run that crashed before saving its checkpoint
+    existing_emails = set(
+        email.lower() for email in User.objects.filter(email__in=[row['email'] for _, _, row in parsed])
+        .values_list('email', flat=True))
+    existing_usernames = set(
+        User.objects.filter(username__in=[row['username'] for _, _, row in parsed])
+        .values_list('username', flat=True))
+    rows = []
+    for number, record, row in parsed:
+        if row['email'].lower() in existing_emails or row['username'] in existing_usernames:
+            reject(number, record, 'email or username already exists')
+        else:
+            rows.append(row)
+
+    to_hash = [row['password'] for row in rows if not row['password_hash']]
+    step = max(1, -(-len(to_hash) // slices))
+    hashes = [pool.submit(hash_passwords, to_hash[i:i + step]) for i in range(0, len(to_hash), step)]
+    return Chunk(end, rows, hashes)
+
+def _ids(model, objects, field):
+    if connection.features.can_return_rows_from_bulk_insert:
+        return
+    ids = dict(model.objects.filter(**{f'{field}__in': [getattr(obj, field) for obj in objects]})
+               .values_list(field, 'id'))
+    for obj in objects:
+        obj.id = ids[getattr(obj, field)]
+
+def insert_chunk(chunk):
+    """Create the chunk's users, accounts, opening deposits and rollups in one transaction"""
+    hashes = iter([password for future in chunk.hashes for password in future.result()])
+    users = [
+        User(username=row['username'], email=row['email'], first_name=row['first_name'],
+             last_name=row['last_name'], phone_number=row['phone_number'],
+             password=row['password_hash'] or next(hashes))
+        for row in chunk.rows
+    ]
+    with transaction.atomic():
+        User.objects.bulk_create(users)
+        _ids(User, users, 'email')
+        accounts = assign_account_numbers([
+            Account(user_id=user.id, account_type=row['account_type'], balance=row['opening_balance'])
+            for user, row in zip(users, chunk.rows)
+        ])
+        Account.objects.bulk_create(accounts)
+        _ids(Account, accounts, 'account_number')
+        deposits = Transaction.objects.bulk_create([
+            Transaction(user_id=account.user_id, to_account_id=account.id, transaction_type='deposit',
+                        amount=account.balance, description='Opening balance',
+                        reference_number=new_reference('deposit'), status='completed')
+            for account in accounts if account.balance > 0
+        ])
+        create_rollups(deposits)
+    return len(users)
+
+def numbered(records, start):
+    for number, record in enumerate(records):
+        if number >= start:
+            yield number, record
+
+def chunked(numbered_records, size):
+    chunk = []
+    for item in numbered_records:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def import_users(path, checkpoint, pool, workers, chunk_size, reject, progress=None):
+    """
+    Import the records of path after the checkpoint, chunk by chunk.
+
+    Passwords of the next chunk are hashed in the pool while the current one
+    is inserted. The checkpoint advances after each chunk commits; records of
+    users that already exist are rejected, including those of a chunk that
+    committed just before a crash. Returns the number of users created.
+    """
+    seen = {'emails': set(), 'usernames': set()}
+    created = 0
+    pending = None
+    for records in chunked(numbered(read_records(path), checkpoint.records), chunk_size):
+        chunk = prepare_chunk(records, records[-1][0] + 1, seen, pool, workers, reject)
+        if pending is not None:
+            created += insert_chunk(pending)
+            checkpoint.save(pending.end)
+            if progress:
+                progress(pending.end, created)
+        pending = chunk
+    if pending is not None:
+        created += insert_chunk(pending)
+        checkpoint.save(pending.end)
+        if progress:
+            progress(pending.end, created)
+    return created
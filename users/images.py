@@ -0,0 +1,124 @@
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image, ImageOps
+import hashlib
+import io
+import logging
+import os
+import re
+import threading
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_DIR = 'profile_pics'
+
+# Formats accepted for upload and the extension their originals are stored under
+EXTENSIONS = {'JPEG': 'jpg', 'PNG': 'png', 'GIF': 'gif', 'WEBP': 'webp'}
+
+# Names written by this module: profile_pics/ab/<sha256>.<ext> and <sha256>-<variant>.webp
+CONTENT_ADDRESSED = re.compile(r'^[0-9a-f]{2}/[0-9a-f]{64}(-[a-z]+)?\.[a-z]+$')
+
+_lock = threading.Lock()
+_executor = None
+# Variants are immutable once written, so a name seen on disk is never checked again
+_rendered = set()
+
+def _reset():
+    global _executor, _lock
+    _lock = threading.Lock()
+    _executor = None
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset)
+
+def _pool():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.PROFILE_IMAGE_WORKERS, thread_name_prefix='profile-images')
+        return _executor
+
+def _digest(name):
+    return os.path.splitext(os.path.basename(name))[0]
+
+def variant_name(name, variant):
+    return f"{os.path.dirname(name)}/{_digest(name)}-{variant}.webp"
+
+def _save_once(name, content):
+    if default_storage.exists(name):
+        return
+    saved = default_storage.save(name, content)
+    if saved != name:
+        # Another worker stored the same content first; its copy is identical
+        default_storage.delete(saved)
+
+def store_original(upload, image_format):
+    """Save an uploaded image under its content hash, once per distinct content, and return the name"""
+    sha256 = hashlib.sha256()
+    for chunk in upload.chunks():
+        sha256.update(chunk)
+    digest = sha256.hexdigest()
+    name = f"{UPLOAD_DIR}/{digest[:2]}/{digest}.{EXTENSIONS[image_format]}"
+    if not default_storage.exists(name):
+        upload.seek(0)
+        _save_once(name, upload)
+    return name
+
+def _encode(image):
+    output = io.BytesIO()
+    image.save(output, 'WEBP', quality=settings.PROFILE_IMAGE_WEBP_QUALITY, method=4)
+    return output.getvalue()
+
+def render_variants(name):
+    """Write the missing resized WebP variants of a stored original"""
+    missing = [
+        (variant, size) for variant, size in settings.PROFILE_IMAGE_VARIANTS.items()
+        if not default_storage.exists(variant_name(name, variant))
+    ]
+    if not missing:
+        return
+    with default_storage.open(name) as original:
+        image = Image.open(original)
+        largest = max(size for _, size in missing)
+        # JPEGs decode straight at a reduced scale, far cheaper than decoding full size
+        image.draft('RGB', (largest, largest))
+        image = ImageOps.exif_transpose(image)
+        image = image.convert('RGBA' if 'A' in image.getbands() or 'transparency' in image.info else 'RGB')
+    # Largest first, each variant downscaled from the previous one
+    for variant, size in sorted(missing, key=lambda item: -item[1]):
+        image.thumbnail((size, size), Image.LANCZOS)
+        target = variant_name(name, variant)
+        _save_once(target, ContentFile(_encode(image)))
+        _rendered.add(target)
+
+def _render_logged(name):
+    try:
+        render_variants(name)
+    except Exception:
+        logger.exception('Rendering variants of %s failed', name)
+
+def schedule_variants(name):
+    """Render the variants on the worker pool once the current transaction commits"""
+    transaction.on_commit(lambda: _pool().submit(_render_logged, name))
+
+def is_content_addressed(name):
+    return bool(name) and name.startswith(UPLOAD_DIR + '/') and bool(
+        CONTENT_ADDRESSED.match(name[len(UPLOAD_DIR) + 1:]))
+
+def variant_urls(name):
+    """URL of each variant, falling back to the original until the variant has been rendered"""
+    if not name:
+        return None
+    if not is_content_addressed(name):
+        return {variant: default_storage.url(name) for variant in settings.PROFILE_IMAGE_VARIANTS}
+    urls = {}
+    for variant in settings.PROFILE_IMAGE_VARIANTS:
+        target = variant_name(name, variant)
+        if target not in _rendered and default_storage.exists(target):
+            _rendered.add(target)
+        urls[variant] = default_storage.url(target if target in _rendered else name)
+    return urls
@@ -0,0 +1,63 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.tokens import RefreshToken
+import time
+import uuid
+
+from accounts.models import Account
+from accounts.views import user_accounts
+from users.authentication import CachedJWTAuthentication
+from users.models import User
+
+class Command(BaseCommand):
+    help = ('Benchmark /api/accounts/my-accounts/ with the stock JWTAuthentication and with '
+            'CachedJWTAuthentication, then check that deactivating the user takes effect at once')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        suffix = uuid.uuid4().hex[:8]
+        user = User.objects.create_user(
+            username=f'jwt-{suffix}', email=f'jwt-{suffix}@example.com',
+            password=None, first_name='Jwt', last_name='Bench')
+        Account.objects.create(user=user)
+        token = str(RefreshToken.for_user(user).access_token)
+        view_class = user_accounts.cls
+        original = view_class.authentication_classes
+        try:
+            for name, authentication in [('JWTAuthentication', JWTAuthentication),
+                                         ('CachedJWTAuthentication', CachedJWTAuthentication)]:
+                view_class.authentication_classes = [authentication]
+                self.run_case(name, token, options['requests'])
+
+            user.is_active = False
+            user.save()
+            if self.call(token).status_code != 401:
+                raise CommandError('A deactivated user was still authenticated from the cache')
+            self.stdout.write(self.style.SUCCESS('Deactivation invalidated the cached user'))
+        finally:
+            view_class.authentication_classes = original
+            user.delete()
+
+    def call(self, token):
+        request = APIRequestFactory().get('/api/accounts/my-accounts/', HTTP_AUTHORIZATION=f'Bearer {token}')
+        response = user_accounts(request)
+        response.render()
+        return response
+
+    def run_case(self, name, token, requests):
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            for _ in range(requests):
+                if self.call(token).status_code != 200:
+                    raise CommandError(f'{name}: request failed')
+            elapsed = time.perf_counter() - started
+        user_queries = sum(1 for query in queries if 'FROM "users"' in query['sql'] or 'FROM `users`' in query['sql'])
+        self.stdout.write(
+            f'{name:<24} {requests / elapsed:>8.0f} requests/s  '
+            f'{len(queries) / requests:>5.2f} queries/request  {user_queries / requests:>5.2f} user queries/request'
+        )
@@ -0,0 +1,100 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+from datetime import timedelta
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer as StockTokenRefreshSerializer
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+import statistics
+import time
+import uuid
+
+from users.models import User
+from users.serializers import TokenRefreshSerializer
+from users.tokens import RefreshToken, blacklist_filter
+
+class Rollback(Exception):
+    pass
+
+class Command(BaseCommand):
+    help = ('Seed the token tables to --rows outstanding tokens and benchmark token refresh with the '
+            'stock blacklist lookup and with the filtered one. Everything is rolled back afterwards.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10_000_000)
+        parser.add_argument('--blacklisted-every', type=int, default=2, help='Blacklist every Nth seeded token')
+        parser.add_argument('--refreshes', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.seed(options['rows'], options['blacklisted_every'])
+                suffix = uuid.uuid4().hex[:8]
+                user = User.objects.create_user(
+                    username=f'tok-{suffix}', email=f'tok-{suffix}@example.com',
+                    password=None, first_name='Token', last_name='Bench')
+
+                started = time.perf_counter()
+                blacklist_filter.reset()
+                # In this thread: a background build could not see the uncommitted seed rows
+                blacklist_filter.rebuild()
+                self.stdout.write(f'Filter built in {time.perf_counter() - started:.1f}s '
+                                  f'({blacklist_filter.bloom.size // 8 // 1024} KiB)')
+
+                for name, serializer_class in [('stock lookup', StockTokenRefreshSerializer),
+                                               ('bloom filter', TokenRefreshSerializer)]:
+                    self.run_case(name, serializer_class, user, options['refreshes'])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def seed(self, rows, blacklisted_every):
+        self.stdout.write(f'Seeding {rows} outstanding tokens...')
+        started = time.perf_counter()
+        expires = timezone.now() + timedelta(days=7)
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "INSERT INTO token_blacklist_outstandingtoken (jti, token, created_at, expires_at) "
+                    "SELECT 'seed-' || g, 'seed', now(), %s FROM generate_series(1, %s) g",
+                    [expires, rows])
+                cursor.execute(
+                    "INSERT INTO token_blacklist_blacklistedtoken (token_id, blacklisted_at) "
+                    "SELECT id, now() FROM token_blacklist_outstandingtoken "
+                    "WHERE jti LIKE 'seed-%%' AND id %% %s = 0", [blacklisted_every])
+                cursor.execute('ANALYZE token_blacklist_outstandingtoken')
+                cursor.execute('ANALYZE token_blacklist_blacklistedtoken')
+        else:
+            for offset in range(0, rows, 10000):
+                tokens = OutstandingToken.objects.bulk_create([
+                    OutstandingToken(jti=f'seed-{n}', token='seed', expires_at=expires)
+                    for n in range(offset, min(offset + 10000, rows))
+                ])
+                if not tokens[0].pk:
+                    tokens = OutstandingToken.objects.filter(jti__startswith='seed-', id__gt=0).order_by('-id')[:len(tokens)]
+                BlacklistedToken.objects.bulk_create([
+                    BlacklistedToken(token=token) for n, token in enumerate(tokens) if n % blacklisted_every == 0
+                ])
+        self.stdout.write(f'Seeded in {time.perf_counter() - started:.1f}s')
+
+    def run_case(self, name, serializer_class, user, refreshes):
+        tokens = [str(RefreshToken.for_user(user)) for _ in range(refreshes)]
+        timings = []
+        queries = 0
+
+        def count(execute, sql, params, many, context):
+            nonlocal queries
+            queries += 1
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(count):
+            for token in tokens:
+                started = time.perf_counter()
+                serializer = serializer_class(data={'refresh': token})
+                serializer.is_valid(raise_exception=True)
+                timings.append(time.perf_counter() - started)
+        timings.sort()
+        self.stdout.write(
+            f'{name:<14} p50 {statistics.median(timings) * 1000:>6.2f} ms  '
+            f'p95 {timings[int(len(timings) * 0.95)] * 1000:>6.2f} ms  '
+            f'{queries / refreshes:>4.1f} queries/refresh'
+        )
@@ -0,0 +1,50 @@
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+import csv
+import os
+import tempfile
+import time
+import uuid
+
+from users.models import User
+
+class Command(BaseCommand):
+    help = ('Write a synthetic partner file and import it with import_users, reporting users per minute. '
+            'Records carry pre-hashed passwords except for --plaintext of them, which are hashed at the '
+            'configured PBKDF2 cost in the worker pool.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100000)
+        parser.add_argument('--plaintext', type=int, default=0, help='Records with a plaintext password')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+        parser.add_argument('--workers', type=int, default=os.cpu_count())
+        parser.add_argument('--target', type=float, default=100000, help='Minimum users per minute')
+
+    def handle(self, *args, **options):
+        prefix = f'imp-{uuid.uuid4().hex[:8]}'
+        # One partner-supplied hash reused for every record; hashing it is not what is being measured
+        password_hash = make_password('partner-password')
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'users.csv')
+            with open(path, 'w', newline='') as output:
+                writer = csv.writer(output)
+                writer.writerow(['email', 'first_name', 'last_name', 'password', 'password_hash',
+                                 'account_type', 'opening_balance'])
+                for i in range(options['users']):
+                    plaintext = i < options['plaintext']
+                    writer.writerow([f'{prefix}-{i}@example.com', 'Imported', f'User {i}',
+                                     'correct-horse-battery' if plaintext else '',
+                                     '' if plaintext else password_hash,
+                                     'checking' if i % 3 else 'savings', f'{i % 1000}.50'])
+            try:
+                started = time.perf_counter()
+                call_command('import_users', path, chunk_size=options['chunk_size'],
+                             workers=options['workers'], stdout=self.stdout)
+                elapsed = time.perf_counter() - started
+            finally:
+                User.objects.filter(email__startswith=f'{prefix}-').delete()
+        rate = options['users'] / elapsed * 60
+        self.stdout.write(f"{options['users']} users ({options['plaintext']} hashed here) in {elapsed:.1f}s: {rate:.0f} users/min")
+        if rate < options['target']:
+            raise CommandError(f"Below the target of {options['target']:.0f} users/min")
@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand
+from django.db import connections
+from concurrent.futures import ProcessPoolExecutor
+import json
+import multiprocessing
+import os
+import time
+
+from users.bulk_import import Checkpoint, import_users
+
+class Command(BaseCommand):
+    help = ('Import users with one account each and an optional opening balance from a CSV (with a '
+            'header row) or NDJSON file. Columns: email, username, first_name, last_name, '
+            'phone_number, password or password_hash, account_type, opening_balance. Rerunning '
+            'resumes after the last committed chunk.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+        parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Password hashing processes')
+        parser.add_argument('--checkpoint', help='Progress file (default: <path>.checkpoint)')
+        parser.add_argument('--rejects', help='Where rejected records are written (default: <path>.rejects.ndjson)')
+        parser.add_argument('--restart', action='store_true', help='Ignore the checkpoint and start from the top')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        checkpoint = Checkpoint(options['checkpoint'] or path + '.checkpoint')
+        if options['restart']:
+            checkpoint.records = 0
+        elif checkpoint.records:
+            self.stdout.write(f'Resuming after record {checkpoint.records}')
+
+        rejected = 0
+        started = time.perf_counter()
+        with open(options['rejects'] or path + '.rejects.ndjson', 'a') as rejects:
+            def reject(number, record, error):
+                nonlocal rejected
+                rejected += 1
+                record = {key: value for key, value in record.items() if key != 'password'}
+                rejects.write(json.dumps({'record': number, 'error': error, 'data': record}, default=str) + '\n')
+
+            def progress(records, created):
+                elapsed = time.perf_counter() - started
+                self.stdout.write(f'{records} records read, {created} users created, {created / elapsed * 60:.0f} users/min')
+
+            # Workers are forked before this process opens any connection they could inherit
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=options['workers'],
+                                     mp_context=multiprocessing.get_context('fork')) as pool:
+                created = import_users(path, checkpoint, pool, options['workers'], options['chunk_size'],
+                                       reject, progress)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Created {created} users in {elapsed:.1f}s ({created / elapsed * 60:.0f}/min), rejected {rejected}'))
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+import time
+
+class Command(BaseCommand):
+    help = ('Delete expired outstanding tokens and their blacklist entries in short, separately '
+            'committed chunks so the token tables are never locked for long')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=5000)
+        parser.add_argument('--sleep', type=float, default=0.0, help='Seconds to pause between chunks')
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        last_id = 0
+        outstanding = blacklisted = 0
+        while True:
+            # Walking the primary key keeps every chunk an index range scan; expires_at is not indexed
+            ids = list(
+                OutstandingToken.objects.filter(id__gt=last_id, expires_at__lt=now)
+                .order_by('id').values_list('id', flat=True)[:options['chunk_size']]
+            )
+            if not ids:
+                break
+            last_id = ids[-1]
+            with transaction.atomic():
+                blacklisted += BlacklistedToken.objects.filter(token_id__in=ids).delete()[0]
+                outstanding += OutstandingToken.objects.filter(id__in=ids).delete()[0]
+            if options['sleep']:
+                time.sleep(options['sleep'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Deleted {outstanding} expired outstanding tokens and {blacklisted} blacklist entries'
+        ))
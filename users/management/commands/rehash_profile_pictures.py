@@ -0,0 +1,56 @@
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+
+from users import images
+from users.models import User
+
+class Command(BaseCommand):
+    help = ('Move profile pictures stored under their upload names to content-addressed names, so '
+            'identical uploads share one file, and render any missing WebP variants')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4, help='Threads rendering variants')
+        parser.add_argument('--delete-legacy', action='store_true',
+                            help='Delete the old files once no user refers to them')
+
+    def handle(self, *args, **options):
+        legacy = set()
+        moved = 0
+        for user in User.objects.exclude(profile_picture='').exclude(profile_picture=None).only('id', 'profile_picture'):
+            name = user.profile_picture.name
+            if images.is_content_addressed(name):
+                continue
+            if not default_storage.exists(name):
+                self.stderr.write(f'User {user.id}: {name} is missing')
+                continue
+            with default_storage.open(name) as upload:
+                image_format = Image.open(upload).format
+                if image_format not in images.EXTENSIONS:
+                    self.stderr.write(f'User {user.id}: {name} is a {image_format} image')
+                    continue
+                upload.seek(0)
+                user.profile_picture = images.store_original(upload, image_format)
+            # save() rather than update() so the cached auth state is invalidated
+            user.save(update_fields=['profile_picture'])
+            legacy.add(name)
+            moved += 1
+
+        originals = set(
+            User.objects.filter(profile_picture__startswith=images.UPLOAD_DIR + '/')
+            .values_list('profile_picture', flat=True)
+        )
+        originals = sorted(name for name in originals if images.is_content_addressed(name))
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            list(pool.map(images.render_variants, originals))
+
+        deleted = 0
+        if options['delete_legacy']:
+            still_used = set(User.objects.filter(profile_picture__in=legacy).values_list('profile_picture', flat=True))
+            for name in legacy - still_used:
+                default_storage.delete(name)
+                deleted += 1
+        self.stdout.write(
+            f'Moved {moved} pictures to {len(originals)} content-addressed files, '
+            f'deleted {deleted} legacy files')
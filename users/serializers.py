@@ -1,17 +1,54 @@
 from rest_framework import serializers
 from django.contrib.auth import authenticate
 from django.contrib.auth.password_validation import validate_password
+from rest_framework_simplejwt import serializers as jwt_serializers
+from . import images
 from .models import User
+from .tokens import RefreshToken
 
 class UserSerializer(serializers.ModelSerializer):
     profile_picture = serializers.ImageField(required=False, allow_null=True)
+    profile_picture_variants = serializers.SerializerMethodField()
 
     class Meta:
         model = User
         fields = ['id', 'username', 'email', 'first_name', 'last_name', 
-                 'phone_number', 'role', 'is_verified', 'created_at', 'profile_picture']
+                 'phone_number', 'role', 'is_verified', 'created_at', 'profile_picture',
+                 'profile_picture_variants']
         read_only_fields = ['id', 'created_at', 'role', 'is_verified']
 
+    def validate_profile_picture(self, value):
+        if value is not None and value.image.format not in images.EXTENSIONS:
+            raise serializers.ValidationError(
+                f"Upload a {', '.join(images.EXTENSIONS)} image")
+        return value
+
+    def update(self, instance, validated_data):
+        upload = validated_data.pop('profile_picture', False)
+        fields = list(validated_data)
+        if upload is None:
+            instance.profile_picture = None
+            fields.append('profile_picture')
+        elif upload:
+            # Stored under its content hash; assigning the name skips the field's own upload
+            instance.profile_picture = images.store_original(upload, upload.image.format)
+            images.schedule_variants(instance.profile_picture.name)
+            fields.append('profile_picture')
+        for name, value in validated_data.items():
+            setattr(instance, name, value)
+        # Only what was submitted: instance is usually the request user, rebuilt from cached
+        # state that may predate an admin's change to is_active, role or is_staff
+        if fields:
+            instance.save(update_fields=fields + ['updated_at'])
+        return instance
+
+    def get_profile_picture_variants(self, obj):
+        urls = images.variant_urls(obj.profile_picture.name if obj.profile_picture else None)
+        request = self.context.get('request')
+        if urls and request is not None:
+            urls = {variant: request.build_absolute_uri(url) for variant, url in urls.items()}
+        return urls
+
 class UserRegistrationSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True, validators=[validate_password])
     password_confirm = serializers.CharField(write_only=True)
@@ -65,4 +102,7 @@ class ChangePasswordSerializer(serializers.Serializer):
         user = self.context['request'].user
         if not user.check_password(value):
             raise serializers.ValidationError('Old password is incorrect')
-        return value
\ No newline at end of file
+        return value
+
+class TokenRefreshSerializer(jwt_serializers.TokenRefreshSerializer):
+    token_class = RefreshToken
@@ -0,0 +1,157 @@
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+from rest_framework_simplejwt import tokens
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+from collections import deque
+from datetime import timedelta
+import hashlib
+import math
+import os
+import threading
+import time
+
+# Rows are re-read for this long after a sync, so a blacklist insert that committed
+# after a later id was already seen is still picked up
+SYNC_OVERLAP_SECONDS = 60
+
+class BloomFilter:
+    """Set membership with false positives but no false negatives"""
+
+    def __init__(self, capacity, error_rate=0.01):
+        self.capacity = max(capacity, 1024)
+        self.size = math.ceil(-self.capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.hashes = max(1, round(self.size / self.capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, value):
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'big')
+        step = int.from_bytes(digest[8:], 'big') | 1
+        return [(first + i * step) % self.size for i in range(self.hashes)]
+
+    def add(self, value):
+        for position in self._positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, value):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+class BlacklistFilter:
+    """Per-process filter of blacklisted jtis kept in step with BlacklistedToken"""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.lock = threading.Lock()
+        self.bloom = None
+        self.built_at = 0.0
+        self.synced_at = 0.0
+        self.watermark = 0
+        self.history = deque()
+        self.rebuilding = False
+
+    def _rows(self, after_id):
+        return (
+            BlacklistedToken.objects.filter(id__gt=after_id).order_by()
+            .values_list('id', 'token__jti').iterator(chunk_size=10000)
+        )
+
+    def _record_watermark(self, now):
+        self.history.append((now, self.watermark))
+        while len(self.history) > 1 and self.history[1][0] <= now - SYNC_OVERLAP_SECONDS:
+            self.history.popleft()
+
+    def _build(self):
+        started = time.monotonic()
+        # Rows blacklisted before this have committed by the time the build reads them
+        settled_before = timezone.now() - timedelta(seconds=SYNC_OVERLAP_SECONDS)
+        bloom = BloomFilter(BlacklistedToken.objects.count() * 2)
+        watermark = settled = 0
+        rows = BlacklistedToken.objects.order_by().values_list('id', 'token__jti', 'blacklisted_at')
+        for row_id, jti, blacklisted_at in rows.iterator(chunk_size=10000):
+            bloom.add(jti)
+            watermark = max(watermark, row_id)
+            if blacklisted_at < settled_before:
+                settled = max(settled, row_id)
+        return bloom, watermark, settled, started
+
+    def _install(self, bloom, watermark, settled, started):
+        self.bloom, self.watermark = bloom, watermark
+        self.built_at = self.synced_at = started
+        # Rows with a lower id than the watermark may commit after the build read past them,
+        # so syncs re-read from the settled id until the overlap has passed
+        self.history.clear()
+        self.history.append((started - SYNC_OVERLAP_SECONDS, settled))
+        self._record_watermark(started)
+
+    def rebuild(self):
+        """Build a filter in the calling thread and install it"""
+        built = self._build()
+        with self.lock:
+            self._install(*built)
+
+    def _rebuild_in_background(self):
+        def run():
+            try:
+                self.rebuild()
+            finally:
+                self.rebuilding = False
+                connection.close()
+        threading.Thread(target=run, name='token-blacklist-rebuild', daemon=True).start()
+
+    def sync(self):
+        now = time.monotonic()
+        for row_id, jti in self._rows(self.history[0][1]):
+            self.bloom.add(jti)
+            self.watermark = max(self.watermark, row_id)
+        self.synced_at = now
+        self._record_watermark(now)
+
+    def might_contain(self, jti):
+        with self.lock:
+            now = time.monotonic()
+            if self.bloom is None:
+                # The first build takes seconds on a large table, so it runs off the request path;
+                # until it is installed every token is looked up in the table
+                if not self.rebuilding:
+                    self.rebuilding = True
+                    self._rebuild_in_background()
+                return True
+            if now - self.synced_at >= settings.TOKEN_BLACKLIST_SYNC_INTERVAL:
+                self.sync()
+            stale = now - self.built_at >= settings.TOKEN_BLACKLIST_REBUILD_INTERVAL
+            # Past capacity the false-positive rate climbs, so size a new filter early
+            if (stale or self.bloom.count > self.bloom.capacity) and not self.rebuilding:
+                self.rebuilding = True
+                self._rebuild_in_background()
+            return jti in self.bloom
+
+    def add(self, jti):
+        with self.lock:
+            if self.bloom is not None:
+                self.bloom.add(jti)
+
+blacklist_filter = BlacklistFilter()
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=blacklist_filter.reset)
+
+class RefreshToken(tokens.RefreshToken):
+    """
+    RefreshToken whose blacklist check consults the in-memory filter first and
+    only queries the blacklist table when the filter reports a possible hit.
+    """
+
+    def check_blacklist(self):
+        if blacklist_filter.might_contain(self.payload[api_settings.JTI_CLAIM]):
+            super().check_blacklist()
+
+    def blacklist(self):
+        result = super().blacklist()
+        # Visible to this process at once; other processes see it on their next sync
+        blacklist_filter.add(self.payload[api_settings.JTI_CLAIM])
+        return result
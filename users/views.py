@@ -1,14 +1,20 @@
 from rest_framework import status, permissions
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
-from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.views import TokenRefreshView as BaseTokenRefreshView
+from django.conf import settings
 from django.contrib.auth import login
+from django.views.static import serve
+import os
+from . import images
 from .models import User
+from .tokens import RefreshToken
 from .serializers import (
     UserRegistrationSerializer, 
     LoginSerializer, 
     UserSerializer,
-    ChangePasswordSerializer
+    ChangePasswordSerializer,
+    TokenRefreshSerializer
 )
 
 @api_view(['POST'])
@@ -56,6 +62,9 @@ def login_view(request):
         })
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+class TokenRefreshView(BaseTokenRefreshView):
+    serializer_class = TokenRefreshSerializer
+
 @api_view(['POST'])
 def logout_view(request):
     try:
@@ -90,6 +99,14 @@ def change_password(request):
     if serializer.is_valid():
         user = request.user
         user.set_password(serializer.validated_data['new_password'])
-        user.save()
+        # request.user may be cached state; writing its other columns back could undo an admin's change
+        user.save(update_fields=['password'])
         return Response({'message': 'Password changed successfully'})
-    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
\ No newline at end of file
+    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+def profile_picture(request, path):
+    """Serve a profile picture under DEBUG; content-addressed names never change, so they are cached for a year"""
+    response = serve(request, path, document_root=os.path.join(settings.MEDIA_ROOT, images.UPLOAD_DIR))
+    if images.is_content_addressed(f'{images.UPLOAD_DIR}/{path}'):
+        response['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response